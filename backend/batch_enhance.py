@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Bulk enhancement of a directory of images, without going through the API.
+
+Walks INPUT_DIR recursively and writes <name>_enhanced.<ext> files, encoded
+as --format, to the same relative paths under OUTPUT_DIR. One JSON line per
+image is printed as it finishes. Finished images are recorded in
+OUTPUT_DIR/.batch_journal.jsonl, so running the same command again after an
+interruption skips them.
+
+    python batch_enhance.py frames/ enhanced/ --executor process
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from models.batch_runner import BatchJournal, BatchPipeline
+from models.classical import CLASSICAL_MODEL_ID
+from models.encoder import FORMATS, PRESET_NAMES, OutputEncoder
+from models.execution_backend import ExecutionBackend
+from models.image_processor import ImageProcessor
+from models.model_manager import ModelManager
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
+
+def find_images(input_dir, exclude_dir=None):
+    """Image files under input_dir (outside exclude_dir) in a stable order"""
+    for root, dirs, files in os.walk(input_dir):
+        if exclude_dir is not None and Path(root) == exclude_dir:
+            dirs.clear()
+            continue
+        dirs.sort()
+        for name in sorted(files):
+            if Path(name).suffix.lower() in IMAGE_EXTENSIONS:
+                yield Path(root) / name
+
+def output_path_for(path, input_dir, output_dir, image_format):
+    relative = path.relative_to(input_dir)
+    return output_dir / relative.parent / f"{relative.stem}_enhanced{FORMATS[image_format]['extension']}"
+
+async def run(args):
+    input_dir = Path(args.input_dir)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    model_manager = ModelManager()
+    if args.model != CLASSICAL_MODEL_ID and not model_manager.has_model(args.model):
+        known = ", ".join(sorted([*model_manager.registry, CLASSICAL_MODEL_ID]))
+        print(f"Unknown model: {args.model} (available: {known})", file=sys.stderr)
+        return 2
+    try:
+        encoder = OutputEncoder(args.format, args.preset)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    executor = ExecutionBackend(kind=args.executor, workers=args.workers)
+    image_processor = ImageProcessor(model_manager, executor, encoder)
+    if args.max_size:
+        image_processor.max_size = args.max_size
+
+    journal = BatchJournal(output_dir / ".batch_journal.jsonl")
+    model_version = model_manager.get_model_version(args.model)
+
+    async def run_item(path):
+        relative = str(path.relative_to(input_dir))
+        output_path = output_path_for(path, input_dir, output_dir, encoder.default_format)
+        try:
+            stat = path.stat()
+            # An input counts as done if it is unchanged and was enhanced by the same model version and encoding
+            key = (f"{relative}:{stat.st_size}:{stat.st_mtime_ns}:{args.model}:{model_version}:"
+                   f"{encoder.default_format}:{encoder.default_preset}")
+            if journal.get(key) is not None and output_path.exists():
+                return {"filename": relative, "status": "skipped", "output": str(output_path)}
+
+            started = time.perf_counter()
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            # Write under a temporary name so an interrupted run never leaves a truncated output
+            partial_path = output_path.with_name(f"{output_path.stem}.partial{output_path.suffix}")
+            encoded = await image_processor.enhance_image(str(path), str(partial_path), model_id=args.model)
+            os.replace(partial_path, output_path)
+
+            entry = {
+                "filename": relative,
+                "status": "done",
+                "output": str(output_path),
+                "bytes": encoded["bytes"],
+                "encode_ms": round(encoded["encode_ms"], 1),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+            }
+            await executor.run_local(journal.record, key, entry)
+            return entry
+        except Exception as e:
+            return {"filename": relative, "status": "failed", "error": str(e)}
+
+    pipeline = BatchPipeline(run_item, args.concurrency)
+
+    async def produce():
+        try:
+            for path in find_images(input_dir, exclude_dir=output_dir):
+                await pipeline.submit(path)
+        finally:
+            pipeline.close()
+
+    producer = asyncio.create_task(produce())
+    counts = {"done": 0, "skipped": 0, "failed": 0}
+    started = time.perf_counter()
+    try:
+        async for result in pipeline.iter_results():
+            counts[result["status"]] += 1
+            print(json.dumps(result), flush=True)
+        await producer
+    finally:
+        producer.cancel()
+        await pipeline.join()
+        journal.close()
+        image_processor.scheduler.shutdown()
+        executor.shutdown()
+
+    elapsed = time.perf_counter() - started
+    rate = counts["done"] / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Enhanced {counts['done']} images ({counts['skipped']} skipped, {counts['failed']} failed) "
+        f"in {elapsed:.1f}s, {rate:.1f} images/s",
+        file=sys.stderr
+    )
+    return 1 if counts["failed"] else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Enhance every image under a directory")
+    parser.add_argument("input_dir", help="directory of low light images (searched recursively)")
+    parser.add_argument("output_dir", help="where enhanced images and the resume journal are written")
+    parser.add_argument("--model", default="lol_real", help="model id, or classical for the OpenCV engine (default: lol_real)")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="images in flight (default: BATCH_CONCURRENCY or 16)")
+    parser.add_argument("--executor", default=os.getenv("PIPELINE_EXECUTOR", "process"),
+                        choices=["thread", "process", "inline"],
+                        help="where decode/encode run; process spreads them across all cores (default)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="decode/encode workers (default: PIPELINE_WORKERS or one per core)")
+    parser.add_argument("--format", default=None, choices=sorted(set(FORMATS) | {"jpg"}),
+                        help="output format (default: OUTPUT_FORMAT or jpeg)")
+    parser.add_argument("--preset", default=None, choices=PRESET_NAMES,
+                        help="encode preset: fast, balanced or small (default: OUTPUT_PRESET or balanced)")
+    parser.add_argument("--max-size", type=int, default=None,
+                        help="downscale inputs whose longer side exceeds this many pixels")
+    args = parser.parse_args()
+
+    # Model paths are relative to the backend directory
+    input_dir = Path(args.input_dir).resolve()
+    output_dir = Path(args.output_dir).resolve()
+    os.chdir(Path(__file__).parent)
+    args.input_dir, args.output_dir = str(input_dir), str(output_dir)
+
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Auth verify latency benchmark
+
+Bulk-loads N users and N tokens into a fresh auth database, opens an
+AuthManager on it and measures AuthManager.verify_token for random valid
+tokens. With the indexed in-memory store the latency should stay flat as N
+grows; the load time column shows the one-off startup cost.
+
+Usage (from the backend directory):
+    python benchmarks/bench_auth_verify.py --sizes 1000 10000 100000 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from harness import add_save_argument, save_results
+from models.auth_manager import AuthManager
+from models.auth_store import AuthStore, USER_FIELDS, TOKEN_FIELDS
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def populate(db_path, count):
+    """Bulk insert count users with one token each; returns the tokens"""
+    AuthStore(db_path).close()  # create the schema
+    now = datetime.now()
+    created = now.isoformat()
+    expires = (now + timedelta(days=7)).isoformat()
+    tokens = [f"token-{i:08d}" for i in range(count)]
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executemany(
+        f"INSERT INTO users ({', '.join(USER_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+        ((str(i + 1), f"user{i}@example.com", f"User {i}", "x" * 64, created, None) for i in range(count))
+    )
+    conn.executemany(
+        f"INSERT INTO tokens ({', '.join(TOKEN_FIELDS)}) VALUES (?, ?, ?, ?, ?)",
+        ((tokens[i], str(i + 1), f"user{i}@example.com", created, expires) for i in range(count))
+    )
+    conn.commit()
+    conn.close()
+    return tokens
+
+def run(count, lookups):
+    db_path = str(Path(tempfile.mkdtemp(prefix="bench_auth_")) / "auth.db")
+    tokens = populate(db_path, count)
+
+    started = time.perf_counter()
+    manager = AuthManager(store=AuthStore(db_path))
+    load_s = time.perf_counter() - started
+
+    sample = [random.choice(tokens) for _ in range(lookups)]
+    latencies = []
+
+    async def verify_all():
+        for token in sample:
+            started = time.perf_counter()
+            user = await manager.verify_token(token)
+            latencies.append((time.perf_counter() - started) * 1e6)
+            assert user is not None
+
+    asyncio.run(verify_all())
+
+    started = time.perf_counter()
+    for i in range(min(lookups, count)):
+        manager.get_user_by_id(str(i + 1))
+    by_id_us = (time.perf_counter() - started) * 1e6 / min(lookups, count)
+
+    manager.store.close()
+    return {
+        "users": count,
+        "tokens": count,
+        "load_s": round(load_s, 2),
+        "verify_p50_us": round(percentile(latencies, 50), 2),
+        "verify_p99_us": round(percentile(latencies, 99), 2),
+        "get_user_by_id_us": round(by_id_us, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--lookups", type=int, default=20000)
+    add_save_argument(parser)
+    args = parser.parse_args()
+
+    results = []
+    for count in args.sizes:
+        result = run(count, args.lookups)
+        results.append(result)
+        print(f"{count:>8} users/tokens: load {result['load_s']:>6}s  verify p50 {result['verify_p50_us']:>6}us "
+              f"p99 {result['verify_p99_us']:>6}us  get_user_by_id {result['get_user_by_id_us']:>5}us")
+
+    print(json.dumps(results, indent=2))
+    save_results("auth_verify", args, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Classical engine benchmark
+
+Times the enhancement step alone (no decode or encode) on synthetic images
+for the float tensor path and the uint8 classical engine:
+
+  tensor        uint8 -> normalized float tensor -> simple enhancement -> uint8
+  simple_lut    the simple enhancement as a lookup table (today's fallback)
+  gate          the luma histogram the classical engine gates on
+  lut           gate + tone curve LUT (what dim images get)
+  clahe         gate + CLAHE + tone curve (CLASSICAL_METHOD=clahe, dark images)
+  retinex       gate + fast Retinex + tone curve (the default, dark images)
+  skip          gate on an already well lit image, which is returned as is
+
+Speedups are against the tensor path at the same resolution.
+
+Usage (from the backend directory):
+    python benchmarks/bench_classical.py --resolutions vga fhd 12mp --save
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from harness import RESOLUTIONS, add_save_argument, low_light_array, save_results
+from models.classical import ClassicalEnhancer, luminance_histogram
+from models.pixel_ops import apply_lut, simple_enhancement_, to_model_input, to_uint8
+
+def time_ms(fn, image, iterations):
+    fn(image)  # warm up
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn(image)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--resolutions", nargs="+", default=["vga", "hd", "fhd", "12mp"], choices=sorted(RESOLUTIONS))
+    parser.add_argument("--iterations", type=int, default=5)
+    add_save_argument(parser)
+    args = parser.parse_args()
+
+    # Thresholds pinned so the synthetic images take the intended branch
+    dim = ClassicalEnhancer(method="lut", skip_mean=250, light_mean=0)
+    paths = {
+        "tensor": lambda image: to_uint8(simple_enhancement_(to_model_input(image))),
+        "simple_lut": apply_lut,
+        "gate": luminance_histogram,
+        "lut": dim.enhance,
+        "clahe": ClassicalEnhancer(method="clahe", skip_mean=250, light_mean=250).enhance,
+        "retinex": ClassicalEnhancer(method="retinex", skip_mean=250, light_mean=250).enhance,
+    }
+    skipper = ClassicalEnhancer(skip_mean=0)
+
+    results = []
+    for resolution in args.resolutions:
+        width, height = RESOLUTIONS[resolution]
+        image = low_light_array(width, height, seed=0)
+        bright = np.clip(image.astype(np.uint16) * 3, 0, 255).astype(np.uint8)
+
+        timings = {name: time_ms(fn, image, args.iterations) for name, fn in paths.items()}
+        timings["skip"] = time_ms(skipper.enhance, bright, args.iterations)
+        for name, ms in timings.items():
+            results.append({
+                "resolution": resolution,
+                "megapixels": round(width * height / 1e6, 2),
+                "path": name,
+                "ms": round(ms, 2),
+                "speedup_vs_tensor": round(timings["tensor"] / ms, 1) if ms else None,
+            })
+        print(f"{resolution:>5}: " + ", ".join(f"{name} {ms:.1f} ms" for name, ms in timings.items()))
+
+    print(json.dumps(results, indent=2))
+    save_results("classical", args, results)
+
+if __name__ == "__main__":
+    main()
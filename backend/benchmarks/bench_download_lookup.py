@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Download lookup benchmark
+
+Fills an ArtifactStore with N enhanced outputs (small real files in the
+sharded layout) and measures the lookup /download/{file_id} does for random
+ids: the indexed ArtifactStore.get plus a stat of the file. Next to it, the
+same N files in one flat directory are looked up the way downloads used to
+work, with OUTPUT_DIR.glob(f"{file_id}_enhanced.*"), which scans the whole
+directory on every request.
+
+Usage (from the backend directory):
+    python benchmarks/bench_download_lookup.py --sizes 1000 10000 100000 --save
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from harness import add_save_argument, latency_summary, save_results
+from models.artifact_store import ArtifactStore
+
+def populate(workdir, count):
+    """count outputs indexed in a sharded store and copied flat into legacy/; returns the ids"""
+    store = ArtifactStore({"output": workdir / "outputs"}, db_path=workdir / "artifacts.db")
+    legacy_dir = workdir / "legacy"
+    legacy_dir.mkdir()
+    file_ids = [str(uuid.UUID(int=random.getrandbits(128))) for _ in range(count)]
+
+    store.conn.execute("BEGIN")
+    for file_id in file_ids:
+        path = store.path_for(file_id, "output", ".jpg")
+        path.write_bytes(b"\xff\xd8")
+        store.add(file_id, "output", path, mime="image/jpeg")
+        (legacy_dir / f"{file_id}_enhanced.jpg").write_bytes(b"\xff\xd8")
+    store.conn.execute("COMMIT")
+    return store, legacy_dir, file_ids
+
+def indexed_lookup(store, file_id):
+    artifact = store.get(file_id, "output")
+    os.stat(artifact["path"])
+    return artifact
+
+def legacy_lookup(legacy_dir, file_id):
+    for path in legacy_dir.glob(f"{file_id}_enhanced.*"):
+        return path
+    return None
+
+def measure(lookup, file_ids):
+    latencies = []
+    for file_id in file_ids:
+        started = time.perf_counter()
+        found = lookup(file_id)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert found is not None
+    return latency_summary(latencies)
+
+def run(count, args):
+    workdir = Path(tempfile.mkdtemp(prefix="bench_download_"))
+    started = time.perf_counter()
+    store, legacy_dir, file_ids = populate(workdir, count)
+    populate_s = time.perf_counter() - started
+
+    indexed = measure(lambda file_id: indexed_lookup(store, file_id), random.choices(file_ids, k=args.lookups))
+    legacy = measure(lambda file_id: legacy_lookup(legacy_dir, file_id),
+                     random.choices(file_ids, k=args.legacy_lookups))
+    store.close()
+    return {"files": count, "populate_s": round(populate_s, 2), "indexed_ms": indexed, "legacy_glob_ms": legacy}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--legacy-lookups", type=int, default=50,
+                        help="glob lookups per size (each one scans the directory)")
+    parser.add_argument("--seed", type=int, default=0)
+    add_save_argument(parser)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    results = []
+    for count in args.sizes:
+        result = run(count, args)
+        results.append(result)
+        print(f"{count:>7} files: indexed p50 {result['indexed_ms']['p50']:.3f}ms p99 {result['indexed_ms']['p99']:.3f}ms"
+              f"  legacy glob p50 {result['legacy_glob_ms']['p50']:.3f}ms p99 {result['legacy_glob_ms']['p99']:.3f}ms")
+
+    print(json.dumps(results, indent=2))
+    save_results("download_lookup", args, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Gallery listing benchmark
+
+Fills an ArtifactStore and ImageIndex with one user's history of N
+enhanced images (small real files, among other users' images) and times
+GET /images' query, ImageIndex.page, for every page while walking the whole
+history with cursors. Next to it, the first, middle and last pages are
+fetched with LIMIT / OFFSET, whose cost grows with the page's depth. Also reports the bytes a
+gallery page transfers with thumbnails against full size outputs, from one
+synthetic low light image encoded both ways.
+
+Usage (from the backend directory):
+    python benchmarks/bench_gallery.py --sizes 1000 10000 100000 --save
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from harness import RESOLUTIONS, add_save_argument, latency_summary, low_light_array, save_results
+from models.artifact_store import ArtifactStore
+from models.encoder import encode_array, encode_thumbnails
+from models.image_index import ImageIndex
+
+def populate(workdir, count, other_users):
+    """count images for user "bench", and as many again spread over other users"""
+    store = ArtifactStore({"output": workdir / "outputs"}, db_path=workdir / "artifacts.db")
+    index = ImageIndex(store)
+    owners = ["bench"] * count + [f"user{random.randrange(other_users)}" for _ in range(count)]
+    random.shuffle(owners)
+    created_at = time.time() - len(owners)
+
+    file_ids = [str(uuid.UUID(int=random.getrandbits(128))) for _ in owners]
+    # One transaction per connection at a time; both write the same database
+    store.conn.execute("BEGIN")
+    for owner, file_id in zip(owners, file_ids):
+        path = store.path_for(file_id, "output", ".jpg")
+        path.write_bytes(b"\xff\xd8")
+        store.add(file_id, "output", path, mime="image/jpeg", owner=owner)
+    store.conn.execute("COMMIT")
+    index.conn.execute("BEGIN")
+    for i, (owner, file_id) in enumerate(zip(owners, file_ids)):
+        index.add(owner, file_id, f"{i}.jpg", "lol_real", "jpeg", 4000, 3000, ["small", "medium"], created_at + i)
+    index.conn.execute("COMMIT")
+    return store, index
+
+def offset_page(index, owner, limit, offset):
+    """The page the way OFFSET pagination would fetch it"""
+    return index.conn.execute(
+        "SELECT i.file_id FROM images i JOIN artifacts a ON a.file_id = i.file_id AND a.kind = 'output' "
+        "WHERE i.owner = ? ORDER BY i.created_at DESC, i.file_id DESC LIMIT ? OFFSET ?",
+        (owner, limit, offset)
+    ).fetchall()
+
+def run(count, args):
+    workdir = Path(tempfile.mkdtemp(prefix="bench_gallery_"))
+    started = time.perf_counter()
+    store, index = populate(workdir, count, args.other_users)
+    populate_s = time.perf_counter() - started
+
+    cursor_ms = []
+    cursor, seen = None, 0
+    while True:
+        started = time.perf_counter()
+        images, cursor = index.page("bench", args.page_size, cursor)
+        cursor_ms.append((time.perf_counter() - started) * 1000)
+        seen += len(images)
+        if cursor is None:
+            break
+    assert seen == count
+
+    offset_ms = {}
+    for name, page in (("first", 0), ("middle", len(cursor_ms) // 2), ("last", len(cursor_ms) - 1)):
+        started = time.perf_counter()
+        offset_page(index, "bench", args.page_size, page * args.page_size)
+        offset_ms[name] = round((time.perf_counter() - started) * 1000, 3)
+    index.close()
+    store.close()
+    return {
+        "images": count,
+        "pages": len(cursor_ms),
+        "populate_s": round(populate_s, 2),
+        "cursor_first_page_ms": round(cursor_ms[0], 3),
+        "cursor_last_page_ms": round(cursor_ms[-1], 3),
+        "cursor_ms": latency_summary(cursor_ms),
+        "offset_page_ms": offset_ms,
+    }
+
+def page_bytes(args):
+    """Bytes of one gallery page with thumbnails vs with full size outputs"""
+    workdir = Path(tempfile.mkdtemp(prefix="bench_gallery_bytes_"))
+    width, height = RESOLUTIONS[args.resolution]
+    array = low_light_array(width, height, seed=0)
+    full = encode_array(array, str(workdir / "full.jpg"), "jpeg", "balanced")["bytes"]
+    thumbnails = encode_thumbnails(array, [(str(workdir / "small.webp"), 160), (str(workdir / "medium.webp"), 480)],
+                                   "webp")
+    return {
+        "resolution": args.resolution,
+        "page_size": args.page_size,
+        "full_page_bytes": full * args.page_size,
+        "small_thumbnail_page_bytes": thumbnails[str(workdir / "small.webp")] * args.page_size,
+        "medium_thumbnail_page_bytes": thumbnails[str(workdir / "medium.webp")] * args.page_size,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--page-size", type=int, default=24)
+    parser.add_argument("--other-users", type=int, default=100)
+    parser.add_argument("--resolution", default="12mp", choices=sorted(RESOLUTIONS))
+    add_save_argument(parser)
+    args = parser.parse_args()
+
+    random.seed(0)
+    results = {"listing": [], "bytes": page_bytes(args)}
+    for count in args.sizes:
+        result = run(count, args)
+        results["listing"].append(result)
+        print(f"{count:>7} images: cursor page p50 {result['cursor_ms']['p50']:.3f} ms "
+              f"(last {result['cursor_last_page_ms']:.3f} ms), offset page last {result['offset_page_ms']['last']:.3f} ms")
+    bytes_ = results["bytes"]
+    print(f"page of {args.page_size} at {args.resolution}: full {bytes_['full_page_bytes'] / 1e6:.1f} MB, "
+          f"medium thumbnails {bytes_['medium_thumbnail_page_bytes'] / 1e3:.1f} KB, "
+          f"small {bytes_['small_thumbnail_page_bytes'] / 1e3:.1f} KB")
+
+    print(json.dumps(results, indent=2))
+    save_results("gallery", args, results)
+
+if __name__ == "__main__":
+    main()
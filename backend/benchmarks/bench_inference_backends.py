@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Inference backend comparison
+
+Builds every inference backend (eager, torchscript, compile, onnx, int8)
+for one model, checks its accuracy against eager PyTorch on a reference set
+(PSNR / SSIM) and measures forward-pass latency and throughput on CPU. The
+fastest backend within the quality tolerance is printed as the
+recommendation; set it with MODEL_BACKENDS=<model_id>=<backend>.
+
+Without a model id or weights file a small convolutional stand-in network is
+used, which is enough to compare the backends' overheads but not their
+speedups on the real architecture.
+
+Usage (from the backend directory):
+    python benchmarks/bench_inference_backends.py --model-id lol_real --images path/to/low_light_samples
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from models.image_processor import load_image
+from models.inference_backends import BACKENDS, build_backend, psnr, reference_batch, ssim
+from models.model_manager import ModelManager
+from models.pixel_ops import to_model_input
+
+class StandInEnhancer(nn.Module):
+    """Small encoder/decoder CNN shaped like a typical enhancement network"""
+    def __init__(self, width=32):
+        super().__init__()
+        self.encode = nn.Sequential(
+            nn.Conv2d(3, width, 3, padding=1), nn.ReLU(),
+            nn.Conv2d(width, width * 2, 3, stride=2, padding=1), nn.ReLU(),
+        )
+        self.decode = nn.Sequential(
+            nn.ConvTranspose2d(width * 2, width, 4, stride=2, padding=1), nn.ReLU(),
+            nn.Conv2d(width, 3, 3, padding=1),
+        )
+
+    def forward(self, x):
+        return torch.tanh(x + self.decode(self.encode(x)))
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def load_model(args):
+    if args.weights:
+        model = ModelManager().load_weights(args.weights)
+    elif args.model_id:
+        manager = ModelManager()
+        if args.model_id not in manager.registry:
+            sys.exit(f"Unknown model: {args.model_id} (available: {', '.join(sorted(manager.registry)) or 'none'})")
+        model = manager.load_weights(manager.registry[args.model_id]["path"])
+    else:
+        torch.manual_seed(0)
+        model = StandInEnhancer()
+    if not isinstance(model, nn.Module):
+        sys.exit("The weights file holds a state dict, not a runnable model")
+    return model.eval()
+
+def reference_set(args, size):
+    """Batches of the reference images (or synthetic low light ones) at size x size"""
+    if args.images:
+        paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+        tensors = [to_model_input(np.array(load_image(str(p)).resize((size, size)))) for p in paths[:args.reference_count]]
+        return [torch.stack(tensors[i:i + args.batch]) for i in range(0, len(tensors), args.batch)]
+    return [reference_batch(args.batch, size, seed) for seed in range(max(1, args.reference_count // args.batch))]
+
+def run_backend(name, model, args):
+    example = reference_batch(1, 64)
+    started = time.perf_counter()
+    try:
+        candidate = build_backend(name, model, example)
+    except Exception as e:
+        return {"backend": name, "error": str(e)}
+    build_ms = (time.perf_counter() - started) * 1000
+
+    result = {"backend": name, "build_ms": round(build_ms, 1), "sizes": {}}
+    worst_psnr, worst_ssim = float("inf"), 1.0
+    with torch.no_grad():
+        for size in args.sizes:
+            batches = reference_set(args, size)
+            for batch in batches:
+                expected = model(batch).clamp(-1, 1)
+                actual = candidate(batch).clamp(-1, 1)
+                worst_psnr = min(worst_psnr, psnr(expected, actual))
+                worst_ssim = min(worst_ssim, ssim(expected, actual))
+
+            batch = batches[0]
+            for _ in range(args.warmup):
+                candidate(batch)
+            latencies = []
+            for _ in range(args.iterations):
+                tick = time.perf_counter()
+                candidate(batch)
+                latencies.append((time.perf_counter() - tick) * 1000)
+            result["sizes"][size] = {
+                "p50_ms": round(percentile(latencies, 50), 2),
+                "p99_ms": round(percentile(latencies, 99), 2),
+                "images_per_sec": round(batch.shape[0] * len(latencies) / (sum(latencies) / 1000), 2),
+            }
+
+    result["psnr_db"] = round(worst_psnr, 2) if worst_psnr != float("inf") else "inf"
+    result["ssim"] = round(worst_ssim, 5)
+    result["within_tolerance"] = worst_psnr >= args.min_psnr and worst_ssim >= args.min_ssim
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inference backends for accuracy and speed")
+    parser.add_argument("--model-id", help="model from the registry (MODELS_DIR)")
+    parser.add_argument("--weights", help="path to a weights file (overrides --model-id)")
+    parser.add_argument("--images", help="directory of reference images (default: synthetic low light batches)")
+    parser.add_argument("--reference-count", type=int, default=8)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[256, 512])
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--min-psnr", type=float, default=40.0)
+    parser.add_argument("--min-ssim", type=float, default=0.99)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model = load_model(args)
+    results = [run_backend(name, model, args) for name in args.backends]
+
+    usable = [r for r in results if "error" not in r and r["within_tolerance"]]
+    largest = max(args.sizes)
+    recommended = min(usable, key=lambda r: r["sizes"][largest]["p50_ms"])["backend"] if usable else "eager"
+
+    if args.json:
+        print(json.dumps({"results": results, "recommended": recommended}, indent=2))
+        return
+
+    print(f"{'backend':<12} {'build ms':>9} {'PSNR dB':>8} {'SSIM':>8} {'ok':>3}  " +
+          "  ".join(f"{size}px p50/p99 ms (img/s)" for size in args.sizes))
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<12} unavailable: {r['error']}")
+            continue
+        timings = "  ".join(
+            f"{t['p50_ms']:>8.1f}/{t['p99_ms']:<8.1f} ({t['images_per_sec']:.1f})" for t in r["sizes"].values()
+        )
+        print(f"{r['backend']:<12} {r['build_ms']:>9.0f} {str(r['psnr_db']):>8} {r['ssim']:>8.4f} "
+              f"{'yes' if r['within_tolerance'] else 'no':>3}  {timings}")
+    print(f"\nFastest within tolerance (PSNR >= {args.min_psnr} dB, SSIM >= {args.min_ssim}): {recommended}")
+
+if __name__ == "__main__":
+    main()
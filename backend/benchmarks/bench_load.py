@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+API load generator
+
+Starts the API on a local uvicorn (with an identity stand-in for the model,
+so the numbers measure the service rather than the network) and runs closed
+loop virtual users against it for --duration seconds. Each user has its own
+account and picks /auth/login, /enhance or /download at random with the
+weights given by --mix; downloads fetch images enhanced earlier in the run.
+Uploads are drawn from a pool of synthetic low light images and made unique
+(random bytes after the JPEG end marker) so they miss the result cache,
+except for the --cache-hit-rate fraction, which repeat a pool image as is.
+
+Reports throughput, errors and p50/p95/p99 latency per endpoint.
+
+Usage (from the backend directory):
+    python benchmarks/bench_load.py --users 16 --duration 60 --resolution hd --save
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from harness import (RESOLUTIONS, add_save_argument, latency_summary, low_light_jpeg, save_results, serve,
+                     start_server, wait_ready)
+
+OPERATIONS = ("login", "enhance", "download")
+
+def parse_mix(value):
+    """"login=1,enhance=2,download=4" -> {"login": 1.0, ...}"""
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation: {name} (expected one of {', '.join(OPERATIONS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+async def drive(args):
+    import httpx
+
+    width, height = RESOLUTIONS[args.resolution]
+    images = [low_light_jpeg(width, height, seed) for seed in range(args.images)]
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout,
+                                 limits=limits) as client:
+        await wait_ready(client)
+
+        accounts = []
+        for i in range(args.users):
+            account = {"email": f"load{i}@example.com", "password": "loadtest-password"}
+            await client.post("/auth/register", json=dict(account, name=f"Load {i}"))
+            login = await client.post("/auth/login", json=account)
+            login.raise_for_status()
+            accounts.append(dict(account, headers={"Authorization": f"Bearer {login.json()['token']}"}))
+
+        samples = {name: [] for name in OPERATIONS}  # name -> [(latency ms, status)]
+        downloads = []  # file ids enhanced during the run
+        measuring = False
+
+        async def request(name, account, rng):
+            if name == "login":
+                return await client.post("/auth/login", json={"email": account["email"],
+                                                              "password": account["password"]})
+            if name == "enhance":
+                data = rng.choice(images)
+                if rng.random() >= args.cache_hit_rate:
+                    data += rng.randbytes(16)
+                files = {"file": ("load.jpg", data, "image/jpeg")}
+                response = await client.post("/enhance", files=files, headers=account["headers"])
+                if response.status_code == 200:
+                    downloads.append(response.json()["file_id"])
+                return response
+            return await client.get(f"/download/{rng.choice(downloads)}")
+
+        async def virtual_user(index, deadline):
+            rng = random.Random(args.seed + index)
+            account = accounts[index]
+            names, weights = list(args.mix), list(args.mix.values())
+            while time.perf_counter() < deadline:
+                name = rng.choices(names, weights)[0]
+                if name == "download" and not downloads:
+                    name = "enhance"
+                started = time.perf_counter()
+                try:
+                    status = (await request(name, account, rng)).status_code
+                except httpx.HTTPError:
+                    status = 0
+                if measuring:
+                    samples[name].append(((time.perf_counter() - started) * 1000, status))
+                if args.think_time:
+                    await asyncio.sleep(rng.expovariate(1.0 / args.think_time))
+
+        # Warm-up (worker start-up, first forward passes, some images to download) is not measured
+        await asyncio.gather(*[virtual_user(i, time.perf_counter() + args.warmup) for i in range(args.users)])
+
+        measuring = True
+        started = time.perf_counter()
+        await asyncio.gather(*[virtual_user(i, started + args.duration) for i in range(args.users)])
+        elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for name, values in samples.items():
+        ok = [ms for ms, status in values if 200 <= status < 400]
+        endpoints[name] = {
+            "requests": len(values),
+            "throughput_per_s": round(len(ok) / elapsed, 2),
+            "rejected": sum(1 for _, status in values if status == 429),
+            "errors": sum(1 for _, status in values if not 200 <= status < 400 and status != 429),
+            "latency_ms": latency_summary(ok),
+        }
+    total = sum(len(values) for values in samples.values())
+    return {
+        "users": args.users,
+        "duration_s": round(elapsed, 1),
+        "resolution": args.resolution,
+        "requests": total,
+        "throughput_per_s": round(sum(e["throughput_per_s"] for e in endpoints.values()), 2),
+        "endpoints": endpoints,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before the run")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("login=1,enhance=2,download=4"),
+                        help="operation weights (default: login=1,enhance=2,download=4)")
+    parser.add_argument("--resolution", default="vga", choices=sorted(RESOLUTIONS))
+    parser.add_argument("--images", type=int, default=8, help="synthetic images in the upload pool")
+    parser.add_argument("--cache-hit-rate", type=float, default=0.0,
+                        help="fraction of uploads repeated verbatim (result cache hits)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between a user's requests (s)")
+    parser.add_argument("--executor", default=None, choices=["inline", "thread", "process"],
+                        help="server PIPELINE_EXECUTOR (default: the server's)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    add_save_argument(parser)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        return
+
+    server = start_server(__file__, args.port, {"PIPELINE_EXECUTOR": args.executor} if args.executor else None)
+    try:
+        result = asyncio.run(drive(args))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{result['users']} users, {result['duration_s']}s: {result['requests']} requests, "
+          f"{result['throughput_per_s']} ok/s")
+    for name, stats in result["endpoints"].items():
+        latency = stats["latency_ms"]
+        print(f"{name:>9}: {stats['throughput_per_s']:>7}/s  p50 {latency['p50']:>8}ms  p95 {latency['p95']:>8}ms  "
+              f"p99 {latency['p99']:>8}ms  errors {stats['errors']}  rejected {stats['rejected']}")
+
+    print(json.dumps(result, indent=2))
+    save_results("load", args, result)
+
+if __name__ == "__main__":
+    main()
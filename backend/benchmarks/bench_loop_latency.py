@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Event loop responsiveness benchmark
+
+Measures the latency of lightweight endpoints (GET / and GET /auth/me) while
+/enhance requests are running, once per pipeline executor. The API runs on a local
+uvicorn with a stub model and is driven over HTTP from a separate process, so
+any pipeline stage that blocks the server's event loop shows up in the p99.
+
+Usage (from the backend directory, requires httpx):
+    python benchmarks/bench_loop_latency.py --executors inline thread process --size 1024
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from harness import add_save_argument, save_results
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def make_image_bytes(size):
+    """Synthetic dark JPEG"""
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(0)
+    pixels = (rng.random((size, size, 3)) * 60).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+def serve(args):
+    """Run the API with a stub model on a local uvicorn (child process)"""
+    import torch
+    import uvicorn
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(tempfile.mkdtemp(prefix="bench_loop_"))
+    import main
+
+    main.model_manager.models["lol_real"] = torch.nn.Identity()
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+async def enhance_worker_once(client, image_bytes, headers):
+    files = {"file": ("bench.jpg", image_bytes, "image/jpeg")}
+    response = await client.post("/enhance", files=files, headers=headers)
+    response.raise_for_status()
+
+async def drive(args, executor):
+    """Drive /enhance load and probe lightweight endpoints against the running server"""
+    import httpx
+
+    image_bytes = make_image_bytes(args.size)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=600) as client:
+        # Wait until models are loaded and warmed up
+        for _ in range(600):
+            try:
+                if (await client.get("/health/ready")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+
+        await client.post("/auth/register", json={"email": "bench@example.com", "password": "benchpass", "name": "Bench"})
+        login = await client.post("/auth/login", json={"email": "bench@example.com", "password": "benchpass"})
+        headers = {"Authorization": f"Bearer {login.json()['token']}"}
+
+        stop = asyncio.Event()
+        enhanced = 0
+
+        async def enhance_worker():
+            nonlocal enhanced
+            while not stop.is_set():
+                files = {"file": ("bench.jpg", image_bytes, "image/jpeg")}
+                response = await client.post("/enhance", files=files, headers=headers)
+                response.raise_for_status()
+                enhanced += 1
+
+        latencies = {"/": [], "/auth/me": []}
+
+        async def probe(path):
+            # Latency is measured from the intended send time so that a stalled
+            # server loop is not hidden by the probe waiting on it (coordinated omission)
+            interval = 1.0 / args.probe_rate
+            scheduled = time.perf_counter()
+            while not stop.is_set():
+                await client.get(path, headers=headers)
+                latencies[path].append((time.perf_counter() - scheduled) * 1000)
+                scheduled += interval
+                await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+
+        # Warm up the pipeline (worker start-up, first forward pass) before measuring
+        await asyncio.gather(*[enhance_worker_once(client, image_bytes, headers) for _ in range(args.concurrency)])
+
+        workers = [asyncio.create_task(enhance_worker()) for _ in range(args.concurrency)]
+        probes = [asyncio.create_task(probe(path)) for path in latencies]
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*probes, *workers)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "executor": executor,
+        "image_size": args.size,
+        "concurrency": args.concurrency,
+        "enhance_per_sec": round(enhanced / elapsed, 2),
+        "latency_ms": {
+            path: {
+                "samples": len(values),
+                "p50": round(percentile(values, 50), 2),
+                "p99": round(percentile(values, 99), 2),
+                "max": round(max(values, default=0.0), 2),
+            }
+            for path, values in latencies.items()
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--executors", nargs="+", default=["inline", "thread", "process"])
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--probe-rate", type=float, default=50.0, help="probe requests per second per endpoint")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    add_save_argument(parser)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    results = []
+    for executor in args.executors:
+        env = dict(os.environ, PIPELINE_EXECUTOR=executor)
+        server = subprocess.Popen([sys.executable, __file__, "--serve", "--port", str(args.port)], env=env)
+        try:
+            result = asyncio.run(drive(args, executor))
+        finally:
+            server.terminate()
+            server.wait()
+        results.append(result)
+
+        print(f"{executor:>8}: {result['enhance_per_sec']:>7} enhance/s", end="")
+        for path, stats in result["latency_ms"].items():
+            print(f"  {path} p50={stats['p50']}ms p99={stats['p99']}ms", end="")
+        print()
+
+    print(json.dumps(results, indent=2))
+    save_results("loop_latency", args, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Pre/post-processing microbenchmark
+
+Times the pixel conversions around the model on synthetic images and counts
+the buffers they allocate, for three paths:
+
+  legacy  PIL image -> ToTensor -> Normalize -> simple enhancement (clone plus
+          temporaries) -> inverse Normalize -> ToPILImage -> array
+  fused   uint8 array -> one copy into float, normalize in place -> in-place
+          enhancement -> in-place denormalize/clamp -> one copy into uint8
+  lut     the simple enhancement as a 256-entry table on the uint8 pixels
+          (used when no runnable model is loaded)
+
+Torch allocations are counted with the profiler and NumPy ones with
+tracemalloc; PIL's internal buffers are invisible to both, so the legacy
+numbers are a lower bound.
+
+Usage (from the backend directory):
+    python benchmarks/bench_pixel_pipeline.py --megapixels 1 4 12
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import torch
+import torchvision.transforms as transforms
+from PIL import Image
+from torch.profiler import ProfilerActivity, profile
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from harness import add_save_argument, save_results
+from models.pixel_ops import apply_lut, simple_enhancement_, to_model_input, to_uint8
+
+# The torchvision transforms the pipeline used before pixel_ops
+TRANSFORM = transforms.Compose([
+    transforms.ToTensor(),
+    transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
+])
+INVERSE_TRANSFORM = transforms.Compose([
+    transforms.Normalize(mean=[-1, -1, -1], std=[2, 2, 2]),
+    transforms.ToPILImage()
+])
+
+def legacy(image):
+    tensor = TRANSFORM(image).unsqueeze(0)
+    enhanced = tensor.clone()
+    enhanced = enhanced * 1.5
+    enhanced = (enhanced - 0.5) * 1.2 + 0.5
+    enhanced = torch.clamp(enhanced, -1, 1)
+    return np.array(INVERSE_TRANSFORM(enhanced[0]))
+
+def fused(array):
+    return to_uint8(simple_enhancement_(to_model_input(array)))
+
+def lut(array):
+    return apply_lut(array)
+
+PATHS = {"legacy": legacy, "fused": fused, "lut": lut}
+
+def make_array(megapixels):
+    """Synthetic dark 3:2 image of roughly the given size"""
+    width = int((megapixels * 1e6 * 1.5) ** 0.5)
+    height = int(width / 1.5)
+    return np.random.default_rng(0).integers(0, 60, (height, width, 3), dtype=np.uint8)
+
+def torch_allocations(fn, source):
+    """Number and total size of torch CPU allocations made by one call"""
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        fn(source)
+    sizes = [e.self_cpu_memory_usage for e in prof.events()
+             if e.name != "[memory]" and e.self_cpu_memory_usage > 1024]
+    return len(sizes), sum(sizes)
+
+def numpy_peak(fn, source):
+    """Peak NumPy/Python memory allocated during one call"""
+    tracemalloc.start()
+    fn(source)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and count allocations of the pixel pre/post-processing paths")
+    parser.add_argument("--megapixels", nargs="+", type=float, default=[1, 4, 12])
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--paths", nargs="+", default=list(PATHS), choices=list(PATHS))
+    add_save_argument(parser)
+    args = parser.parse_args()
+
+    results = []
+    for megapixels in args.megapixels:
+        array = make_array(megapixels)
+        image = Image.fromarray(array)
+        actual_mp = array.shape[0] * array.shape[1] / 1e6
+        for name in args.paths:
+            fn = PATHS[name]
+            source = image if name == "legacy" else array
+            fn(source)  # warm up
+            times = []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                fn(source)
+                times.append((time.perf_counter() - started) * 1000)
+            count, total = torch_allocations(fn, source)
+            result = {
+                "path": name,
+                "megapixels": round(actual_mp, 2),
+                "ms_per_mp": round(statistics.median(times) / actual_mp, 2),
+                "torch_allocations": count,
+                "torch_mb_per_mp": round(total / 2**20 / actual_mp, 1),
+                "numpy_peak_mb_per_mp": round(numpy_peak(fn, source) / 2**20 / actual_mp, 1),
+            }
+            results.append(result)
+            print(f"{result['megapixels']:>6} MP {name:<7} {result['ms_per_mp']:>8.2f} ms/MP  "
+                  f"torch {count:>2} allocs {result['torch_mb_per_mp']:>6} MB/MP  "
+                  f"numpy peak {result['numpy_peak_mb_per_mp']:>5} MB/MP")
+
+    print(json.dumps(results, indent=2))
+    save_results("pixel_pipeline", args, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Pipeline stage microbenchmark
+
+Runs each ImageProcessor stage on synthetic low light images at several
+resolutions and reports the median time per stage (and per megapixel):
+decode, to_tensor (tile extraction), inference (forward passes through
+forward_batch), postprocess (blend and uint8 conversion), encode, and
+enhance_image end to end on the inline executor.
+
+The default model is a small convolutional stand-in network (see
+bench_inference_backends.py); --model-id loads a registered model instead and
+--model identity measures the pipeline without any network cost.
+
+Usage (from the backend directory):
+    python benchmarks/bench_stages.py --resolutions vga hd fhd 12mp --save
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import torch
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from harness import RESOLUTIONS, add_save_argument, low_light_jpeg, save_results
+from bench_inference_backends import StandInEnhancer
+from models.encoder import encode_array
+from models.execution_backend import ExecutionBackend
+from models.image_processor import ImageProcessor, decode_stage
+from models.model_manager import ModelManager
+from models.tiling import TileBlender
+
+STAGES = ("decode", "to_tensor", "inference", "postprocess", "encode", "end_to_end")
+
+def load_model(args, manager):
+    if args.model == "identity":
+        return torch.nn.Identity()
+    if args.model_id:
+        if args.model_id not in manager.registry:
+            sys.exit(f"Unknown model: {args.model_id} (available: {', '.join(sorted(manager.registry)) or 'none'})")
+        return manager.get_model(args.model_id)
+    torch.manual_seed(0)
+    return StandInEnhancer().eval()
+
+def run_stages(processor, model, data, output_path, args):
+    """Times of one pass through the stages, in ms"""
+    times = {}
+
+    started = time.perf_counter()
+    image = decode_stage(data)
+    times["decode"] = time.perf_counter() - started
+
+    blender = TileBlender(image, processor.tile_size, processor.tile_overlap)
+    times["to_tensor"] = times["inference"] = times["postprocess"] = 0.0
+    for row in range(blender.rows):
+        for start in range(0, blender.tiles_per_row, processor.tile_batch):
+            cols = range(start, min(start + processor.tile_batch, blender.tiles_per_row))
+            started = time.perf_counter()
+            tiles = blender.tile_tensors(row, cols)
+            times["to_tensor"] += time.perf_counter() - started
+
+            started = time.perf_counter()
+            outputs = [processor.forward_batch(tile.unsqueeze(0), model, "bench")[0] for tile in tiles]
+            times["inference"] += time.perf_counter() - started
+
+            started = time.perf_counter()
+            blender.accumulate(row, cols, outputs)
+            times["postprocess"] += time.perf_counter() - started
+        started = time.perf_counter()
+        blender.flush(row)
+        times["postprocess"] += time.perf_counter() - started
+
+    started = time.perf_counter()
+    encode_array(blender.output, output_path, args.format, args.preset)
+    times["encode"] = time.perf_counter() - started
+    return {name: seconds * 1000 for name, seconds in times.items()}
+
+async def end_to_end(processor, data, output_path, args):
+    started = time.perf_counter()
+    await processor.enhance_image(io.BytesIO(data), output_path, model_id="bench",
+                                  image_format=args.format, preset=args.preset)
+    return (time.perf_counter() - started) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--resolutions", nargs="+", default=["vga", "hd", "fhd"], choices=sorted(RESOLUTIONS))
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--model", choices=["standin", "identity"], default="standin")
+    parser.add_argument("--model-id", help="registered model to load instead of the stand-in network")
+    parser.add_argument("--format", default="jpeg")
+    parser.add_argument("--preset", default="balanced")
+    add_save_argument(parser)
+    args = parser.parse_args()
+
+    manager = ModelManager()
+    model = load_model(args, manager)
+    manager.models["bench"] = model
+    processor = ImageProcessor(manager, ExecutionBackend(kind="inline"))
+    workdir = Path(tempfile.mkdtemp(prefix="bench_stages_"))
+
+    async def run():
+        results = []
+        for name in args.resolutions:
+            width, height = RESOLUTIONS[name]
+            megapixels = width * height / 1e6
+            data = low_light_jpeg(width, height)
+            output_path = str(workdir / f"out_{name}.{args.format}")
+
+            run_stages(processor, model, data, output_path, args)  # warm up
+            samples = [run_stages(processor, model, data, output_path, args) for _ in range(args.iterations)]
+            for sample in samples:
+                sample["end_to_end"] = await end_to_end(processor, data, output_path, args)
+
+            result = {"resolution": name, "width": width, "height": height}
+            for stage_name in STAGES:
+                ms = statistics.median(sample[stage_name] for sample in samples)
+                result[stage_name] = {"ms": round(ms, 2), "ms_per_mp": round(ms / megapixels, 2)}
+            results.append(result)
+            print(f"{name:<5} {width}x{height} " +
+                  " ".join(f"{stage_name} {result[stage_name]['ms']:.1f}ms" for stage_name in STAGES))
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        processor.scheduler.shutdown()
+
+    print(json.dumps(results, indent=2))
+    save_results("stages", args, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tiled inference memory benchmark
+
+Runs ImageProcessor.enhance_image on synthetic images of growing size, each in
+a fresh process, and reports peak RSS. Some buffers necessarily grow with the
+image: the decoded frame (PIL keeps RGB at 4 bytes per pixel, plus the 3 byte
+uint8 array handed to the tiler) and the float blending strip, which is one
+tile high and one image wide. Everything else - the per-tile tensors, the model
+activations and the batch temporaries - is bounded by the tile size, so the
+remaining working set should stay flat.
+
+Children run with glibc's dynamic mmap threshold pinned (MALLOC_MMAP_THRESHOLD_)
+so that RSS tracks live memory rather than freed chunks the allocator keeps.
+
+Pass --tile-size larger than the biggest image to see the untiled baseline.
+
+Usage (from the backend directory):
+    python benchmarks/bench_tiled_memory.py --megapixels 1 4 8 16 24 --tile-size 512
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from harness import add_save_argument, save_results
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def rss_mb():
+    """Current resident set size in MB (Linux)"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def make_image(path, megapixels):
+    """Synthetic dark 3:2 JPEG of roughly the given size"""
+    import numpy as np
+    from PIL import Image
+    width = int((megapixels * 1e6 * 1.5) ** 0.5)
+    height = int(width / 1.5)
+    rng = np.random.default_rng(0)
+    Image.fromarray(rng.integers(0, 60, (height, width, 3), dtype=np.uint8)).save(path, quality=90)
+    return width, height
+
+async def run_child(args):
+    """Enhance one image in this process and report memory"""
+    import torch
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ["ENHANCE_TILE_SIZE"] = str(args.tile_size)
+    os.environ["ENHANCE_MAX_SIZE"] = "0"
+    from models.model_manager import ModelManager
+    from models.image_processor import ImageProcessor
+
+    model_manager = ModelManager()
+    model_manager.models["lol_real"] = torch.nn.Identity()
+    processor = ImageProcessor(model_manager)
+
+    # Warm up allocators and worker threads on a tiny image before taking the baseline
+    workdir = Path(tempfile.mkdtemp(prefix="bench_tiled_"))
+    make_image(workdir / "warmup.jpg", 0.05)
+    await processor.enhance_image(str(workdir / "warmup.jpg"), str(workdir / "warmup_out.jpg"))
+    baseline = rss_mb()
+
+    await processor.enhance_image(args.input, str(workdir / "out.jpg"))
+    processor.scheduler.shutdown()
+    processor.executor.shutdown()
+    return {"baseline_mb": baseline, "peak_mb": peak_rss_mb()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--megapixels", nargs="+", type=float, default=[1, 4, 8, 16, 24])
+    parser.add_argument("--tile-size", type=int, default=512)
+    parser.add_argument("--input", help=argparse.SUPPRESS)
+    add_save_argument(parser)
+    args = parser.parse_args()
+
+    if args.input:
+        print(json.dumps(asyncio.run(run_child(args))))
+        return
+
+    results = []
+    workdir = Path(tempfile.mkdtemp(prefix="bench_tiled_"))
+    for megapixels in args.megapixels:
+        path = workdir / f"input_{megapixels}mp.jpg"
+        width, height = make_image(path, megapixels)
+        command = [sys.executable, __file__, "--input", str(path), "--tile-size", str(args.tile_size)]
+        env = dict(os.environ)
+        env.setdefault("MALLOC_MMAP_THRESHOLD_", "131072")
+        output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+        memory = json.loads(output.strip().splitlines()[-1])
+        path.unlink()
+
+        image_buffers_mb = width * height * 7 / 2**20
+        strip_mb = min(args.tile_size, height) * width * 16 / 2**20
+        growth_mb = memory["peak_mb"] - memory["baseline_mb"]
+        result = {
+            "megapixels": round(width * height / 1e6, 2),
+            "tile_size": args.tile_size,
+            "peak_rss_mb": round(memory["peak_mb"], 1),
+            "growth_mb": round(growth_mb, 1),
+            "image_buffers_mb": round(image_buffers_mb, 1),
+            "strip_mb": round(strip_mb, 1),
+            "working_set_mb": round(growth_mb - image_buffers_mb - strip_mb, 1),
+        }
+        results.append(result)
+        print(f"{result['megapixels']:>6} MP: peak {result['peak_rss_mb']:>7} MB, growth {result['growth_mb']:>7} MB "
+              f"= image buffers {result['image_buffers_mb']:>6} + strip {result['strip_mb']:>5} "
+              f"+ working set {result['working_set_mb']:>6} MB")
+
+    print(json.dumps(results, indent=2))
+    save_results("tiled_memory", args, results)
+
+if __name__ == "__main__":
+    main()
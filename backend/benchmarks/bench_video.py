@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Video enhancement benchmark
+
+Writes synthetic low light clips of increasing length (a static scene with a
+moving light for part of the clip, like a fixed surveillance camera) and
+enhances them with VideoProcessor. Reports fps throughput, the share of
+frames reused as near-duplicates and the process's peak RSS growth, which
+should stay flat as clips get longer since frames stream through bounded
+queues.
+
+Usage (from the backend directory):
+    python benchmarks/bench_video.py --frames 100 400 1600 --resolution hd --save
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import sys
+import tempfile
+from pathlib import Path
+
+import cv2
+import torch
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from harness import RESOLUTIONS, add_save_argument, low_light_array, save_results
+from bench_inference_backends import StandInEnhancer
+from models.execution_backend import ExecutionBackend
+from models.image_processor import ImageProcessor
+from models.model_manager import ModelManager
+from models.video_processor import VideoProcessor
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def write_clip(path, frames, width, height, motion):
+    """A static dark scene; a light crosses it during the middle motion fraction of the clip"""
+    scene = low_light_array(width, height, seed=1)
+    moving = range(int(frames * (1 - motion) / 2), int(frames * (1 + motion) / 2))
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 25, (width, height))
+    for i in range(frames):
+        frame = cv2.cvtColor(scene, cv2.COLOR_RGB2BGR)
+        if i in moving:
+            frame = frame.copy()
+            x = int((i - moving.start) / max(1, len(moving)) * width)
+            cv2.circle(frame, (x, height // 2), height // 12, (180, 200, 220), -1)
+        writer.write(frame)
+    writer.release()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", nargs="+", type=int, default=[100, 400, 1600])
+    parser.add_argument("--resolution", default="vga", choices=sorted(RESOLUTIONS))
+    parser.add_argument("--motion", type=float, default=0.5, help="fraction of the clip with movement")
+    parser.add_argument("--reuse-threshold", type=float, default=None,
+                        help="VIDEO_REUSE_THRESHOLD to use (0 disables reuse)")
+    parser.add_argument("--model", choices=["standin", "identity"], default="standin")
+    add_save_argument(parser)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    manager = ModelManager()
+    manager.models["bench"] = StandInEnhancer().eval() if args.model == "standin" else torch.nn.Identity()
+    image_processor = ImageProcessor(manager, ExecutionBackend(kind="thread"))
+    video_processor = VideoProcessor(image_processor, reuse_threshold=args.reuse_threshold)
+    width, height = RESOLUTIONS[args.resolution]
+    workdir = Path(tempfile.mkdtemp(prefix="bench_video_"))
+
+    async def run():
+        results = []
+        baseline_mb = peak_rss_mb()
+        for frames in args.frames:
+            clip = workdir / f"clip_{frames}.mp4"
+            write_clip(clip, frames, width, height, args.motion)
+            result = await video_processor.enhance_video(str(clip), str(workdir / f"out_{frames}.mp4"), "bench")
+            result["peak_rss_growth_mb"] = round(peak_rss_mb() - baseline_mb, 1)
+            results.append(result)
+            print(f"{frames:>6} frames {width}x{height}: {result['fps']:>7.2f} fps, "
+                  f"{result['reused_frames']} reused, peak RSS +{result['peak_rss_growth_mb']} MB")
+            clip.unlink()
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        image_processor.scheduler.shutdown()
+        image_processor.executor.shutdown()
+
+    print(json.dumps(results, indent=2))
+    save_results("video", args, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compare two saved benchmark results
+
+Reads two JSON files written with --save (for example from two commits) and
+prints every metric that changed by more than --threshold percent. Times and
+sizes are better when lower, rates when higher; changes for the worse are
+marked REGRESSION and make the exit status 1, so the comparison can gate a
+change in CI.
+
+Usage (from the backend directory):
+    python benchmarks/compare_results.py benchmarks/results/load/<before>.json benchmarks/results/load/<after>.json
+"""
+
+import argparse
+import json
+import sys
+
+# Fields that identify an entry in a list of results
+ID_FIELDS = ("resolution", "executor", "path", "encoding", "backend", "users", "files", "megapixels", "tile_size")
+
+HIGHER_IS_BETTER = ("per_s", "per_sec", "throughput", "speedup", "psnr", "ssim")
+NOT_COMPARED = ("samples", "requests", "width", "height", "duration_s", "load_s", "populate_s")
+
+def entry_name(entry, index):
+    parts = [f"{field}={entry[field]}" for field in ID_FIELDS if field in entry]
+    return ",".join(parts) or str(index)
+
+def flatten(value, prefix=""):
+    """Numeric leaves as {"a.b[name].c": number}"""
+    if isinstance(value, dict):
+        items = {}
+        for key, child in value.items():
+            items.update(flatten(child, f"{prefix}.{key}" if prefix else key))
+        return items
+    if isinstance(value, list):
+        items = {}
+        for index, child in enumerate(value):
+            name = entry_name(child, index) if isinstance(child, dict) else str(index)
+            items.update(flatten(child, f"{prefix}[{name}]"))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+def higher_is_better(metric):
+    leaf = metric.rsplit(".", 1)[-1]
+    return any(word in leaf for word in HIGHER_IS_BETTER)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change to report (default: 10)")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before.get("benchmark") != after.get("benchmark"):
+        sys.exit(f"Different benchmarks: {before.get('benchmark')} vs {after.get('benchmark')}")
+
+    for label, data in (("before", before), ("after", after)):
+        env = data.get("environment", {})
+        dirty = " (dirty)" if env.get("dirty") else ""
+        print(f"{label:>6}: {env.get('commit')}{dirty} {env.get('timestamp')} cpus={env.get('cpu_count')}")
+    if before.get("params") != after.get("params"):
+        print("warning: the runs used different parameters")
+
+    old, new = flatten(before["results"]), flatten(after["results"])
+    regressions = 0
+    for metric in sorted(old.keys() & new.keys()):
+        if metric.rsplit(".", 1)[-1] in NOT_COMPARED or old[metric] == new[metric]:
+            continue
+        change = (new[metric] - old[metric]) / abs(old[metric]) * 100 if old[metric] else float("inf")
+        if abs(change) < args.threshold:
+            continue
+        worse = change < 0 if higher_is_better(metric) else change > 0
+        regressions += worse
+        print(f"{metric:<60} {old[metric]:>12} -> {new[metric]:<12} {change:+7.1f}%"
+              f"{'  REGRESSION' if worse else ''}")
+
+    for metric in sorted(old.keys() ^ new.keys()):
+        print(f"{metric:<60} only in {'before' if metric in old else 'after'}")
+
+    print(f"{regressions} regression(s) over {args.threshold:g}%")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
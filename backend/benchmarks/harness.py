@@ -0,0 +1,157 @@
+"""
+Shared helpers for the benchmark scripts: synthetic low light images,
+latency summaries, a local API server with a stub model, and JSON result
+files tagged with the commit they were measured on (compare two of them with
+compare_results.py).
+"""
+
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Named resolutions (width, height) used across benchmarks
+RESOLUTIONS = {
+    "vga": (640, 480),
+    "hd": (1280, 720),
+    "fhd": (1920, 1080),
+    "12mp": (4000, 3000),
+}
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+def latency_summary(values_ms):
+    """Sample count, mean, p50/p95/p99 and max of latencies in ms"""
+    return {
+        "samples": len(values_ms),
+        "mean": round(sum(values_ms) / len(values_ms), 3) if values_ms else 0.0,
+        "p50": round(percentile(values_ms, 50), 3),
+        "p95": round(percentile(values_ms, 95), 3),
+        "p99": round(percentile(values_ms, 99), 3),
+        "max": round(max(values_ms, default=0.0), 3),
+    }
+
+def low_light_array(width, height, seed=0):
+    """
+    Synthetic low light photo as a uint8 RGB array: a smooth scene with a few
+    bright light sources, exposed dark, with shot and read noise. Same seed,
+    same image.
+    """
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    scene = rng.random((height // 48 + 2, width // 48 + 2, 3)).astype(np.float32)
+    scene = cv2.resize(scene, (width, height), interpolation=cv2.INTER_CUBIC)
+    for _ in range(4):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        radius = int(rng.integers(max(2, min(width, height) // 100), max(3, min(width, height) // 30)))
+        cv2.circle(scene, (int(x), int(y)), radius, (4.0, 3.6, 3.0), -1)
+    scene = cv2.GaussianBlur(scene, (0, 0), 2)
+
+    # Underexpose, then add photon (shot) noise and sensor read noise
+    exposure = np.clip(scene, 0, 4) * 0.12
+    photons = rng.poisson(exposure * 400) / 400.0
+    noisy = photons + rng.normal(0, 0.01, photons.shape)
+    return (np.clip(noisy, 0, 1) ** (1 / 2.2) * 255).astype(np.uint8)
+
+def low_light_jpeg(width, height, seed=0, quality=90):
+    """low_light_array encoded as JPEG bytes"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(low_light_array(width, height, seed)).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+def environment():
+    """Where and on what the results were measured"""
+    def git(*command):
+        try:
+            return subprocess.run(["git", *command], cwd=BACKEND_DIR, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    info = {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    for module in ("torch", "numpy", "cv2", "PIL"):
+        try:
+            info[module] = __import__(module).__version__
+        except ImportError:
+            pass
+    return info
+
+def add_save_argument(parser):
+    parser.add_argument("--save", nargs="?", const="", default=None, metavar="PATH",
+                        help="write results as JSON (default path: benchmarks/results/<benchmark>/<time>-<commit>.json)")
+
+def save_results(name, args, results):
+    """Write results with the environment and parameters if --save was given; returns the path"""
+    if getattr(args, "save", None) is None:
+        return None
+    env = environment()
+    if args.save:
+        path = Path(args.save)
+    else:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = RESULTS_DIR / name / f"{stamp}-{env['commit'] or 'nogit'}{'-dirty' if env['dirty'] else ''}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    params = {k: v for k, v in vars(args).items() if k not in ("save", "serve")}
+    with open(path, "w") as f:
+        json.dump({"benchmark": name, "environment": env, "params": params, "results": results}, f, indent=2)
+    print(f"Saved results to {path}", file=sys.stderr)
+    return path
+
+def serve(port, stub_model=True):
+    """Run the API on a local uvicorn in a fresh working directory (call in a child process)"""
+    import uvicorn
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(tempfile.mkdtemp(prefix="bench_server_"))
+    import main
+
+    if stub_model:
+        import torch
+        main.model_manager.models["lol_real"] = torch.nn.Identity()
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+def start_server(script, port, env=None):
+    """Start script --serve --port PORT as a child process (the script calls serve())"""
+    return subprocess.Popen([sys.executable, str(script), "--serve", "--port", str(port)],
+                            env=dict(os.environ, **(env or {})))
+
+async def wait_ready(client, timeout=120):
+    """Wait for /health/ready on an httpx.AsyncClient"""
+    import asyncio
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not become ready")
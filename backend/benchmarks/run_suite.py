@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite runner
+
+Runs the pipeline stage, classical engine, auth verify, download lookup,
+gallery listing and API load benchmarks one after another and saves each
+one's results to benchmarks/results/<benchmark>/<time>-<commit>.json. Run
+it on two commits and compare the files with compare_results.py. --quick
+uses small sizes and short runs for a smoke check.
+
+Usage (from the backend directory):
+    python benchmarks/run_suite.py
+    python benchmarks/run_suite.py --quick --only stages load
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+
+# name -> (script, full arguments, quick arguments)
+SUITE = {
+    "stages": ("bench_stages.py", ["--resolutions", "vga", "hd", "fhd", "12mp"],
+               ["--resolutions", "vga", "hd", "--iterations", "1"]),
+    "classical": ("bench_classical.py", ["--resolutions", "vga", "hd", "fhd", "12mp"],
+                  ["--resolutions", "vga", "hd", "--iterations", "1"]),
+    "gallery": ("bench_gallery.py", ["--sizes", "1000", "10000", "100000"],
+                ["--sizes", "1000", "--resolution", "hd"]),
+    "auth_verify": ("bench_auth_verify.py", ["--sizes", "1000", "10000", "100000", "1000000"],
+                    ["--sizes", "1000", "10000", "--lookups", "2000"]),
+    "download_lookup": ("bench_download_lookup.py", ["--sizes", "1000", "10000", "100000"],
+                        ["--sizes", "1000", "10000", "--lookups", "1000", "--legacy-lookups", "10"]),
+    "load": ("bench_load.py", ["--users", "16", "--duration", "60", "--resolution", "hd"],
+             ["--users", "4", "--duration", "10", "--warmup", "2"]),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quick", action="store_true", help="small sizes and short runs")
+    parser.add_argument("--only", nargs="+", choices=list(SUITE), help="run only these benchmarks")
+    args = parser.parse_args()
+
+    failed = []
+    for name in args.only or SUITE:
+        script, full, quick = SUITE[name]
+        print(f"== {name}", flush=True)
+        started = time.perf_counter()
+        command = [sys.executable, str(BENCHMARKS_DIR / script), *(quick if args.quick else full), "--save"]
+        if subprocess.run(command, stdout=subprocess.DEVNULL).returncode != 0:
+            failed.append(name)
+        print(f"== {name} finished in {time.perf_counter() - started:.0f}s", flush=True)
+
+    if failed:
+        print(f"Failed: {', '.join(failed)}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
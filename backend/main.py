@@ -1,21 +1,33 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, Response, JSONResponse, PlainTextResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 import uvicorn
 import os
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
-import shutil
 import json
-import hashlib
-import secrets
+import re
+import asyncio
 
 from models.image_processor import ImageProcessor
 from models.model_manager import ModelManager
 from models.auth_manager import AuthManager
+from models.password_hasher import PasswordHasherBusy
+from models.result_cache import ResultCache
+from models.token_sweeper import TokenSweeper
+from models.upload_ingest import UploadIngestor, UploadRejected
+from models.job_queue import JobQueue, JobQueueFull
+from models.batch_runner import BatchJournal, BatchPipeline
+from models.artifact_store import ArtifactStore
+from models.retention import RetentionManager
+from models.encoder import FORMATS
+from models.video_processor import VideoProcessor, probe_video
+from models.fair_scheduler import FairScheduler, FairShareRejected
+from models.image_index import ImageIndex
+from models.metrics import REGISTRY, MetricsMiddleware, stage
 
 app = FastAPI(title="ChandraGrahan Low Light Enhancement API", version="1.0.0")
 
@@ -26,12 +38,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Trace-Id"],
 )
 
+# Per-route latency and status counts; sampled requests get a per-stage trace
+app.add_middleware(MetricsMiddleware)
+
 # Initialize managers
 model_manager = ModelManager()
 image_processor = ImageProcessor(model_manager)
+video_processor = VideoProcessor(image_processor)
 auth_manager = AuthManager()
+token_sweeper = TokenSweeper(auth_manager)
+upload_ingestor = UploadIngestor()
+job_queue = JobQueue()
+fair_scheduler = FairScheduler(image_processor)
 
 # Security
 security = HTTPBearer()
@@ -46,25 +67,199 @@ class UserLogin(BaseModel):
     email: str
     password: str
 
+# Uploads are parsed by UploadIngestor rather than FastAPI, so describe the body for /docs
+IMAGE_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"]
+                }
+            }
+        }
+    }
+}
+
+BATCH_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "file": {
+                            "type": "array",
+                            "items": {"type": "string", "format": "binary"},
+                            "description": "Images and/or zip archives of images"
+                        }
+                    },
+                    "required": ["file"]
+                }
+            }
+        }
+    }
+}
+
+VIDEO_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "file": {"type": "string", "format": "binary", "description": "MP4, MOV, AVI or MKV video"}
+                    },
+                    "required": ["file"]
+                }
+            }
+        }
+    }
+}
+
+BATCH_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
 # Create directories
 UPLOAD_DIR = Path("uploads")
 OUTPUT_DIR = Path("outputs")
+THUMBNAIL_DIR = Path("thumbnails")
+BATCH_DIR = Path("data/batches")
 UPLOAD_DIR.mkdir(exist_ok=True)
 OUTPUT_DIR.mkdir(exist_ok=True)
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize models on startup"""
+# Indexed, sharded storage for uploads and outputs; thumbnails (one kind and
+# directory per size, e.g. thumb_small) are retained and deleted with their output
+THUMBNAIL_KINDS = [f"thumb_{name}" for name in image_processor.thumbnail_sizes]
+artifact_store = ArtifactStore({
+    "upload": UPLOAD_DIR,
+    "output": OUTPUT_DIR,
+    **{f"thumb_{name}": THUMBNAIL_DIR / name for name in image_processor.thumbnail_sizes},
+}, attached_kinds=THUMBNAIL_KINDS)
+
+# Per-user history of enhanced images for GET /images
+image_index = ImageIndex(artifact_store)
+
+def forget_evicted(record):
+    """
+    Drop cache entries and history for outputs deleted by retention or
+    result cache eviction (their thumbnails went with them)
+    """
+    if record["kind"] == "output":
+        result_cache.discard_file_id(record["file_id"])
+        image_index.forget(record["file_id"])
+
+result_cache = ResultCache(artifact_store, on_evict=forget_evicted)
+
+# TTLs, per-user quotas and a global byte budget for stored files
+retention_manager = RetentionManager(artifact_store, on_evict=forget_evicted)
+
+# Gauges read when /metrics is scraped
+REGISTRY.gauge("inference_queue_depth", "Tensors waiting in the inference scheduler",
+               function=lambda: image_processor.scheduler.get_stats()["queue_depth"])
+REGISTRY.gauge("inference_batches_in_flight", "Scheduler batches currently running",
+               function=lambda: image_processor.scheduler.in_flight)
+REGISTRY.gauge("job_queue_depth", "Jobs by status in the job queue", ["status"],
+               function=lambda: {(k,): job_queue.get_stats()[k] for k in ("queued", "running")})
+REGISTRY.gauge("fair_queue_depth", "Enhancement requests waiting for their fair-share turn",
+               function=lambda: fair_scheduler.get_stats()["queued"])
+REGISTRY.gauge("password_hash_queue_depth", "Password hashes waiting for a hashing worker",
+               function=lambda: auth_manager.hasher.get_stats()["queued"])
+REGISTRY.gauge("models_loaded", "Models currently loaded",
+               function=lambda: len(model_manager.models))
+REGISTRY.gauge("model_memory_bytes", "Memory held by loaded model weights",
+               function=lambda: sum(model_manager.footprints.values()))
+REGISTRY.gauge("artifact_store_bytes", "Bytes of stored uploads and outputs",
+               function=lambda: artifact_store.total_bytes)
+REGISTRY.gauge("service_ready", "1 once models are loaded and warmed up",
+               function=lambda: int(readiness["ready"]))
+
+# Long side of the quick low resolution result returned by /enhance?preview=true
+PREVIEW_MAX_SIZE = int(os.getenv("PREVIEW_MAX_SIZE", "512"))
+
+# Outputs never change once written, so downloads can be cached and revalidated by ETag
+DOWNLOAD_CACHE_CONTROL = "public, max-age=86400"
+
+# Thumbnail URLs are per file id and never change; browsers can keep them for good
+THUMBNAIL_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Tasks that outlive the request (or event) that started them; hold on to them
+background_tasks = set()
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# Flips to ready once models are loaded and warmed up; enhancement requests wait for it
+readiness = {"ready": False, "stage": "starting", "load_ms": {}, "warmup_ms": {}, "error": None}
+
+async def prepare_models():
+    """Load and warm up models in the background so the server starts answering right away"""
+    loop = asyncio.get_running_loop()
     try:
+        readiness["stage"] = "loading"
         await model_manager.load_models()
+        readiness["load_ms"] = {k: round(v, 1) for k, v in model_manager.load_times.items()}
+        
+        model_ids = model_manager.get_available_models()
+        if not model_ids and not model_manager.registry:
+            raise Exception("No models found")
+        
+        readiness["stage"] = "warming_up"
+        for model_id in model_ids:
+            elapsed = await loop.run_in_executor(None, image_processor.warm_up, model_id)
+            readiness["warmup_ms"][model_id] = round(elapsed, 1)
+        
+        readiness["stage"] = "ready"
+        readiness["ready"] = True
         print("All models loaded successfully!")
     except Exception as e:
+        readiness["stage"] = "failed"
+        readiness["error"] = str(e)
         print(f"Error loading models: {e}")
 
+@app.on_event("startup")
+async def startup_event():
+    """Initialize models on startup"""
+    run_in_background(prepare_models())
+    
+    # Move files from the old flat uploads/ and outputs/ layout into shards
+    await asyncio.get_running_loop().run_in_executor(None, artifact_store.migrate_flat_files)
+    
+    # Pick up replaced model weights without a restart
+    model_manager.start_refresh()
+    
+    # Reclaim expired tokens in the background
+    token_sweeper.start()
+    
+    # Reclaim old files and enforce quotas in the background
+    retention_manager.start()
+    
+    # Workers for queued enhancement jobs
+    job_queue.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks and workers on shutdown"""
+    await model_manager.stop_refresh()
+    await token_sweeper.stop()
+    await retention_manager.stop()
+    await job_queue.stop()
+    image_processor.scheduler.shutdown()
+    image_processor.executor.shutdown()
+    auth_manager.shutdown()
+    image_index.close()
+    artifact_store.close()
+
 # Authentication dependency
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
-    user = auth_manager.verify_token(token)
+    user = await auth_manager.verify_token(token)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -73,16 +268,236 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         )
     return user
 
+async def enforce_fair_share(current_user: dict = Depends(get_current_user)):
+    """Per-user rate limit on enhancement requests, checked before the upload is read"""
+    try:
+        fair_scheduler.admit(current_user["id"])
+    except FairShareRejected as e:
+        raise fair_share_rejected(e)
+
+def fair_share_rejected(e):
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=e.detail,
+        headers={"Retry-After": str(max(1, round(e.retry_after)))},
+    )
+
+async def require_ready():
+    """Refuse enhancement work until models are loaded and warmed up"""
+    if not readiness["ready"]:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Service is not ready ({readiness['stage']})",
+            headers={"Retry-After": "5"},
+        )
+
+def check_model(model_id):
+    if not image_processor.has_model(model_id):
+        raise HTTPException(status_code=404, detail=f"Unknown model: {model_id}")
+
+def negotiate_output(request, image_format=None, preset=None):
+    """Output (format, preset) from the format/preset parameters or the Accept header"""
+    try:
+        return image_processor.encoder.negotiate(request.headers.get("accept"), image_format, preset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def process_upload(upload, model_id, owner, output=None, preview_size=None):
+    """
+    Enhance an ingested upload (through the result cache) and return the
+    response payload. output is the (format, preset) to encode with. With
+    preview_size the input is downscaled to that many pixels on its long
+    side first and the original upload is not kept; otherwise thumbnails
+    are encoded with the output and the image goes into the owner's
+    history (GET /images). The enhancement waits for the owner's fair-share turn; under load it
+    may run downscaled or with a cheaper model, reported as "degradation"
+    (such results are not cached). Files written for a failed attempt are
+    removed.
+    """
+    image_format, preset = output or (image_processor.encoder.default_format, image_processor.encoder.default_preset)
+    mime = FORMATS[image_format]["mime"]
+    
+    # Generate unique filename
+    file_id = str(uuid.uuid4())
+    original_filename = upload.filename
+    upload_path = artifact_store.path_for(file_id, "upload", upload.extension)
+    output_path = artifact_store.path_for(file_id, "output", FORMATS[image_format]["extension"])
+    thumbnail_paths = {} if preview_size else {
+        name: artifact_store.path_for(
+            file_id, f"thumb_{name}", FORMATS[image_processor.thumbnail_format]["extension"]
+        )
+        for name in image_processor.thumbnail_sizes
+    }
+    
+    try:
+        # A user's identical uploads for the same model version and encoding reuse their earlier result
+        variant = [image_format, preset] + ([f"preview{preview_size}"] if preview_size else [])
+        model_version = model_manager.get_model_version(model_id)
+        cache_key = result_cache.make_key(owner, upload.digest, model_id, model_version, *variant)
+        
+        # Fair-share cost is the megapixels the pipeline will process
+        pixels = (upload.width or 1000) * (upload.height or 1000)
+        cost = min(pixels, preview_size ** 2 if preview_size else pixels) / 1e6
+        
+        async def run_enhancement():
+            async with fair_scheduler.turn(owner, cost, model_id) as grant:
+                # Process image straight from the upload buffer
+                result = await image_processor.enhance_image(
+                    input_path=upload.buffer,
+                    output_path=str(output_path),
+                    model_id=grant.model_id,
+                    image_format=image_format,
+                    preset=preset,
+                    max_size=min(filter(None, (preview_size, grant.max_size)), default=None),
+                    thumbnails=thumbnail_paths
+                )
+            
+            # Keep the original upload
+            if not preview_size:
+                with stage("upload_write"):
+                    await image_processor.executor.run_local(upload.save, upload_path)
+            with stage("store"):
+                if not preview_size:
+                    await image_processor.executor.run_local(
+                        artifact_store.add, file_id, "upload", upload_path, upload.content_type, owner
+                    )
+                record = await image_processor.executor.run_local(
+                    artifact_store.add, file_id, "output", output_path, mime, owner
+                )
+                thumbnail_mime = FORMATS[image_processor.thumbnail_format]["mime"]
+                for name, path in thumbnail_paths.items():
+                    await image_processor.executor.run_local(
+                        artifact_store.add, file_id, f"thumb_{name}", path, thumbnail_mime, owner
+                    )
+            entry = {
+                "file_id": file_id,
+                "path": record["path"],
+                "size": record["size"],
+                "width": result["width"],
+                "height": result["height"],
+                "thumbnails": list(thumbnail_paths)
+            }
+            if grant.degradation:
+                entry.update(degradation=grant.degradation, transient=True)
+            elif result["model_version"] not in (None, model_version):
+                # A newer version was swapped in before this request pinned the model; the
+                # result doesn't belong under the old version's key
+                entry["transient"] = True
+            return entry
+        
+        entry, cached = await result_cache.get_or_create(cache_key, run_enhancement)
+        if not cached:
+            retention_manager.check(owner)
+        model_used = entry.get("degradation", {}).get("model", model_id)
+        if not preview_size:
+            await image_processor.executor.run_local(
+                image_index.add, owner, entry["file_id"], original_filename, model_used, image_format,
+                entry["width"], entry["height"], entry["thumbnails"]
+            )
+        
+        # Return file info
+        return {
+            "success": True,
+            "file_id": entry["file_id"],
+            "original_filename": original_filename,
+            "download_url": f"/download/{entry['file_id']}",
+            "thumbnails": thumbnail_urls(entry["file_id"], entry["thumbnails"]),
+            "model_used": model_used,
+            "format": image_format,
+            "content_type": mime,
+            "size": entry["size"],
+            "width": entry["width"],
+            "height": entry["height"],
+            "cached": cached,
+            "degradation": entry.get("degradation")
+        }
+        
+    except Exception:
+        # Clean up files on error
+        def remove_files():
+            artifact_store.remove(file_id)
+            for path in [upload_path, output_path, *thumbnail_paths.values()]:
+                path.unlink(missing_ok=True)
+        await image_processor.executor.run_local(remove_files)
+        raise
+
+def thumbnail_urls(file_id, names):
+    return {name: f"/images/{file_id}/thumbnails/{name}" for name in names}
+
+async def enhance_with_preview(upload, model_id, owner, output):
+    """
+    Enhance a downscaled copy right away and queue the full resolution
+    enhancement as a job. Returns the preview plus the job to poll; the
+    upload is closed once the job is done with it.
+    """
+    preview_done = asyncio.Event()
+    
+    async def run_full():
+        try:
+            # The preview reads the same upload buffer; let it finish first
+            await preview_done.wait()
+            return await process_upload(upload, model_id=model_id, owner=owner, output=output)
+        finally:
+            upload.close()
+    
+    try:
+        job = job_queue.submit(run_full, owner=owner)
+    except JobQueueFull:
+        upload.close()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Job queue is full, try again later",
+            headers={"Retry-After": "5"},
+        )
+    
+    try:
+        preview = await process_upload(
+            upload, model_id=model_id, owner=owner, output=(output[0], "fast"), preview_size=PREVIEW_MAX_SIZE
+        )
+        preview_error = None
+    except Exception as e:
+        # The full resolution job is still running; report the preview failure alongside it
+        preview = {"success": False, "download_url": None}
+        preview_error = f"Preview failed: {str(e)}"
+    finally:
+        preview_done.set()
+    
+    return {
+        **preview,
+        "preview": True,
+        "preview_size": PREVIEW_MAX_SIZE,
+        "preview_error": preview_error,
+        "job_id": job.id,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events"
+    }
+
+async def ingest_upload(request: Request, video=False):
+    """Stream and validate an image (or video) upload, mapping rejections to HTTP errors"""
+    try:
+        with stage("upload"):
+            return await upload_ingestor.ingest(request, video=video)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
 @app.get("/")
 async def root():
     return {"message": "ChandraGrahan Low Light Enhancement API", "status": "running"}
 
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness probe: 200 once models are loaded and warmed up, 503 until then"""
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if readiness["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=readiness
+    )
+
 # Authentication endpoints
 @app.post("/auth/register")
 async def register(user_data: UserRegister):
     """Register a new user"""
     try:
-        result = auth_manager.register_user(user_data.email, user_data.password, user_data.name)
+        result = await auth_manager.register_user(user_data.email, user_data.password, user_data.name)
         if result["success"]:
             return {
                 "success": True,
@@ -91,6 +506,12 @@ async def register(user_data: UserRegister):
             }
         else:
             raise HTTPException(status_code=400, detail=result["error"])
+    except PasswordHasherBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": "1"},
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -98,7 +519,7 @@ async def register(user_data: UserRegister):
 async def login(user_data: UserLogin):
     """Login user"""
     try:
-        result = auth_manager.login_user(user_data.email, user_data.password)
+        result = await auth_manager.login_user(user_data.email, user_data.password)
         if result["success"]:
             return {
                 "success": True,
@@ -108,6 +529,12 @@ async def login(user_data: UserLogin):
             }
         else:
             raise HTTPException(status_code=401, detail=result["error"])
+    except PasswordHasherBusy as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": "1"},
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -120,99 +547,569 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     }
 
 @app.post("/auth/logout")
-async def logout(current_user: dict = Depends(get_current_user)):
+async def logout(
+    current_user: dict = Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
     """Logout user"""
-    # In a real implementation, you might want to blacklist the token
+    # Revoke the token so it stops working immediately
+    result = await auth_manager.logout_user(credentials.credentials)
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result["error"])
     return {"success": True, "message": "Logged out successfully"}
 
 @app.get("/models")
 async def get_available_models():
-    """Get list of available models"""
+    """Get every model, whether it is loaded, its memory footprint and load latency"""
     return {
-        "models": [
-            {"id": "lol_real", "name": "LOL Real Dataset", "description": "Trained on real low light images"}
-        ]
+        "models": model_manager.list_models(),
+        "memory": model_manager.get_stats()
     }
 
-@app.post("/enhance")
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Metrics in the Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/inference")
+async def get_inference_stats():
+    """Get inference scheduler queue depth and batch size stats"""
+    return image_processor.scheduler.get_stats()
+
+@app.get("/stats/auth")
+async def get_auth_stats():
+    """Get verified-token cache hit rate, expired-token sweeper and password hashing counters"""
+    return {
+        "token_cache": auth_manager.token_cache.get_stats(),
+        "token_sweeper": token_sweeper.get_stats(),
+        "password_hasher": auth_manager.hasher.get_stats()
+    }
+
+@app.get("/stats/classical")
+async def get_classical_stats():
+    """Get the classical engine's method and histogram gate decisions"""
+    return image_processor.classical.get_stats()
+
+@app.get("/stats/encoder")
+async def get_encoder_stats():
+    """Get output encode counts, bytes and time per format and preset"""
+    return image_processor.encoder.get_stats()
+
+@app.get("/stats/cache")
+async def get_cache_stats():
+    """Get result cache hit/miss counters"""
+    return result_cache.get_stats()
+
+@app.get("/stats/retention")
+async def get_retention_stats():
+    """Get stored bytes against the retention limits and reclaim counters"""
+    return retention_manager.get_stats()
+
+@app.get("/usage")
+async def get_usage(current_user: dict = Depends(get_current_user)):
+    """Get the current user's stored bytes and files against their quota"""
+    usage = artifact_store.usage(current_user["id"])
+    quota = retention_manager.user_quota
+    return {
+        "bytes": usage["bytes"],
+        "files": usage["files"],
+        "quota_bytes": quota or None,
+        "remaining_bytes": max(0, quota - usage["bytes"]) if quota else None,
+        "upload_ttl": retention_manager.upload_ttl or None,
+        "output_ttl": retention_manager.output_ttl or None
+    }
+
+@app.get("/stats/jobs")
+async def get_job_stats():
+    """Get job queue depth and counters"""
+    return job_queue.get_stats()
+
+@app.get("/stats/fairness")
+async def get_fairness_stats():
+    """Get fair-share slot occupancy, backlog, rate limiting and degradation counters"""
+    return fair_scheduler.get_stats()
+
+@app.get("/stats/video")
+async def get_video_stats():
+    """Get processed video counts, frame reuse and fps throughput"""
+    return video_processor.get_stats()
+
+@app.post("/enhance", openapi_extra=IMAGE_UPLOAD_OPENAPI, dependencies=[Depends(require_ready), Depends(enforce_fair_share)])
 async def enhance_image(
-    file: UploadFile = File(...),
+    request: Request,
+    model_id: str = "lol_real",
+    image_format: str = Query(None, alias="format"),
+    preset: str = None,
+    preview: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Enhance a low light image using the LOL Real model
+    Enhance a low light image using the selected model (LOL Real by default).
+    The output format is the format parameter (jpeg, webp, avif or png), else the
+    best image type in the Accept header, else OUTPUT_FORMAT; preset is fast,
+    balanced or small.
+    With preview=true a low resolution result is returned right away and the
+    full resolution one is produced by a job (poll status_url or events_url).
     """
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    check_model(model_id)
+    output = negotiate_output(request, image_format, preset)
+    
+    # Validated (magic bytes, size, dimensions) and hashed while streaming in
+    upload = await ingest_upload(request)
+    
+    if preview:
+        return await enhance_with_preview(upload, model_id, current_user["id"], output)
     
     try:
-        # Generate unique filename
-        file_id = str(uuid.uuid4())
-        original_filename = file.filename
-        file_extension = Path(original_filename).suffix
-        
-        # Save uploaded file
-        upload_path = UPLOAD_DIR / f"{file_id}{file_extension}"
-        with open(upload_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Process image
-        output_path = OUTPUT_DIR / f"{file_id}_enhanced{file_extension}"
-        await image_processor.enhance_image(
-            input_path=str(upload_path),
-            output_path=str(output_path),
-            model_id="lol_real"
-        )
-        
-        # Return file info
+        return await process_upload(upload, model_id=model_id, owner=current_user["id"], output=output)
+    except FairShareRejected as e:
+        raise fair_share_rejected(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+    finally:
+        upload.close()
+
+@app.post("/enhance/batch", openapi_extra=BATCH_UPLOAD_OPENAPI, dependencies=[Depends(require_ready), Depends(enforce_fair_share)])
+async def enhance_batch(
+    request: Request,
+    batch_id: str = None,
+    model_id: str = "lol_real",
+    image_format: str = Query(None, alias="format"),
+    preset: str = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Enhance many images in one request: any number of 'file' parts, zip archives of images, or both.
+    Results stream back as NDJSON, one line per image in completion order, then a summary line.
+    Sending the batch again with the same batch_id skips images that already finished.
+    """
+    batch_id = batch_id or str(uuid.uuid4())
+    if not BATCH_ID_PATTERN.match(batch_id):
+        raise HTTPException(status_code=400, detail="batch_id may only contain letters, digits, '-' and '_'")
+    check_model(model_id)
+    output = negotiate_output(request, image_format, preset)
+    journal = BatchJournal(BATCH_DIR / current_user["id"] / f"{batch_id}.jsonl")
+    
+    async def run_item(name, upload):
+        try:
+            if upload.rejection is not None:
+                return {"filename": name, "status": "failed", "error": upload.rejection.detail}
+            
+            # Finished in an earlier attempt at this batch
+            key = f"{name}:{upload.digest}:{model_id}:{output[0]}:{output[1]}"
+            previous = journal.get(key)
+            if previous is not None and await image_processor.executor.run_local(
+                    artifact_store.get, previous["file_id"]) is not None:
+                return dict(previous, resumed=True)
+            
+            result = await process_upload(upload, model_id=model_id, owner=current_user["id"], output=output)
+            entry = {
+                "filename": name,
+                "status": "done",
+                "file_id": result["file_id"],
+                "download_url": result["download_url"],
+                "cached": result["cached"]
+            }
+            await image_processor.executor.run_local(journal.record, key, entry)
+            return entry
+        except Exception as e:
+            return {"filename": name, "status": "failed", "error": f"Processing failed: {str(e)}"}
+        finally:
+            upload.close()
+    
+    pipeline = BatchPipeline(run_item)
+    archives = []
+    
+    async def finish():
+        pipeline.close()
+        await pipeline.join()
+        journal.close()
+    
+    async def expand_archives():
+        # Archives are complete once the body is in; extract members as pipeline slots free up
+        try:
+            for archive_upload in archives:
+                try:
+                    archive, members = await image_processor.executor.run_local(
+                        upload_ingestor.open_archive, archive_upload
+                    )
+                    if pipeline.submitted + len(members) > upload_ingestor.max_batch_files:
+                        raise UploadRejected(413, f"At most {upload_ingestor.max_batch_files} files are allowed per batch")
+                except UploadRejected as e:
+                    archive_upload.rejection = e
+                    await pipeline.submit(archive_upload.filename, archive_upload)
+                    continue
+                try:
+                    for info in members:
+                        member = await image_processor.executor.run_local(
+                            upload_ingestor.read_archive_member, archive, info
+                        )
+                        await pipeline.submit(f"{archive_upload.filename}/{info.filename}", member)
+                finally:
+                    archive_upload.close()
+        finally:
+            for archive_upload in archives:
+                archive_upload.close()
+            await finish()
+    
+    # Images start processing while the rest of the body is still arriving
+    try:
+        async for upload in upload_ingestor.iter_uploads(request, batch=True):
+            if upload.is_archive:
+                archives.append(upload)
+            else:
+                await pipeline.submit(upload.filename, upload)
+    except BaseException as e:
+        for archive_upload in archives:
+            archive_upload.close()
+        run_in_background(finish())
+        if isinstance(e, UploadRejected):
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        raise
+    
+    if pipeline.submitted == 0 and not archives:
+        await finish()
+        raise HTTPException(status_code=400, detail=f"Missing '{upload_ingestor.file_field}' file field")
+    
+    run_in_background(expand_archives())
+    
+    async def results():
+        counts = {"done": 0, "resumed": 0, "failed": 0}
+        async for result in pipeline.iter_results():
+            if result["status"] == "failed":
+                counts["failed"] += 1
+            elif result.get("resumed"):
+                counts["resumed"] += 1
+            else:
+                counts["done"] += 1
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"status": "complete", "batch_id": batch_id, **counts}) + "\n"
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson", headers={"X-Batch-Id": batch_id})
+
+async def process_video_upload(upload, model_id, owner):
+    """
+    Enhance an ingested video into an MP4 output and return the job result.
+    The original upload is not kept. The output is removed if enhancement fails.
+    """
+    file_id = str(uuid.uuid4())
+    output_path = artifact_store.path_for(file_id, "output", ".mp4")
+    try:
+        result = await video_processor.enhance_video(upload.buffer.name, str(output_path), model_id)
+        with stage("store"):
+            record = await image_processor.executor.run_local(
+                artifact_store.add, file_id, "output", output_path, "video/mp4", owner
+            )
+        retention_manager.check(owner)
         return {
             "success": True,
             "file_id": file_id,
-            "original_filename": original_filename,
+            "original_filename": upload.filename,
             "download_url": f"/download/{file_id}",
-            "model_used": "lol_real"
+            "model_used": model_id,
+            "format": "mp4",
+            "content_type": "video/mp4",
+            "size": record["size"],
+            **result
         }
-        
-    except Exception as e:
-        # Clean up files on error
-        if upload_path.exists():
-            upload_path.unlink()
-        if output_path.exists():
-            output_path.unlink()
-        
-        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+    except Exception:
+        def remove_files():
+            artifact_store.remove(file_id)
+            output_path.unlink(missing_ok=True)
+        await image_processor.executor.run_local(remove_files)
+        raise
+
+@app.post("/enhance/video", status_code=status.HTTP_202_ACCEPTED, openapi_extra=VIDEO_UPLOAD_OPENAPI,
+          dependencies=[Depends(require_ready), Depends(enforce_fair_share)])
+async def enhance_video(
+    request: Request,
+    priority: int = 0,
+    model_id: str = "lol_real",
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Enhance a low light video (MP4, MOV, AVI or MKV) frame by frame as a job.
+    The result is an MP4 without audio; poll status_url (or stream events_url)
+    for its download URL and fps throughput.
+    """
+    check_model(model_id)
+    upload = await ingest_upload(request, video=True)
+    
+    try:
+        info = await image_processor.executor.run_local(probe_video, upload.buffer.name)
+        if info["width"] * info["height"] > upload_ingestor.max_pixels:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Video is {info['width']}x{info['height']}; at most {upload_ingestor.max_pixels} pixels are allowed"
+            )
+    except ValueError:
+        upload.close()
+        raise HTTPException(status_code=415, detail="Unreadable video")
+    except HTTPException:
+        upload.close()
+        raise
+    
+    async def run():
+        try:
+            return await process_video_upload(upload, model_id, current_user["id"])
+        finally:
+            upload.close()
+    
+    try:
+        job = job_queue.submit(run, owner=current_user["id"], priority=max(0, min(priority, 9)))
+    except JobQueueFull:
+        upload.close()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Job queue is full, try again later",
+            headers={"Retry-After": "5"},
+        )
+    
+    return {
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+        "video": info
+    }
+
+# Async jobs
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED, openapi_extra=IMAGE_UPLOAD_OPENAPI, dependencies=[Depends(require_ready), Depends(enforce_fair_share)])
+async def create_job(
+    request: Request,
+    priority: int = 0,
+    model_id: str = "lol_real",
+    image_format: str = Query(None, alias="format"),
+    preset: str = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Queue an enhancement and return a job id right away.
+    Poll GET /jobs/{job_id} (or stream GET /jobs/{job_id}/events) for the result.
+    """
+    check_model(model_id)
+    output = negotiate_output(request, image_format, preset)
+    upload = await ingest_upload(request)
+    
+    async def run():
+        try:
+            return await process_upload(upload, model_id=model_id, owner=current_user["id"], output=output)
+        finally:
+            upload.close()
+    
+    try:
+        job = job_queue.submit(run, owner=current_user["id"], priority=max(0, min(priority, 9)))
+    except JobQueueFull:
+        upload.close()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Job queue is full, try again later",
+            headers={"Retry-After": "5"},
+        )
+    
+    return {
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events"
+    }
+
+def get_owned_job(job_id, current_user):
+    job = job_queue.get(job_id)
+    if job is None or job.owner != current_user["id"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Get job status, timings and (once done) the download URL"""
+    return get_owned_job(job_id, current_user).to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Server-sent events with the job status on every change until it finishes"""
+    job = get_owned_job(job_id, current_user)
+    
+    async def events():
+        async for snapshot in job_queue.watch(job):
+            yield f"event: {snapshot['status']}\ndata: {json.dumps(snapshot)}\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def etag_matches(header, etag):
+    """Whether an If-None-Match / If-Range header value matches etag (weak comparison)"""
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+def parse_byte_range(header, size):
+    """
+    (start, end) inclusive for a single "bytes=" range, None to ignore the
+    header (multiple or malformed ranges), or raises ValueError if the range
+    can't be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    if not (first or last) or not (first.isdigit() or not first) or not (last.isdigit() or not last):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+def iter_file_range(path, start, end, chunk_size=256 * 1024):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def artifact_response(request, artifact, filename, cache_control=DOWNLOAD_CACHE_CONTROL):
+    """
+    Serve an artifact with its stored MIME type, answering conditional
+    (If-None-Match) and Range requests from the index record.
+    """
+    headers = {
+        "ETag": artifact["etag"],
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, artifact["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    size = artifact["size"]
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or etag_matches(if_range, artifact["etag"])):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=416,  # constant was renamed across Starlette versions
+                headers=dict(headers, **{"Content-Range": f"bytes */{size}"})
+            )
+        if byte_range is not None:
+            start, end = byte_range
+            headers.update({
+                "Content-Range": f"bytes {start}-{end}/{size}",
+                "Content-Length": str(end - start + 1),
+                "Content-Disposition": f'attachment; filename="{filename}"',
+            })
+            return StreamingResponse(
+                iter_file_range(artifact["path"], start, end),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=artifact["mime"],
+                headers=headers
+            )
+    
+    return FileResponse(path=artifact["path"], filename=filename, media_type=artifact["mime"], headers=headers)
 
 @app.get("/download/{file_id}")
-async def download_enhanced_image(file_id: str):
-    """Download the enhanced image"""
-    # Find the enhanced file
-    output_files = list(OUTPUT_DIR.glob(f"{file_id}_enhanced.*"))
-    if not output_files:
+async def download_enhanced_image(file_id: str, request: Request):
+    """Download the enhanced image (supports Range and If-None-Match)"""
+    # Indexed lookup instead of scanning the output directory, off the event loop
+    def lookup():
+        artifact = artifact_store.get(file_id, "output")
+        if artifact is not None:
+            artifact_store.touch(artifact)
+        return artifact
+    artifact = await image_processor.executor.run_local(lookup)
+    if artifact is None:
         raise HTTPException(status_code=404, detail="Enhanced image not found")
     
-    return FileResponse(
-        path=output_files[0],
-        filename=f"enhanced_{file_id}{output_files[0].suffix}",
-        media_type="image/jpeg"
+    return artifact_response(request, artifact, f"enhanced_{file_id}{Path(artifact['path']).suffix}")
+
+@app.get("/images")
+async def list_images(
+    cursor: str = None,
+    limit: int = Query(24, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    List the current user's enhanced images, newest first, one page at a
+    time; pass next_cursor back as cursor for the next page (null on the
+    last one). Each image links to its thumbnails and full download.
+    """
+    try:
+        images, next_cursor = await image_processor.executor.run_local(
+            image_index.page, current_user["id"], limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    output_ttl = retention_manager.output_ttl
+    return {
+        "images": [
+            {
+                "file_id": image["file_id"],
+                "original_filename": image["original_filename"],
+                "model_used": image["model_id"],
+                "format": image["format"],
+                "content_type": image["mime"],
+                "size": image["size"],
+                "width": image["width"],
+                "height": image["height"],
+                "created_at": datetime.fromtimestamp(image["created_at"]).isoformat(),
+                # Outputs are reclaimed output_ttl after they were last downloaded
+                "expires_at": datetime.fromtimestamp(image["last_access"] + output_ttl).isoformat() if output_ttl else None,
+                "download_url": f"/download/{image['file_id']}",
+                "thumbnails": thumbnail_urls(image["file_id"], image["thumbnails"])
+            }
+            for image in images
+        ],
+        "next_cursor": next_cursor
+    }
+
+@app.get("/images/{file_id}/thumbnails/{size}")
+async def get_thumbnail(file_id: str, size: str, request: Request):
+    """A thumbnail of an enhanced image (size is small or medium); cacheable for good"""
+    # Not touched: thumbnails are retained for as long as their output is
+    artifact = None
+    if size in image_processor.thumbnail_sizes:
+        artifact = await image_processor.executor.run_local(artifact_store.get, file_id, f"thumb_{size}")
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return artifact_response(
+        request, artifact, f"thumbnail_{size}_{file_id}{Path(artifact['path']).suffix}", THUMBNAIL_CACHE_CONTROL
     )
 
 @app.delete("/cleanup/{file_id}")
-async def cleanup_files(file_id: str):
-    """Clean up uploaded and processed files"""
+async def cleanup_files(file_id: str, current_user: dict = Depends(get_current_user)):
+    """Clean up the current user's uploaded and processed files"""
+    def remove_files():
+        # Only the owner may delete; anyone else gets the same 404 as for a missing file
+        records = [artifact_store.get(file_id, kind) for kind in ("output", "upload")]
+        if not any(record and record["owner"] == current_user["id"] for record in records):
+            return False
+        # Remove the upload and output together with their index entries
+        artifact_store.remove(file_id)
+        image_index.forget(file_id)
+        return True
+
     try:
-        # Remove uploaded file
-        upload_files = list(UPLOAD_DIR.glob(f"{file_id}.*"))
-        for file in upload_files:
-            file.unlink()
-        
-        # Remove output file
-        output_files = list(OUTPUT_DIR.glob(f"{file_id}_enhanced.*"))
-        for file in output_files:
-            file.unlink()
-        
-        return {"success": True, "message": "Files cleaned up"}
+        removed = await image_processor.executor.run_local(remove_files)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Cleanup failed: {str(e)}")
+    if not removed:
+        raise HTTPException(status_code=404, detail="File not found")
+    result_cache.discard_file_id(file_id)
+    return {"success": True, "message": "Files cleaned up"}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,274 @@
+import mimetypes
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+ARTIFACT_FIELDS = ("file_id", "kind", "path", "size", "mime", "owner", "created_at", "etag", "last_access")
+
+# Downloads refresh last_access at most this often (seconds), to keep reads from writing every time
+ACCESS_RESOLUTION = 60
+
+class ArtifactStore:
+    """
+    Uploaded and enhanced files with a persistent SQLite index.
+
+    Each kind of file ("upload", "output") has its own root directory, and
+    files are sharded two levels deep by the first characters of their id
+    (outputs/3f/a2/<id>_enhanced.jpg) so no directory grows unbounded. The
+    index maps (file_id, kind) to path, size, MIME type, owner, creation
+    time, ETag and last access time, so lookups are a primary key read
+    instead of a directory scan.
+
+    Byte and file counts per owner are loaded with one aggregate query at
+    startup and then kept up to date on every add and remove, so usage never
+    requires rescanning directories.
+
+    attached_kinds (e.g. an output's thumbnails) live and die with the
+    output of the same file_id: least_recently_used never picks them, it
+    reports their bytes with the output as "attached_size", and deleting
+    an output deletes them too.
+    """
+    def __init__(self, roots, db_path=None, attached_kinds=()):
+        self.roots = {kind: Path(root) for kind, root in roots.items()}
+        self.attached_kinds = tuple(attached_kinds)
+        for root in self.roots.values():
+            root.mkdir(parents=True, exist_ok=True)
+        self.db_path = Path(db_path or os.getenv("ARTIFACT_DB_PATH", "data/artifacts.db"))
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.RLock()
+
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # The index can be rebuilt from the files, so don't fsync every insert
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            "file_id TEXT NOT NULL, kind TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL, "
+            "mime TEXT, owner TEXT, created_at REAL NOT NULL, etag TEXT NOT NULL, "
+            "PRIMARY KEY (file_id, kind))"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(artifacts)")]
+        if "last_access" not in columns:
+            self.conn.execute("ALTER TABLE artifacts ADD COLUMN last_access REAL")
+            self.conn.execute("UPDATE artifacts SET last_access = created_at")
+        self.conn.execute("DROP INDEX IF EXISTS artifacts_owner")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS artifacts_owner_access ON artifacts (owner, last_access)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS artifacts_kind_access ON artifacts (kind, last_access)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS artifacts_access ON artifacts (last_access)")
+
+        self.usage_by_owner = {}  # owner -> {"bytes", "files"}
+        self.total_bytes = 0
+        self.total_files = 0
+        for owner, size, files in self.conn.execute("SELECT owner, SUM(size), COUNT(*) FROM artifacts GROUP BY owner"):
+            self.usage_by_owner[owner] = {"bytes": size, "files": files}
+            self.total_bytes += size
+            self.total_files += files
+
+    @staticmethod
+    def file_name(file_id, kind, extension):
+        if kind == "output":
+            return f"{file_id}_enhanced{extension}"
+        return f"{file_id}{extension}"
+
+    def path_for(self, file_id, kind, extension):
+        """Sharded location for a new artifact; creates its directory"""
+        directory = self.roots[kind] / file_id[:2] / file_id[2:4]
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / self.file_name(file_id, kind, extension)
+
+    def add(self, file_id, kind, path, mime=None, owner=None, created_at=None):
+        """Index a file that has been written to path; returns its record"""
+        stat = os.stat(path)
+        created_at = created_at or time.time()
+        record = {
+            "file_id": file_id,
+            "kind": kind,
+            "path": str(path),
+            "size": stat.st_size,
+            "mime": mime or mimetypes.guess_type(str(path))[0] or "application/octet-stream",
+            "owner": owner,
+            "created_at": created_at,
+            # Artifacts are never rewritten in place, so size and mtime identify the content
+            "etag": f'"{file_id[:8]}-{stat.st_size:x}-{stat.st_mtime_ns:x}"',
+            "last_access": created_at,
+        }
+        with self.lock:
+            previous = self.get(file_id, kind)
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO artifacts ({', '.join(ARTIFACT_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                tuple(record[field] for field in ARTIFACT_FIELDS)
+            )
+            if previous is not None:
+                self._count(previous, -1)
+            self._count(record, 1)
+        return record
+
+    def _count(self, record, sign):
+        """Apply an added (+1) or removed (-1) record to the usage counters"""
+        usage = self.usage_by_owner.setdefault(record["owner"], {"bytes": 0, "files": 0})
+        usage["bytes"] += sign * record["size"]
+        usage["files"] += sign
+        if usage["files"] <= 0:
+            del self.usage_by_owner[record["owner"]]
+        self.total_bytes += sign * record["size"]
+        self.total_files += sign
+
+    def get(self, file_id, kind="output"):
+        """Record of an artifact, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(ARTIFACT_FIELDS)} FROM artifacts WHERE file_id = ? AND kind = ?",
+                (file_id, kind)
+            ).fetchone()
+        return dict(zip(ARTIFACT_FIELDS, row)) if row else None
+
+    def touch(self, record, now=None):
+        """Mark an artifact as just used (for LRU retention); cheap no-op if it was touched recently"""
+        now = now or time.time()
+        if now - (record["last_access"] or 0) < ACCESS_RESOLUTION:
+            return
+        with self.lock:
+            self.conn.execute(
+                "UPDATE artifacts SET last_access = ? WHERE file_id = ? AND kind = ?",
+                (now, record["file_id"], record["kind"])
+            )
+
+    def remove(self, file_id, kind=None):
+        """Delete the artifacts of file_id (all kinds unless given); returns the removed records"""
+        query = f"SELECT {', '.join(ARTIFACT_FIELDS)} FROM artifacts WHERE file_id = ?"
+        params = (file_id,)
+        if kind is not None:
+            query += " AND kind = ?"
+            params += (kind,)
+        with self.lock:
+            records = [dict(zip(ARTIFACT_FIELDS, row)) for row in self.conn.execute(query, params)]
+            return self._delete(records)
+
+    def remove_records(self, records):
+        """
+        Delete the given artifacts (e.g. chosen by least_recently_used) in one
+        transaction; returns them with the attached artifacts deleted along
+        """
+        with self.lock:
+            return self._delete(records)
+
+    def _attached(self, records):
+        """Attached artifacts of the outputs among records that records doesn't already hold"""
+        if not self.attached_kinds:
+            return []
+        held = {(record["file_id"], record["kind"]) for record in records}
+        attached = []
+        for record in records:
+            if record["kind"] != "output":
+                continue
+            rows = self.conn.execute(
+                f"SELECT {', '.join(ARTIFACT_FIELDS)} FROM artifacts WHERE file_id = ? "
+                f"AND kind IN ({', '.join('?' * len(self.attached_kinds))})",
+                (record["file_id"],) + self.attached_kinds
+            )
+            attached += [dict(zip(ARTIFACT_FIELDS, row)) for row in rows if (row[0], row[1]) not in held]
+        return attached
+
+    def _delete(self, records):
+        if not records:
+            return []
+        records = list(records) + self._attached(records)
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.executemany(
+                "DELETE FROM artifacts WHERE file_id = ? AND kind = ?",
+                [(record["file_id"], record["kind"]) for record in records]
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        for record in records:
+            self._count(record, -1)
+            try:
+                Path(record["path"]).unlink(missing_ok=True)
+            except OSError as e:
+                print(f"Failed to delete {record['path']}: {e}")
+        return records
+
+    def least_recently_used(self, limit, kind=None, owner=None, accessed_before=None):
+        """
+        Up to limit records in least recently used order, optionally
+        filtered. Attached kinds are left out; each record's attached_size
+        is the bytes deleting it would free on top of its own.
+        """
+        conditions = []
+        params = []
+        attached_size = "0"
+        if self.attached_kinds:
+            placeholders = ", ".join("?" * len(self.attached_kinds))
+            conditions.append(f"kind NOT IN ({placeholders})")
+            params += self.attached_kinds
+            attached_size = (
+                f"(SELECT COALESCE(SUM(t.size), 0) FROM artifacts t "
+                f"WHERE t.file_id = artifacts.file_id AND t.kind IN ({placeholders}))"
+            )
+        if kind is not None:
+            conditions.append("kind = ?")
+            params.append(kind)
+        if owner is not None:
+            conditions.append("owner = ?")
+            params.append(owner)
+        if accessed_before is not None:
+            conditions.append("last_access < ?")
+            params.append(accessed_before)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(ARTIFACT_FIELDS)}, {attached_size} FROM artifacts {where}"
+                f"ORDER BY last_access LIMIT ?",
+                self.attached_kinds + tuple(params) + (limit,)
+            ).fetchall()
+        return [dict(zip(ARTIFACT_FIELDS + ("attached_size",), row)) for row in rows]
+
+    def usage(self, owner):
+        """Bytes and file count held by an owner"""
+        with self.lock:
+            return dict(self.usage_by_owner.get(owner, {"bytes": 0, "files": 0}))
+
+    def owners_over(self, max_bytes):
+        """Owners currently holding more than max_bytes"""
+        with self.lock:
+            return [
+                owner for owner, usage in self.usage_by_owner.items()
+                if owner is not None and usage["bytes"] > max_bytes
+            ]
+
+    def count(self):
+        return self.total_files
+
+    def migrate_flat_files(self):
+        """
+        Move files left at the top level of the roots by the old flat layout
+        into their shards and index them. Cheap once done: only top-level
+        files are looked at.
+        """
+        migrated = 0
+        for kind, root in self.roots.items():
+            for path in root.iterdir():
+                if not path.is_file():
+                    continue
+                stem = path.stem
+                if kind == "output":
+                    if not stem.endswith("_enhanced"):
+                        continue
+                    stem = stem[:-len("_enhanced")]
+                created_at = path.stat().st_mtime
+                target = self.path_for(stem, kind, path.suffix)
+                os.replace(path, target)
+                self.add(stem, kind, target, created_at=created_at)
+                migrated += 1
+        if migrated:
+            print(f"Migrated {migrated} files to the sharded artifact store")
+        return migrated
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
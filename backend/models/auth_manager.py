@@ -1,12 +1,19 @@
-import json
-import hashlib
 import secrets
 import os
+import time
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from .auth_store import AuthStore
+from .token_cache import TokenCache
+from .password_hasher import PasswordHasher, PasswordHasherBusy
+from .metrics import AUTH_VERIFY_SECONDS, trace_stage
+
 class AuthManager:
-    def __init__(self):
+    def __init__(self, store=None, hasher=None):
         self.users_file = Path("data/users.json")
         self.tokens_file = Path("data/tokens.json")
         self.secret_key = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
@@ -14,60 +21,41 @@ class AuthManager:
         # Create data directory if it doesn't exist
         self.users_file.parent.mkdir(exist_ok=True)
         
-        # Initialize files if they don't exist
-        self._initialize_files()
-
-    def _initialize_files(self):
-        """Initialize user and token files if they don't exist"""
-        if not self.users_file.exists():
-            with open(self.users_file, 'w') as f:
-                json.dump({}, f)
+        # In-memory indexed store persisted to SQLite; imports the old JSON files once
+        self.store = store or AuthStore(os.getenv("AUTH_DB_PATH", "data/auth.db"))
+        self.store.import_json(self.users_file, self.tokens_file)
         
-        if not self.tokens_file.exists():
-            with open(self.tokens_file, 'w') as f:
-                json.dump({}, f)
-
-    def _load_users(self):
-        """Load users from file"""
-        try:
-            with open(self.users_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
-
-    def _save_users(self, users):
-        """Save users to file"""
-        with open(self.users_file, 'w') as f:
-            json.dump(users, f, indent=2)
-
-    def _load_tokens(self):
-        """Load tokens from file"""
-        try:
-            with open(self.tokens_file, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        # Verified tokens -> user records, so hot endpoints skip the store lookup
+        self.token_cache = TokenCache()
+        
+        # bcrypt on a bounded pool of its own, off the event loop
+        self.hasher = hasher or PasswordHasher()
+        
+        # Store writes commit with a full fsync; one thread runs them off the event loop
+        # (SQLite takes one writer at a time anyway)
+        self.store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="auth-store")
 
-    def _save_tokens(self, tokens):
-        """Save tokens to file"""
-        with open(self.tokens_file, 'w') as f:
-            json.dump(tokens, f, indent=2)
+    async def _store_write(self, fn, *args, **kwargs):
+        """Run a store write on the store thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.store_executor, lambda: fn(*args, **kwargs))
 
-    def _hash_password(self, password):
-        """Hash password using SHA-256"""
-        return hashlib.sha256(password.encode()).hexdigest()
+    def _public_user(self, user):
+        """Remove password from a user record"""
+        return {k: v for k, v in user.items() if k != 'password'}
 
     def _generate_token(self):
         """Generate a secure random token"""
         return secrets.token_urlsafe(32)
 
-    def register_user(self, email, password, name):
-        """Register a new user"""
+    async def register_user(self, email, password, name):
+        """
+        Register a new user. Raises PasswordHasherBusy if the hashing queue
+        is full.
+        """
         try:
-            users = self._load_users()
-            
             # Check if user already exists
-            if email in users:
+            if self.store.get_user_by_email(email):
                 return {"success": False, "error": "User already exists"}
             
             # Validate input
@@ -77,131 +65,145 @@ class AuthManager:
             if not email or '@' not in email:
                 return {"success": False, "error": "Invalid email address"}
             
-            # Create new user
-            user_id = str(len(users) + 1)
-            hashed_password = self._hash_password(password)
+            hashed_password = await self.hasher.hash(password)
             
+            # Create new user; random ids stay unique across server processes
             user_data = {
-                "id": user_id,
+                "id": str(uuid.uuid4()),
                 "email": email,
                 "name": name,
                 "password": hashed_password,
                 "created_at": datetime.now().isoformat(),
                 "last_login": None
             }
+            if not await self._store_write(self.store.add_user, user_data):
+                return {"success": False, "error": "User already exists"}
             
-            users[email] = user_data
-            self._save_users(users)
-            
-            # Remove password from response
-            user_response = {k: v for k, v in user_data.items() if k != 'password'}
-            
-            return {"success": True, "user": user_response}
+            return {"success": True, "user": self._public_user(user_data)}
             
+        except PasswordHasherBusy:
+            raise
         except Exception as e:
             return {"success": False, "error": f"Registration failed: {str(e)}"}
 
-    def login_user(self, email, password):
-        """Login user and return token"""
+    async def login_user(self, email, password):
+        """
+        Login user and return token. A password stored with a legacy SHA-256
+        hash is rehashed with bcrypt on success. Raises PasswordHasherBusy if
+        the hashing queue is full.
+        """
         try:
-            users = self._load_users()
+            user = self.store.get_user_by_email(email)
             
-            # Check if user exists
-            if email not in users:
+            # Check if user exists (still spending a verify's time on it)
+            if user is None:
+                await self.hasher.dummy_verify()
                 return {"success": False, "error": "Invalid email or password"}
             
-            user = users[email]
-            hashed_password = self._hash_password(password)
-            
             # Verify password
-            if user["password"] != hashed_password:
+            matches, new_hash = await self.hasher.verify(password, user["password"])
+            if not matches:
                 return {"success": False, "error": "Invalid email or password"}
             
-            # Generate token
-            token = self._generate_token()
+            changes = {"last_login": datetime.now().isoformat()}
+            if new_hash is not None:
+                changes["password"] = new_hash
+                self.hasher.record_rehash()
             
-            # Save token
-            tokens = self._load_tokens()
-            tokens[token] = {
+            # Generate and save token, updating last login (and the migrated hash) in the same commit
+            token = self._generate_token()
+            user = await self._store_write(self.store.record_login, token, {
                 "user_id": user["id"],
                 "email": email,
                 "created_at": datetime.now().isoformat(),
                 "expires_at": (datetime.now() + timedelta(days=7)).isoformat()
-            }
-            self._save_tokens(tokens)
-            
-            # Update last login
-            user["last_login"] = datetime.now().isoformat()
-            users[email] = user
-            self._save_users(users)
-            
-            # Remove password from response
-            user_response = {k: v for k, v in user.items() if k != 'password'}
+            }, user["id"], **changes)
+            self.token_cache.invalidate_user(user["id"])
             
             return {
                 "success": True, 
                 "token": token, 
-                "user": user_response
+                "user": self._public_user(user)
             }
             
+        except PasswordHasherBusy:
+            raise
         except Exception as e:
             return {"success": False, "error": f"Login failed: {str(e)}"}
 
-    def verify_token(self, token):
-        """Verify token and return user data"""
+    async def verify_token(self, token):
+        """
+        Verify token and return user data. The token cache and in-memory
+        indexes are checked on the event loop; a miss there (a token another
+        process issued, or a bogus one) reads the database on a worker thread.
+        """
+        started = time.perf_counter()
+        user, outcome = self._verify_token(token, read_through=False)
+        if outcome == "miss":
+            loop = asyncio.get_running_loop()
+            user, outcome = await loop.run_in_executor(None, self._verify_token, token, True)
+        elapsed = time.perf_counter() - started
+        AUTH_VERIFY_SECONDS.observe(elapsed, outcome=outcome)
+        trace_stage("auth_verify", elapsed)
+        return user
+
+    def _verify_token(self, token, read_through):
+        """
+        (user or None, outcome) where outcome is cache_hit, db or invalid,
+        or miss if the token or its user isn't indexed and read_through is off
+        """
         try:
-            tokens = self._load_tokens()
-            
-            if token not in tokens:
-                return None
+            user = self.token_cache.get(token)
+            if user is not None:
+                return user, "cache_hit"
             
-            token_data = tokens[token]
+            token_data = self.store.get_token(token, read_through)
+            if token_data is None:
+                return None, "invalid" if read_through else "miss"
             
-            # Check if token is expired
+            # Check if token is expired (TokenSweeper deletes it, off the event loop)
             expires_at = datetime.fromisoformat(token_data["expires_at"])
             if datetime.now() > expires_at:
-                # Remove expired token
-                del tokens[token]
-                self._save_tokens(tokens)
-                return None
+                return None, "invalid"
             
             # Get user data
-            users = self._load_users()
-            user_email = token_data["email"]
+            user = self.store.get_user_by_email(token_data["email"], read_through)
+            if user is None:
+                return None, "invalid" if read_through else "miss"
             
-            if user_email not in users:
-                return None
-            
-            user = users[user_email]
-            # Remove password from response
-            user_response = {k: v for k, v in user.items() if k != 'password'}
-            
-            return user_response
+            user = self._public_user(user)
+            self.token_cache.put(token, user, expires_at.timestamp())
+            return user, "db"
             
         except Exception as e:
             print(f"Token verification error: {e}")
-            return None
+            return None, "invalid"
 
-    def logout_user(self, token):
+    async def logout_user(self, token):
         """Logout user by removing token"""
         try:
-            tokens = self._load_tokens()
-            if token in tokens:
-                del tokens[token]
-                self._save_tokens(tokens)
+            await self._store_write(self.store.remove_token, token)
+            self.token_cache.invalidate_token(token)
             return {"success": True}
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    async def update_user(self, user_id, **changes):
+        """Update a user record and drop any cached copies of it"""
+        user = await self._store_write(self.store.update_user, user_id, **changes)
+        self.token_cache.invalidate_user(user_id)
+        return user
+
     def get_user_by_id(self, user_id):
         """Get user by ID"""
         try:
-            users = self._load_users()
-            for user in users.values():
-                if user["id"] == user_id:
-                    user_response = {k: v for k, v in user.items() if k != 'password'}
-                    return user_response
-            return None
+            user = self.store.get_user_by_id(user_id)
+            return self._public_user(user) if user else None
         except Exception as e:
             print(f"Get user error: {e}")
             return None
+
+    def shutdown(self):
+        """Stop the hashing and store threads"""
+        self.hasher.shutdown()
+        self.store_executor.shutdown(wait=True)
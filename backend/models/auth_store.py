@@ -0,0 +1,272 @@
+import heapq
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+USER_FIELDS = ("id", "email", "name", "password", "created_at", "last_login")
+TOKEN_FIELDS = ("token", "user_id", "email", "created_at", "expires_at")
+
+class AuthStore:
+    """
+    Users and tokens held in memory with hash indexes by email, user id and
+    token. Every change is written through to SQLite (WAL mode) before the
+    in-memory indexes are updated, so a restart reloads the same state. A
+    lookup that misses the indexes falls back to the database, which picks
+    up users and tokens another server process has written since; hits
+    never touch disk.
+
+    Tokens are also kept in a min-heap ordered by expiry so expired ones can be
+    reclaimed in O(expired log n) without scanning all tokens. Heap entries of
+    tokens that were already removed (e.g. by logout) are skipped lazily.
+    """
+    def __init__(self, db_path="data/auth.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.RLock()
+
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "id TEXT PRIMARY KEY, email TEXT UNIQUE NOT NULL, name TEXT, password TEXT NOT NULL, "
+            "created_at TEXT, last_login TEXT)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            "token TEXT PRIMARY KEY, user_id TEXT NOT NULL, email TEXT NOT NULL, "
+            "created_at TEXT, expires_at TEXT NOT NULL)"
+        )
+
+        self.users_by_email = {}
+        self.users_by_id = {}
+        self.tokens = {}
+        self.expiry_heap = []  # (expires timestamp, token)
+        self._load()
+
+    def _load(self):
+        """Build the in-memory indexes from the database"""
+        for row in self.conn.execute(f"SELECT {', '.join(USER_FIELDS)} FROM users"):
+            self._index_user(dict(zip(USER_FIELDS, row)))
+        for row in self.conn.execute(f"SELECT {', '.join(TOKEN_FIELDS)} FROM tokens"):
+            self.tokens[row[0]] = dict(zip(TOKEN_FIELDS[1:], row[1:]))
+            self.expiry_heap.append((self._expiry_ts(self.tokens[row[0]]), row[0]))
+        heapq.heapify(self.expiry_heap)
+
+    def _index_user(self, user):
+        self.users_by_email[user["email"]] = user
+        self.users_by_id[user["id"]] = user
+        return user
+
+    def _read_user(self, field, value):
+        """Index miss: read a user another process may have added; None if there is none"""
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(USER_FIELDS)} FROM users WHERE {field} = ?", (value,)
+            ).fetchone()
+            return self._index_user(dict(zip(USER_FIELDS, row))) if row else None
+
+    def _read_token(self, token):
+        """Index miss: read a token another process may have issued; None if there is none"""
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(TOKEN_FIELDS[1:])} FROM tokens WHERE token = ?", (token,)
+            ).fetchone()
+            if row is None:
+                return None
+            token_data = self.tokens[token] = dict(zip(TOKEN_FIELDS[1:], row))
+            heapq.heappush(self.expiry_heap, (self._expiry_ts(token_data), token))
+            return token_data
+
+    @staticmethod
+    def _expiry_ts(token_data):
+        return datetime.fromisoformat(token_data["expires_at"]).timestamp()
+
+    def import_json(self, users_file, tokens_file):
+        """
+        One-time migration from the old users.json / tokens.json files.
+        Only runs against an empty store; migrated files are renamed aside.
+        """
+        users_file = Path(users_file)
+        tokens_file = Path(tokens_file)
+        if self.users_by_email or not users_file.exists():
+            return 0
+
+        try:
+            with open(users_file, 'r') as f:
+                users = json.load(f)
+            tokens = {}
+            if tokens_file.exists():
+                with open(tokens_file, 'r') as f:
+                    tokens = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Auth migration skipped: {e}")
+            return 0
+
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    f"INSERT INTO users ({', '.join(USER_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                    [tuple(user.get(field) for field in USER_FIELDS) for user in users.values()]
+                )
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO tokens ({', '.join(TOKEN_FIELDS)}) VALUES (?, ?, ?, ?, ?)",
+                    [(token,) + tuple(data.get(field) for field in TOKEN_FIELDS[1:]) for token, data in tokens.items()]
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.users_by_email.clear()
+            self.users_by_id.clear()
+            self.tokens.clear()
+            self.expiry_heap.clear()
+            self._load()
+
+        for path in (users_file, tokens_file):
+            if path.exists():
+                path.rename(path.with_name(path.name + ".migrated"))
+        print(f"Migrated {len(users)} users and {len(tokens)} tokens to {self.db_path}")
+        return len(users)
+
+    # Users
+
+    def user_count(self):
+        return len(self.users_by_id)
+
+    def get_user_by_email(self, email, read_through=True):
+        """The user with this email; without read_through only the in-memory index is looked at"""
+        user = self.users_by_email.get(email)
+        if user is None and read_through:
+            user = self._read_user("email", email)
+        return user
+
+    def get_user_by_id(self, user_id):
+        return self.users_by_id.get(user_id) or self._read_user("id", user_id)
+
+    def add_user(self, user):
+        """Insert a new user; returns False if the email is already taken (here or by another process)"""
+        with self.lock:
+            if user["email"] in self.users_by_email:
+                return False
+            try:
+                self.conn.execute(
+                    f"INSERT INTO users ({', '.join(USER_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                    tuple(user.get(field) for field in USER_FIELDS)
+                )
+            except sqlite3.IntegrityError:
+                return False
+            self._index_user(user)
+            return True
+
+    def update_user(self, user_id, **changes):
+        """Update fields of an existing user and return the new record"""
+        with self.lock:
+            current = self.get_user_by_id(user_id)
+            if current is None:
+                return None
+            assignments = ", ".join(f"{field} = ?" for field in changes)
+            self.conn.execute(
+                f"UPDATE users SET {assignments} WHERE id = ?",
+                tuple(changes.values()) + (user_id,)
+            )
+            # Replace rather than mutate so readers holding the old dict stay consistent
+            updated = dict(current, **changes)
+            self.users_by_id[user_id] = updated
+            self.users_by_email[updated["email"]] = updated
+            return updated
+
+    def record_login(self, token, token_data, user_id, **changes):
+        """
+        Add a login's token and apply its user changes (last_login, a
+        migrated hash) in one transaction, so a login costs one commit.
+        Returns the updated user, or None if there is no such user.
+        """
+        with self.lock:
+            current = self.get_user_by_id(user_id)
+            if current is None:
+                return None
+            assignments = ", ".join(f"{field} = ?" for field in changes)
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.execute(
+                    f"INSERT INTO tokens ({', '.join(TOKEN_FIELDS)}) VALUES (?, ?, ?, ?, ?)",
+                    (token,) + tuple(token_data.get(field) for field in TOKEN_FIELDS[1:])
+                )
+                self.conn.execute(
+                    f"UPDATE users SET {assignments} WHERE id = ?",
+                    tuple(changes.values()) + (user_id,)
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.tokens[token] = token_data
+            heapq.heappush(self.expiry_heap, (self._expiry_ts(token_data), token))
+            return self._index_user(dict(current, **changes))
+
+    # Tokens
+
+    def get_token(self, token, read_through=True):
+        """A token's data; without read_through only the in-memory index is looked at"""
+        token_data = self.tokens.get(token)
+        if token_data is None and read_through:
+            token_data = self._read_token(token)
+        return token_data
+
+    def add_token(self, token, token_data):
+        with self.lock:
+            self.conn.execute(
+                f"INSERT INTO tokens ({', '.join(TOKEN_FIELDS)}) VALUES (?, ?, ?, ?, ?)",
+                (token,) + tuple(token_data.get(field) for field in TOKEN_FIELDS[1:])
+            )
+            self.tokens[token] = token_data
+            heapq.heappush(self.expiry_heap, (self._expiry_ts(token_data), token))
+
+    def remove_token(self, token):
+        """Remove a token; returns its data, or None if it did not exist"""
+        with self.lock:
+            token_data = self.get_token(token)
+            if token_data is None:
+                return None
+            self.conn.execute("DELETE FROM tokens WHERE token = ?", (token,))
+            del self.tokens[token]
+            return token_data
+
+    def remove_expired_tokens(self, now, limit=None):
+        """
+        Delete up to limit tokens that expired at or before now (a timestamp)
+        in one transaction. Returns the removed tokens.
+        """
+        with self.lock:
+            expired = []
+            while self.expiry_heap and self.expiry_heap[0][0] <= now:
+                if limit is not None and len(expired) >= limit:
+                    break
+                _, token = heapq.heappop(self.expiry_heap)
+                if token in self.tokens:
+                    expired.append(token)
+
+            if expired:
+                self.conn.execute("BEGIN")
+                try:
+                    self.conn.executemany("DELETE FROM tokens WHERE token = ?", [(token,) for token in expired])
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    for token in expired:
+                        heapq.heappush(self.expiry_heap, (self._expiry_ts(self.tokens[token]), token))
+                    raise
+                for token in expired:
+                    del self.tokens[token]
+            return expired
+
+    def token_count(self):
+        return len(self.tokens)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
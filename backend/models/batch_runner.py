@@ -0,0 +1,102 @@
+import asyncio
+import json
+import os
+import threading
+from pathlib import Path
+
+class BatchJournal:
+    """
+    Append-only JSON-lines record of the finished items of a batch, so an
+    interrupted batch can be run again and skip the work already done.
+    A torn last line (crash mid-write) is ignored on load.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        needs_newline = False
+        if self.path.exists():
+            with open(self.path, "rb") as f:
+                data = f.read()
+            for line in data.splitlines():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.entries[entry.pop("key")] = entry
+            needs_newline = bool(data) and not data.endswith(b"\n")
+
+        self.file = open(self.path, "a")
+        if needs_newline:
+            self.file.write("\n")
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def record(self, key, entry):
+        """Append a finished item; flushed so it survives the process being killed"""
+        with self.lock:
+            self.file.write(json.dumps(dict(entry, key=key)) + "\n")
+            self.file.flush()
+            self.entries[key] = entry
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+class BatchPipeline:
+    """
+    Runs an async process(*args) for a stream of batch items with at most
+    concurrency items in flight, and hands the results back in completion
+    order.
+
+    submit() waits for a free slot, which pushes back on whatever produces
+    the items (a request body, a directory walk) so buffered inputs stay
+    bounded. Keeping many items in flight is what lets decode and encode run
+    on every executor worker while the inference scheduler fills batches.
+    process must not raise; failures are reported as results.
+    """
+    def __init__(self, process, concurrency=None):
+        self.process = process
+        self.concurrency = concurrency or int(os.getenv("BATCH_CONCURRENCY", "16"))
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.results = asyncio.Queue()
+        self.tasks = set()
+        self.submitted = 0
+
+    async def submit(self, *args):
+        await self.slots.acquire()
+        self.submitted += 1
+        task = asyncio.create_task(self._run(args))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, args):
+        try:
+            result = await self.process(*args)
+        finally:
+            self.slots.release()
+        await self.results.put(result)
+
+    def close(self):
+        """No more items will be submitted"""
+        self.results.put_nowait(None)
+
+    async def join(self):
+        """Wait for every submitted item to finish"""
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks), return_exceptions=True)
+
+    async def iter_results(self):
+        """Yield results as items finish until the pipeline is closed and drained"""
+        received = 0
+        closed = False
+        while not closed or received < self.submitted:
+            result = await self.results.get()
+            if result is None:
+                closed = True
+                continue
+            received += 1
+            yield result
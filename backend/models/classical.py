@@ -0,0 +1,120 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+# Classical low light enhancement on uint8 pixels with OpenCV: tone curves as
+# 256-entry lookup tables, CLAHE on luma and a fast Retinex. Selected with
+# model_id=classical, or as the fallback for models without runnable weights
+# (ENHANCE_FALLBACK=classical). Far cheaper than the normalized float tensor
+# path, and skips images that don't need enhancing at all.
+
+CLASSICAL_MODEL_ID = "classical"
+CLASSICAL_METHODS = ("lut", "clahe", "retinex")
+
+def luminance_histogram(image, sample_size=256):
+    """256-bin luma histogram of every n-th pixel, about sample_size of them along the long side"""
+    step = max(1, max(image.shape[:2]) // sample_size)
+    gray = cv2.cvtColor(np.ascontiguousarray(image[::step, ::step]), cv2.COLOR_RGB2GRAY)
+    return cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+
+def histogram_summary(hist):
+    """Mean luma, 1st/99th percentile levels and the share of pixels darker than 64"""
+    cdf = np.cumsum(hist) / hist.sum()
+    return {
+        "mean": float(np.dot(hist, np.arange(256)) / hist.sum()),
+        "low": int(np.searchsorted(cdf, 0.01)),
+        "high": int(np.searchsorted(cdf, 0.99)),
+        "dark_fraction": float(cdf[63]),
+    }
+
+def tone_lut(mean, low=0, high=255, target_mean=0.45):
+    """
+    Levels stretch of low..high followed by the gamma that brings the mean
+    to target_mean (of full scale), as a uint8 lookup table. Only brightens.
+    """
+    span = max(high - low, 16)
+    levels = np.clip((np.arange(256, dtype=np.float32) - low) / span, 0, 1)
+    mid = min(max((mean - low) / span, 0.01), 0.99)
+    gamma = min(max(np.log(target_mean) / np.log(mid), 0.25), 1.0)
+    return np.round(255 * levels ** gamma).astype(np.uint8)
+
+def apply_clahe(image, clip_limit=2.0, grid=8):
+    """Contrast limited adaptive histogram equalization of the luma channel (YCrCb; cheaper than LAB)"""
+    luma, cr, cb = cv2.split(cv2.cvtColor(image, cv2.COLOR_RGB2YCrCb))
+    luma = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(grid, grid)).apply(luma)
+    return cv2.cvtColor(cv2.merge((luma, cr, cb)), cv2.COLOR_YCrCb2RGB)
+
+def fast_retinex(image, strength=0.7, scale=8, floor=8):
+    """
+    Single-scale Retinex on uint8. The illumination is estimated as the
+    brightest channel, blurred at 1/scale resolution and upsampled; pixels
+    are divided by it raised to strength (1 flattens the lighting entirely,
+    0 leaves the image as is). floor keeps black areas from amplifying noise.
+    """
+    height, width = image.shape[:2]
+    small = cv2.resize(image, (max(1, width // scale), max(1, height // scale)), interpolation=cv2.INTER_AREA)
+    illumination = small.max(axis=2)
+    illumination = cv2.GaussianBlur(illumination, (0, 0), sigmaX=max(illumination.shape) / 32)
+    illumination = cv2.resize(illumination, (width, height), interpolation=cv2.INTER_LINEAR)
+    # Map the illumination through (i / 255) ** strength so one divide does the rest
+    curve = np.round(255 * (np.maximum(np.arange(256), floor) / 255.0) ** strength).astype(np.uint8)
+    illumination = cv2.cvtColor(cv2.LUT(illumination, curve), cv2.COLOR_GRAY2RGB)
+    return cv2.divide(image, illumination, scale=255)
+
+class ClassicalEnhancer:
+    """
+    Histogram-gated classical enhancement.
+
+    A luma histogram of a 256px subsample decides how much work an image
+    gets: images that are already well lit (mean luma at least
+    CLASSICAL_SKIP_MEAN and few dark pixels) are returned unchanged, dim
+    ones (mean at least CLASSICAL_LIGHT_MEAN) only get a tone curve LUT, and
+    dark ones get CLASSICAL_METHOD (retinex, clahe or lut), finished with a
+    tone curve. Everything runs on uint8 arrays.
+    """
+    def __init__(self, method=None, skip_mean=None, light_mean=None):
+        self.method = method or os.getenv("CLASSICAL_METHOD", "retinex")
+        if self.method not in CLASSICAL_METHODS:
+            raise ValueError(f"Unknown classical method {self.method!r}, expected one of {', '.join(CLASSICAL_METHODS)}")
+        self.skip_mean = skip_mean if skip_mean is not None else float(os.getenv("CLASSICAL_SKIP_MEAN", "110"))
+        self.light_mean = light_mean if light_mean is not None else float(os.getenv("CLASSICAL_LIGHT_MEAN", "70"))
+
+        self.lock = threading.Lock()
+        self.decisions = {"skip": 0, "lut": 0, "full": 0}
+
+    def decide(self, summary):
+        """skip, lut or full for an image with the given histogram summary"""
+        if summary["mean"] >= self.skip_mean and summary["dark_fraction"] < 0.25:
+            return "skip"
+        if summary["mean"] >= self.light_mean:
+            return "lut"
+        return "full"
+
+    def enhance(self, image):
+        """Enhance a uint8 RGB array; returns the input itself when the gate skips it"""
+        summary = histogram_summary(luminance_histogram(image))
+        decision = self.decide(summary)
+        with self.lock:
+            self.decisions[decision] += 1
+        if decision == "skip":
+            return image
+
+        if decision == "full" and self.method != "lut":
+            image = fast_retinex(image) if self.method == "retinex" else apply_clahe(image)
+            summary = histogram_summary(luminance_histogram(image))
+        return cv2.LUT(image, tone_lut(summary["mean"], summary["low"], summary["high"]))
+
+    def get_stats(self):
+        """Get the method, gate thresholds and how many images each gate decision got"""
+        with self.lock:
+            total = sum(self.decisions.values())
+            return {
+                "method": self.method,
+                "skip_mean": self.skip_mean,
+                "light_mean": self.light_mean,
+                "images": total,
+                "decisions": dict(self.decisions),
+                "skip_rate": round(self.decisions["skip"] / total, 3) if total else 0.0,
+            }
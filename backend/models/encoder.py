@@ -0,0 +1,189 @@
+import cv2
+from PIL import Image
+from pathlib import Path
+import os
+import threading
+import time
+
+try:
+    import pillow_avif  # noqa: F401  registers AVIF with older Pillow releases
+except ImportError:  # optional; Pillow 11.3+ and some OpenCV builds encode AVIF themselves
+    pass
+
+# format -> MIME type and file extension
+FORMATS = {
+    "jpeg": {"mime": "image/jpeg", "extension": ".jpg"},
+    "webp": {"mime": "image/webp", "extension": ".webp"},
+    "avif": {"mime": "image/avif", "extension": ".avif"},
+    "png": {"mime": "image/png", "extension": ".png"},
+}
+
+FORMAT_ALIASES = {"jpg": "jpeg"}
+
+# (format, preset) -> (library, options). "fast" favours encode time, "small"
+# favours bytes, "balanced" sits between. JPEG and PNG go through OpenCV's
+# libjpeg-turbo / zlib bindings unless an option only Pillow has is needed.
+PRESETS = {
+    ("jpeg", "fast"): ("cv2", [cv2.IMWRITE_JPEG_QUALITY, 85]),
+    ("jpeg", "balanced"): ("cv2", [cv2.IMWRITE_JPEG_QUALITY, 92]),
+    ("jpeg", "small"): ("pil", {"quality": 80, "optimize": True, "progressive": True}),
+    ("webp", "fast"): ("pil", {"quality": 80, "method": 0}),
+    ("webp", "balanced"): ("pil", {"quality": 82, "method": 4}),
+    ("webp", "small"): ("pil", {"quality": 75, "method": 6}),
+    ("avif", "fast"): ("pil", {"quality": 60, "speed": 10}),
+    ("avif", "balanced"): ("pil", {"quality": 60, "speed": 6}),
+    ("avif", "small"): ("pil", {"quality": 50, "speed": 4}),
+    ("png", "fast"): ("cv2", [cv2.IMWRITE_PNG_COMPRESSION, 1]),
+    ("png", "balanced"): ("cv2", [cv2.IMWRITE_PNG_COMPRESSION, 4]),
+    ("png", "small"): ("cv2", [cv2.IMWRITE_PNG_COMPRESSION, 9]),
+}
+
+PRESET_NAMES = ("fast", "balanced", "small")
+
+def pil_can_save(image_format):
+    Image.init()
+    return image_format.upper() in Image.SAVE
+
+def supported_formats():
+    """Formats this installation can encode"""
+    supported = ["jpeg", "png"]
+    if pil_can_save("WEBP"):
+        supported.append("webp")
+    if pil_can_save("AVIF") or cv2.haveImageWriter(".avif"):
+        supported.append("avif")
+    return supported
+
+def encode_array(array, output_path, image_format, preset):
+    """
+    Pipeline stage: encode a uint8 RGB HWC array to output_path. Runs on a
+    pipeline worker; returns the output size in bytes and encode time in ms.
+    """
+    try:
+        started = time.perf_counter()
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        library, options = PRESETS[(image_format, preset)]
+        if image_format == "avif" and not pil_can_save("AVIF"):
+            library, options = "cv2", [cv2.IMWRITE_AVIF_QUALITY, options["quality"]]
+
+        if library == "cv2":
+            ok, encoded = cv2.imencode(FORMATS[image_format]["extension"], cv2.cvtColor(array, cv2.COLOR_RGB2BGR), options)
+            if not ok:
+                raise ValueError(f"OpenCV could not encode {image_format}")
+            with open(output_path, "wb") as f:
+                f.write(encoded.data)
+            size = encoded.nbytes
+        else:
+            Image.fromarray(array).save(output_path, format=image_format.upper(), **options)
+            size = os.path.getsize(output_path)
+
+        return {"bytes": size, "encode_ms": (time.perf_counter() - started) * 1000}
+    except Exception as e:
+        raise Exception(f"Failed to encode enhanced image: {str(e)}")
+
+def encode_thumbnails(array, thumbnails, image_format):
+    """
+    Pipeline stage: encode downscaled copies of a uint8 RGB HWC array with
+    the fast preset. thumbnails is [(output_path, long side)]; each is
+    resized from the next larger one, so small thumbnails cost next to
+    nothing. Returns the size in bytes of each output path.
+    """
+    sizes = {}
+    for output_path, long_side in sorted(thumbnails, key=lambda t: -t[1]):
+        height, width = array.shape[:2]
+        scale = long_side / max(height, width)
+        if scale < 1:
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            array = cv2.resize(array, size, interpolation=cv2.INTER_AREA)
+        sizes[output_path] = encode_array(array, output_path, image_format, "fast")["bytes"]
+    return sizes
+
+class OutputEncoder:
+    """
+    Chooses the output format and preset for a request and keeps encode
+    statistics.
+
+    The format comes from an explicit request parameter, else the best
+    supported image type in the Accept header (by q-value, ties broken in
+    favour of the smaller formats), else OUTPUT_FORMAT. Generic types such
+    as */* or image/* select the default.
+    """
+    def __init__(self, default_format=None, default_preset=None):
+        self.formats = supported_formats()
+        self.default_format = self.normalize_format(default_format or os.getenv("OUTPUT_FORMAT", "jpeg"))
+        self.default_preset = self.normalize_preset(default_preset or os.getenv("OUTPUT_PRESET", "balanced"))
+        self.lock = threading.Lock()
+        self.stats = {}  # (format, preset) -> {"images", "bytes", "encode_ms", "pixels"}
+
+    def normalize_format(self, image_format):
+        image_format = FORMAT_ALIASES.get(image_format.lower(), image_format.lower())
+        if image_format not in FORMATS:
+            raise ValueError(f"Unknown output format: {image_format} (expected one of {', '.join(FORMATS)})")
+        if image_format not in self.formats:
+            raise ValueError(f"Output format {image_format} is not supported by this server")
+        return image_format
+
+    def normalize_preset(self, preset):
+        if preset.lower() not in PRESET_NAMES:
+            raise ValueError(f"Unknown encode preset: {preset} (expected one of {', '.join(PRESET_NAMES)})")
+        return preset.lower()
+
+    def from_accept(self, accept):
+        """Best supported image format in an Accept header, or None"""
+        preference = ("avif", "webp", "jpeg", "png")
+        best = None
+        for item in (accept or "").split(","):
+            media_type, *params = [part.strip() for part in item.split(";")]
+            quality = 1.0
+            for param in params:
+                if param.startswith("q="):
+                    try:
+                        quality = float(param[2:])
+                    except ValueError:
+                        quality = 0.0
+            image_format = next((f for f in self.formats if FORMATS[f]["mime"] == media_type.lower()), None)
+            if image_format is None or quality <= 0:
+                continue
+            rank = (quality, -preference.index(image_format))
+            if best is None or rank > best[0]:
+                best = (rank, image_format)
+        return best[1] if best else None
+
+    def negotiate(self, accept=None, image_format=None, preset=None):
+        """(format, preset) for a request; raises ValueError for an unknown explicit choice"""
+        if image_format:
+            image_format = self.normalize_format(image_format)
+        else:
+            image_format = self.from_accept(accept) or self.default_format
+        return image_format, self.normalize_preset(preset) if preset else self.default_preset
+
+    def record(self, image_format, preset, result, pixels):
+        with self.lock:
+            entry = self.stats.setdefault(
+                (image_format, preset), {"images": 0, "bytes": 0, "encode_ms": 0.0, "pixels": 0}
+            )
+            entry["images"] += 1
+            entry["bytes"] += result["bytes"]
+            entry["encode_ms"] += result["encode_ms"]
+            entry["pixels"] += pixels
+
+    def get_stats(self):
+        """Get per format/preset encode counts, bytes and time"""
+        with self.lock:
+            by_preset = {}
+            for (image_format, preset), entry in sorted(self.stats.items()):
+                megapixels = entry["pixels"] / 1e6
+                by_preset[f"{image_format}/{preset}"] = {
+                    "images": entry["images"],
+                    "bytes": entry["bytes"],
+                    "avg_bytes": entry["bytes"] // entry["images"],
+                    "avg_encode_ms": round(entry["encode_ms"] / entry["images"], 2),
+                    "encode_ms_per_mp": round(entry["encode_ms"] / megapixels, 2) if megapixels else None,
+                    "bytes_per_mp": int(entry["bytes"] / megapixels) if megapixels else None,
+                }
+        return {
+            "default_format": self.default_format,
+            "default_preset": self.default_preset,
+            "supported_formats": self.formats,
+            "presets": list(PRESET_NAMES),
+            "by_preset": by_preset,
+        }
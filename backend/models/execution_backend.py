@@ -0,0 +1,69 @@
+import torch
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+def _init_process_worker(torch_threads):
+    """Pin torch thread counts so N workers don't oversubscribe the CPU"""
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+
+class ExecutionBackend:
+    """
+    Runs CPU-bound pipeline stages (decode, pre/post-processing, encode) off the event loop.
+
+    kind is one of:
+      - "thread":  shared thread pool (PIL and torch release the GIL for the heavy work)
+      - "process": process pool, each worker pinned to a fixed number of torch threads
+      - "inline":  run on the event loop, mainly useful as a benchmark baseline
+    """
+    def __init__(self, kind=None, workers=None, torch_threads=None):
+        self.kind = (kind or os.getenv("PIPELINE_EXECUTOR", "thread")).lower()
+        self.workers = workers or int(os.getenv("PIPELINE_WORKERS", str(os.cpu_count() or 1)))
+        self.torch_threads = torch_threads or int(os.getenv("PIPELINE_TORCH_THREADS", "1"))
+
+        if self.kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pipeline")
+        elif self.kind == "process":
+            # spawn rather than fork: forking a process that already started torch threads can deadlock
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker,
+                initargs=(self.torch_threads,)
+            )
+        elif self.kind == "inline":
+            self.executor = None
+        else:
+            raise ValueError(f"Unknown pipeline executor: {self.kind}")
+
+        print(f"Pipeline executor: {self.kind} ({self.workers} workers)")
+
+    @property
+    def is_process(self):
+        return self.kind == "process"
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the backend and await the result"""
+        if self.executor is None:
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def run_local(self, fn, *args, **kwargs):
+        """
+        Like run(), but always in this process. Used for work on in-process state
+        (e.g. tile blending buffers) that cannot be shipped to a process worker.
+        """
+        if self.executor is None:
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        executor = None if self.is_process else self.executor
+        return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,216 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+
+from .metrics import FAIR_DEGRADED, FAIR_QUEUE_SECONDS, FAIR_REJECTED
+
+class FairShareRejected(Exception):
+    """Raised when a user is over their request rate, or the queue is full; retry_after is in seconds"""
+    def __init__(self, detail, retry_after):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Allows rate requests per second on average, with bursts of up to burst"""
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        """0 if a token was taken, else the seconds until one is available"""
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class Grant:
+    """What a request was given when its turn came: the size and model to enhance with"""
+    def __init__(self, model_id, max_size=None, degradation=None):
+        self.model_id = model_id
+        self.max_size = max_size
+        self.degradation = degradation
+
+class FairScheduler:
+    """
+    Admission control and weighted fair queuing for enhancement work, keyed
+    by user id.
+
+    admit() charges the user's token bucket (FAIR_USER_RATE requests per
+    second, bursts of FAIR_USER_BURST) and raises FairShareRejected when it
+    is empty, before the upload is even read. turn() then waits for one of
+    FAIR_CONCURRENCY pipeline slots. Waiting requests are served in order of
+    their virtual finish time (self-clocked fair queuing): each request costs
+    its megapixels divided by the user's weight (FAIR_USER_WEIGHTS, default
+    1), so a user with hundreds of queued images only gets their share of
+    slots while everyone else's requests keep flowing.
+
+    When the backlog at dispatch reaches FAIR_DEGRADE_QUEUE_DEPTH, the grant
+    downscales the input to FAIR_DEGRADE_MAX_SIZE on its long side; at twice
+    that depth it halves the size again and switches to FAIR_DEGRADE_MODEL
+    (if set). The degradation is reported back so responses can say so.
+    """
+    def __init__(self, models=None, concurrency=None, rate=None, burst=None, max_queued=None, weights=None,
+                 degrade_queue_depth=None, degrade_max_size=None, degrade_model=None):
+        self.models = models  # anything with has_model(), to check FAIR_DEGRADE_MODEL exists
+        self.concurrency = concurrency or int(os.getenv("FAIR_CONCURRENCY", str(max(2, os.cpu_count() or 1))))
+        self.rate = rate or float(os.getenv("FAIR_USER_RATE", "2"))
+        self.burst = burst or float(os.getenv("FAIR_USER_BURST", "20"))
+        self.max_queued = max_queued or int(os.getenv("FAIR_MAX_QUEUED", "256"))
+        if weights is None:
+            weights = {}
+            for item in os.getenv("FAIR_USER_WEIGHTS", "").split(","):
+                user_id, _, weight = item.partition("=")
+                if user_id.strip() and weight.strip():
+                    weights[user_id.strip()] = float(weight)
+        self.weights = weights
+        self.degrade_queue_depth = degrade_queue_depth or int(
+            os.getenv("FAIR_DEGRADE_QUEUE_DEPTH", str(2 * self.concurrency))
+        )
+        self.degrade_max_size = degrade_max_size or int(os.getenv("FAIR_DEGRADE_MAX_SIZE", "2048"))
+        self.degrade_model = degrade_model or os.getenv("FAIR_DEGRADE_MODEL") or None
+
+        self.buckets = {}  # user id -> TokenBucket
+        self.waiting = []  # heap of (finish tag, sequence, waiter)
+        self.queued = 0  # live waiters in the heap (cancelled ones stay in it until popped)
+        self.sequence = itertools.count()
+        self.finish_tags = {}  # user id -> finish tag of their latest request
+        self.virtual_time = 0.0
+        self.running = 0
+
+        # Stats
+        self.admitted = 0
+        self.rate_limited = 0
+        self.rejected_full = 0
+        self.served = 0
+        self.degraded = {1: 0, 2: 0}
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+
+    def admit(self, user_id):
+        """Charge one request to the user's token bucket; raises FairShareRejected if it is empty"""
+        now = time.monotonic()
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            if len(self.buckets) > 10000:
+                # Forget users whose buckets have refilled; a new bucket starts full anyway
+                for key in [k for k, b in self.buckets.items() if now - b.updated > self.burst / self.rate]:
+                    del self.buckets[key]
+            bucket = self.buckets[user_id] = TokenBucket(self.rate, self.burst, now)
+        wait = bucket.take(now)
+        if wait > 0:
+            self.rate_limited += 1
+            FAIR_REJECTED.inc(reason="rate")
+            raise FairShareRejected("Too many requests, slow down", wait)
+        self.admitted += 1
+
+    def _tag(self, user_id, cost):
+        """Virtual finish time of a new request of the user"""
+        start = max(self.virtual_time, self.finish_tags.get(user_id, 0.0))
+        tag = start + cost / self.weights.get(user_id, 1.0)
+        self.finish_tags[user_id] = tag
+        return tag
+
+    def _grant(self, model_id):
+        """Degradation for a request starting now, from the backlog behind it"""
+        backlog = self.queued
+        if backlog < self.degrade_queue_depth:
+            return Grant(model_id)
+        level = 2 if backlog >= 2 * self.degrade_queue_depth else 1
+        max_size = self.degrade_max_size if level == 1 else self.degrade_max_size // 2
+        if (level == 2 and self.degrade_model and self.degrade_model != model_id
+                and (self.models is None or self.models.has_model(self.degrade_model))):
+            model_id = self.degrade_model
+        self.degraded[level] += 1
+        FAIR_DEGRADED.inc(level=level)
+        return Grant(model_id, max_size, {
+            "level": level,
+            "max_size": max_size,
+            "model": model_id,
+            "queue_depth": backlog,
+        })
+
+    def _dispatch(self):
+        """Hand free slots to the waiters with the earliest finish tags"""
+        while self.running < self.concurrency and self.waiting:
+            tag, _, waiter = heapq.heappop(self.waiting)
+            if waiter["future"].done():  # cancelled while waiting
+                continue
+            self.virtual_time = tag
+            self.running += 1
+            self.queued -= 1
+            waiter["future"].set_result(self._grant(waiter["model_id"]))
+
+    def _release(self):
+        self.running -= 1
+        self.served += 1
+        if len(self.finish_tags) > 10000:
+            self.finish_tags = {u: t for u, t in self.finish_tags.items() if t > self.virtual_time}
+        self._dispatch()
+
+    @asynccontextmanager
+    async def turn(self, user_id, cost, model_id):
+        """
+        Wait for a pipeline slot in fair order; yields the Grant to enhance
+        with. cost is the work in megapixels. Raises FairShareRejected if
+        FAIR_MAX_QUEUED requests are already waiting.
+        """
+        if self.queued >= self.max_queued:
+            self.rejected_full += 1
+            FAIR_REJECTED.inc(reason="queue_full")
+            raise FairShareRejected("Enhancement queue is full, try again later", 5)
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = {"future": future, "model_id": model_id}
+        heapq.heappush(self.waiting, (self._tag(user_id, max(cost, 0.01)), next(self.sequence), waiter))
+        self.queued += 1
+        queued_at = time.perf_counter()
+        self._dispatch()
+        try:
+            grant = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()  # the slot was granted just as the request went away
+            else:
+                self.queued -= 1
+            raise
+
+        waited = time.perf_counter() - queued_at
+        self.queue_seconds += waited
+        self.max_queue_seconds = max(self.max_queue_seconds, waited)
+        FAIR_QUEUE_SECONDS.observe(waited)
+        try:
+            yield grant
+        finally:
+            self._release()
+
+    def get_stats(self):
+        """Get slot occupancy, backlog, rate limiting and degradation counters"""
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "user_rate": self.rate,
+            "user_burst": self.burst,
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "rejected_queue_full": self.rejected_full,
+            "served": self.served,
+            "avg_queue_wait_ms": round(self.queue_seconds / self.served * 1000, 2) if self.served else 0.0,
+            "max_queue_wait_ms": round(self.max_queue_seconds * 1000, 2),
+            "degrade_queue_depth": self.degrade_queue_depth,
+            "degraded": {f"level_{level}": count for level, count in self.degraded.items()},
+        }
@@ -0,0 +1,97 @@
+import base64
+import binascii
+import json
+import sqlite3
+import threading
+import time
+
+IMAGE_FIELDS = ("owner", "file_id", "created_at", "original_filename", "model_id", "format", "width", "height",
+                "thumbnails")
+
+def encode_cursor(created_at, file_id):
+    """Opaque cursor for the page after the image with this (created_at, file_id)"""
+    return base64.urlsafe_b64encode(json.dumps([created_at, file_id]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """(created_at, file_id) of a cursor; raises ValueError if it is malformed"""
+    try:
+        created_at, file_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(created_at), str(file_id)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+class ImageIndex:
+    """
+    Per-user history of enhanced images, for paginated listing.
+
+    A row is written when an enhancement finishes, in the artifact store's
+    database. Listings join it against the artifacts table, so they only
+    show outputs that still exist; retention, result cache eviction and
+    /cleanup delete outputs without having to update the index first.
+    Pages are keyset-paginated, newest first, on (created_at, file_id) over
+    an (owner, created_at, file_id) index, so each page costs the same
+    however long a user's history is.
+    """
+    def __init__(self, store):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(store.db_path), check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS images ("
+            "owner TEXT NOT NULL, file_id TEXT NOT NULL, created_at REAL NOT NULL, original_filename TEXT, "
+            "model_id TEXT, format TEXT, width INTEGER, height INTEGER, thumbnails TEXT, "
+            "PRIMARY KEY (owner, file_id))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS images_owner_created ON images (owner, created_at, file_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS images_file_id ON images (file_id)")
+
+    def add(self, owner, file_id, original_filename, model_id, image_format, width, height, thumbnails=(),
+            created_at=None):
+        """Record an enhanced image in owner's history (moving it to the front if it is already there)"""
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO images ({', '.join(IMAGE_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (owner, file_id, created_at or time.time(), original_filename, model_id, image_format, width, height,
+                 ",".join(thumbnails))
+            )
+
+    def page(self, owner, limit, cursor=None):
+        """
+        Up to limit of owner's images, newest first, starting after cursor.
+        Returns (images, next_cursor); next_cursor is None on the last page.
+        Raises ValueError for a malformed cursor.
+        """
+        query = (
+            "SELECT i.file_id, i.created_at, i.original_filename, i.model_id, i.format, i.width, i.height, "
+            "i.thumbnails, a.size, a.mime, a.last_access "
+            "FROM images i JOIN artifacts a ON a.file_id = i.file_id AND a.kind = 'output' "
+            "WHERE i.owner = ? "
+        )
+        params = [owner]
+        if cursor:
+            query += "AND (i.created_at, i.file_id) < (?, ?) "
+            params += decode_cursor(cursor)
+        query += "ORDER BY i.created_at DESC, i.file_id DESC LIMIT ?"
+        params.append(limit + 1)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+
+        fields = ("file_id", "created_at", "original_filename", "model_id", "format", "width", "height",
+                  "thumbnails", "size", "mime", "last_access")
+        images = [dict(zip(fields, row)) for row in rows[:limit]]
+        for image in images:
+            image["thumbnails"] = image["thumbnails"].split(",") if image["thumbnails"] else []
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(images[-1]["created_at"], images[-1]["file_id"])
+        return images, next_cursor
+
+    def forget(self, file_id):
+        """Drop file_id from every history it is in"""
+        with self.lock:
+            self.conn.execute("DELETE FROM images WHERE file_id = ?", (file_id,))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
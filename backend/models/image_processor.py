@@ -1,133 +1,265 @@
 import torch
-import torchvision.transforms as transforms
 from PIL import Image
 import cv2
 import numpy as np
 from pathlib import Path
 import asyncio
+import contextlib
+import io
+import os
+import time
+
+from .inference_scheduler import InferenceScheduler
+from .execution_backend import ExecutionBackend
+from .tiling import TileBlender
+from .encoder import OutputEncoder, encode_array, encode_thumbnails
+from .pixel_ops import apply_lut, simple_enhancement_
+from .classical import CLASSICAL_MODEL_ID, ClassicalEnhancer
+from .metrics import stage
+
+def load_image(source, max_size=None):
+    """Load the input image (a path, bytes or file object) and resize it if it is larger than max_size (if set)"""
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        
+        # Load image
+        image = Image.open(source)
+        
+        # Let the JPEG decoder downscale by 1/2, 1/4 or 1/8 while decoding
+        if max_size and image.format == "JPEG" and max(image.size) > max_size:
+            image.draft("RGB", (max_size, max_size))
+        
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        # Resize if too large (optional, for memory management)
+        if max_size and max(image.size) > max_size:
+            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        
+        return image
+    except Exception as e:
+        raise Exception(f"Failed to load image: {str(e)}")
+
+def decode_stage(source, max_size=None):
+    """Pipeline stage: decode (and optionally downscale) to a uint8 HWC array"""
+    return np.array(load_image(source, max_size))
+
+def encode_stage(array, output_path, image_format, preset, thumbnails=None, thumbnail_format=None):
+    """
+    Pipeline stage: encode the enhanced array, then its thumbnails
+    ([(path, long side)]) from the same array, in one trip to the worker
+    """
+    result = encode_array(array, output_path, image_format, preset)
+    if thumbnails:
+        result["thumbnail_bytes"] = encode_thumbnails(array, thumbnails, thumbnail_format)
+    return result
+
+def is_runnable(model):
+    """Whether a loaded model can be called on a batch (a bare state dict can't)"""
+    return callable(model) and not isinstance(model, dict)
 
 class ImageProcessor:
-    def __init__(self, model_manager):
+    def __init__(self, model_manager, executor=None, encoder=None):
         self.model_manager = model_manager
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        if self.device.type == "cuda":
+            # Let cuDNN pick the fastest kernels per shape; warm_up runs the selection
+            torch.backends.cudnn.benchmark = True
+
+        # Inputs are processed at full resolution (0) in overlapping tiles unless
+        # ENHANCE_MAX_SIZE asks for a downscale first
+        self.max_size = int(os.getenv("ENHANCE_MAX_SIZE", "0")) or None
+        self.tile_size = int(os.getenv("ENHANCE_TILE_SIZE", "512"))
+        self.tile_overlap = int(os.getenv("ENHANCE_TILE_OVERLAP", "32"))
+
+        # Batches concurrent requests into single forward passes
+        self.scheduler = InferenceScheduler(self.forward_batch)
+
+        # Tiles in flight per image; bounds the float working set
+        self.tile_batch = int(os.getenv("ENHANCE_TILE_BATCH", str(self.scheduler.max_batch_size)))
+
+        # Forward passes run at startup so the first request doesn't pay one-time costs;
+        # full tiles are the most common shape
+        self.warmup_sizes = [int(v) for v in os.getenv("WARMUP_SIZES", str(self.tile_size)).split(",") if v.strip()]
+        self.warmup_batch_sizes = [
+            int(v) for v in os.getenv("WARMUP_BATCH_SIZES", f"1,{self.scheduler.max_batch_size}").split(",") if v.strip()
+        ]
+        self.warmup_passes = int(os.getenv("WARMUP_PASSES", "1"))
+
+        # Runs decode / encode off the event loop
+        self.executor = executor or ExecutionBackend()
+        
+        # Output format negotiation, presets and encode stats
+        self.encoder = encoder or OutputEncoder()
         
-        # Define image preprocessing transforms
-        self.transform = transforms.Compose([
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
-        ])
+        # Gallery thumbnails (name -> long side) encoded alongside outputs that ask for them
+        self.thumbnail_sizes = {}
+        for item in os.getenv("THUMBNAIL_SIZES", "small=160,medium=480").split(","):
+            name, _, long_side = item.partition("=")
+            if name.strip() and long_side.strip():
+                self.thumbnail_sizes[name.strip()] = int(long_side)
+        self.thumbnail_format = self.encoder.normalize_format(os.getenv("THUMBNAIL_FORMAT", "webp"))
         
-        # Define inverse transform for output
-        self.inverse_transform = transforms.Compose([
-            transforms.Normalize(mean=[-1, -1, -1], std=[2, 2, 2]),
-            transforms.ToPILImage()
-        ])
+        # Histogram-gated uint8 enhancement for model_id=classical, and for models
+        # without runnable weights when ENHANCE_FALLBACK=classical (else the simple LUT)
+        self.classical = ClassicalEnhancer()
+        self.fallback = os.getenv("ENHANCE_FALLBACK", "simple")
+        if self.fallback not in ("simple", "classical"):
+            raise ValueError(f"ENHANCE_FALLBACK must be simple or classical, not {self.fallback!r}")
 
-    async def enhance_image(self, input_path, output_path, model_id="lol_real"):
+    async def enhance_image(self, input_path, output_path, model_id="lol_real", image_format=None, preset=None,
+                            max_size=None, thumbnails=None):
         """
-        Enhance a low light image using the specified model
+        Enhance a low light image using the specified model and encode it as
+        image_format with the given preset (the encoder's defaults if unset).
+        input_path may also be an in-memory file object (e.g. a spooled upload),
+        which is read from the start. max_size overrides ENHANCE_MAX_SIZE.
+        thumbnails maps thumbnail size names to the paths to write them to
+        (as thumbnail_format). Returns the encoded size in bytes, the encode
+        time, the output's width and height and the model version it ran on.
         """
         try:
-            # Load and preprocess image
-            image = self.load_and_preprocess_image(input_path)
-            
-            # Get the model
-            model = self.model_manager.get_model(model_id)
+            source = input_path
+            if isinstance(source, (str, Path)):
+                source = str(source)
+            else:
+                source.seek(0)
+                if self.executor.is_process:
+                    # File objects can't cross into a worker process; ship the bytes
+                    source = await self.executor.run_local(source.read)
             
-            # Process the image
-            enhanced_image = await self.process_with_model(image, model, model_id)
+            # Keep the model loaded (loading it on first use) while this image is in flight,
+            # and run every tile on that one version even if a newer one is swapped in
+            async with self.using(model_id) as pinned:
+                # Load (and downscale) the image on a pipeline worker
+                with stage("decode"):
+                    image = await self.executor.run(decode_stage, source, max_size or self.max_size)
+                
+                # Process the image tile by tile
+                enhanced = await self.process_tiled(image, model_id, pinned)
+                del image  # release the decoded input before encoding
             
-            # Save the enhanced image
-            self.save_enhanced_image(enhanced_image, output_path)
+            # Encode and save the enhanced image on a pipeline worker
+            image_format = image_format or self.encoder.default_format
+            preset = preset or self.encoder.default_preset
+            thumbnails = [(str(path), self.thumbnail_sizes[name]) for name, path in (thumbnails or {}).items()]
+            with stage("encode"):
+                result = await self.executor.run(
+                    encode_stage, enhanced, str(output_path), image_format, preset, thumbnails, self.thumbnail_format
+                )
+            self.encoder.record(image_format, preset, result, enhanced.shape[0] * enhanced.shape[1])
+            result.update(height=enhanced.shape[0], width=enhanced.shape[1], model_version=pinned[1])
+            return result
             
         except Exception as e:
             raise Exception(f"Image processing failed: {str(e)}")
 
-    def load_and_preprocess_image(self, image_path):
-        """Load and preprocess the input image"""
-        try:
-            # Load image
-            image = Image.open(image_path).convert('RGB')
-            
-            # Resize if too large (optional, for memory management)
-            max_size = 1024
-            if max(image.size) > max_size:
-                image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-            
-            return image
-        except Exception as e:
-            raise Exception(f"Failed to load image: {str(e)}")
-
-    async def process_with_model(self, image, model, model_id):
+    async def process_tiled(self, image, model_id, pinned=None):
         """
-        Process image with the specified model
-        Since we don't know the exact model architecture, we'll use a generic approach
+        Enhance a uint8 HWC array in overlapping tiles and blend the seams.
+        Images no larger than the tile size go through as a single tile.
+        pinned is the (model, version) from using(model_id) to run every
+        tile on; the currently loaded version if unset. The classical
+        engine, and the fallback for models without runnable weights, work
+        on the uint8 pixels directly.
         """
         try:
-            # Convert to tensor and add batch dimension
-            input_tensor = self.transform(image).unsqueeze(0).to(self.device)
-            
-            # For now, we'll use a simple enhancement approach
-            # In a real implementation, you would use the actual model
-            enhanced_tensor = await self.apply_enhancement(input_tensor, model, model_id)
-            
-            # Convert back to PIL Image
-            enhanced_image = self.inverse_transform(enhanced_tensor.squeeze(0).cpu())
-            
-            return enhanced_image
+            if pinned is None and model_id != CLASSICAL_MODEL_ID:
+                pinned = (self.model_manager.get_model(model_id), self.model_manager.get_model_version(model_id))
+            model, version = pinned or (None, None)
+            runnable = model_id != CLASSICAL_MODEL_ID and is_runnable(model)
+            if not runnable and (model_id == CLASSICAL_MODEL_ID or self.fallback == "classical"):
+                with stage("classical"):
+                    return await self.executor.run_local(self.classical.enhance, image)
+            if not runnable:
+                with stage("lut"):
+                    return await self.executor.run_local(apply_lut, image)
+
+            blender = TileBlender(image, self.tile_size, self.tile_overlap)
+            for row in range(blender.rows):
+                for start in range(0, blender.tiles_per_row, self.tile_batch):
+                    cols = range(start, min(start + self.tile_batch, blender.tiles_per_row))
+                    with stage("to_tensor"):
+                        tiles = await self.executor.run_local(blender.tile_tensors, row, cols)
+                    # Includes waiting in the scheduler for a batch to form
+                    with stage("inference"):
+                        outputs = await asyncio.gather(*[
+                            self.apply_enhancement(tile.to(self.device), model_id, model, version) for tile in tiles
+                        ])
+                    with stage("postprocess"):
+                        await self.executor.run_local(blender.accumulate, row, cols, [o.cpu() for o in outputs])
+                with stage("postprocess"):
+                    await self.executor.run_local(blender.flush, row)
+            return blender.output
             
         except Exception as e:
             raise Exception(f"Model processing failed: {str(e)}")
 
-    async def apply_enhancement(self, input_tensor, model, model_id):
+    def has_model(self, model_id):
+        """Check if model_id is the classical engine or a registered model"""
+        return model_id == CLASSICAL_MODEL_ID or self.model_manager.has_model(model_id)
+
+    def using(self, model_id):
+        """
+        Context manager keeping model_id loaded while in use, yielding the
+        (model, version) to pin (nothing to load for the classical engine)
+        """
+        if model_id == CLASSICAL_MODEL_ID:
+            return contextlib.nullcontext((None, None))
+        return self.model_manager.use(model_id)
+
+    async def apply_enhancement(self, input_tensor, model_id, model, version):
+        """
+        Queue a single image tensor for batched inference on a pinned model
+        """
+        return await self.scheduler.submit(input_tensor, model_id, model, version)
+
+    def forward_batch(self, batch_tensor, model, model_id):
         """
-        Apply enhancement using the model
-        This is a placeholder implementation - you'll need to adapt based on your model architecture
+        Apply enhancement to a batch using the model (runs on a scheduler worker).
+        Runnable models (eager modules or a compiled backend) are called on the
+        normalized batch; anything else, such as a bare state dict, falls back
+        to the simple enhancement.
         """
         try:
             with torch.no_grad():
-                # For now, we'll use a simple brightness/contrast enhancement
-                # In a real implementation, you would use: enhanced = model(input_tensor)
-                
-                # Simple enhancement as fallback
-                enhanced = self.simple_enhancement(input_tensor)
+                if is_runnable(model):
+                    enhanced = model(batch_tensor)
+                    return enhanced.clamp_(-1, 1)
                 
-                return enhanced
+                # Simple enhancement as fallback; the scheduler's batch is ours to overwrite
+                return simple_enhancement_(batch_tensor)
                 
         except Exception as e:
             # Fallback to simple enhancement if model fails
             print(f"Model processing failed, using fallback: {e}")
-            return self.simple_enhancement(input_tensor)
+            with torch.no_grad():
+                return simple_enhancement_(batch_tensor)
 
-    def simple_enhancement(self, input_tensor):
+    def warm_up(self, model_id, sizes=None, batch_sizes=None, passes=None):
         """
-        Simple enhancement fallback using basic image processing
+        Run forward passes at the given square sizes and batch sizes so the
+        allocator, thread pools and kernel selection are primed before the
+        first request. Sizes are rounded up to the scheduler's buckets, the
+        shapes real batches are padded to. Blocking; returns the elapsed ms.
         """
-        # Apply brightness and contrast enhancement
-        enhanced = input_tensor.clone()
-        
-        # Brightness adjustment
-        enhanced = enhanced * 1.5
-        
-        # Contrast adjustment
-        enhanced = (enhanced - 0.5) * 1.2 + 0.5
-        
-        # Clamp values to valid range
-        enhanced = torch.clamp(enhanced, -1, 1)
-        
-        return enhanced
+        sizes = self.warmup_sizes if sizes is None else sizes
+        batch_sizes = self.warmup_batch_sizes if batch_sizes is None else batch_sizes
+        passes = self.warmup_passes if passes is None else passes
 
-    def save_enhanced_image(self, enhanced_image, output_path):
-        """Save the enhanced image"""
-        try:
-            # Ensure output directory exists
-            Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-            
-            # Save the image
-            enhanced_image.save(output_path, quality=95)
-            
-        except Exception as e:
-            raise Exception(f"Failed to save enhanced image: {str(e)}")
+        started = time.perf_counter()
+        model = self.model_manager.get_model(model_id)
+        bucket = self.scheduler.bucket_size
+        for size in sizes:
+            size = -(-size // bucket) * bucket
+            for batch_size in batch_sizes:
+                batch = torch.zeros(batch_size, 3, size, size, device=self.device)
+                for _ in range(passes):
+                    self.forward_batch(batch, model, model_id)
+        if self.device.type == "cuda":
+            torch.cuda.synchronize()
+        return (time.perf_counter() - started) * 1000
 
     def cleanup_files(self, file_paths):
         """Clean up temporary files"""
@@ -0,0 +1,134 @@
+import inspect
+import os
+import tempfile
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+try:
+    import onnxruntime
+except ImportError:  # optional; only needed for the "onnx" backend
+    onnxruntime = None
+
+BACKENDS = ("eager", "torchscript", "compile", "onnx", "int8")
+
+def build_eager(model, example):
+    return model
+
+def build_torchscript(model, example):
+    """Trace and freeze the model; frozen graphs get constant folding and fused conv/bn on CPU"""
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    frozen = torch.jit.freeze(traced.eval())
+    return torch.jit.optimize_for_inference(frozen)
+
+def build_compile(model, example):
+    """torch.compile with dynamic shapes, since padded batch sizes and buckets vary"""
+    compiled = torch.compile(model, dynamic=True)
+    with torch.no_grad():
+        compiled(example)  # compile now rather than on the first request
+    return compiled
+
+def build_int8(model, example):
+    """
+    Dynamic int8 quantization: weights stored as int8, activations quantized
+    on the fly. PyTorch only quantizes Linear and recurrent layers this way;
+    convolutions stay in float, so conv-only models gain little from it.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear, nn.LSTM, nn.GRU}, dtype=torch.qint8)
+
+class OnnxModel:
+    """ONNX Runtime session behind the same tensor-in, tensor-out call as a torch module"""
+    def __init__(self, session):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        output = self.session.run(None, {self.input_name: batch.detach().cpu().numpy()})[0]
+        return torch.from_numpy(output)
+
+def build_onnx(model, example):
+    """Export to ONNX with dynamic batch/height/width and run it on ONNX Runtime's CPU provider"""
+    if onnxruntime is None:
+        raise RuntimeError("onnxruntime is not installed")
+
+    export_options = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_options["dynamo"] = False  # the TorchScript exporter handles dynamic_axes directly
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.onnx")
+        with torch.no_grad():
+            torch.onnx.export(
+                model, example, path,
+                input_names=["input"], output_names=["output"],
+                dynamic_axes={"input": {0: "batch", 2: "height", 3: "width"},
+                              "output": {0: "batch", 2: "height", 3: "width"}},
+                opset_version=17,
+                **export_options
+            )
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = torch.get_num_threads()
+        options.intra_op_num_threads = threads
+        session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+    return OnnxModel(session)
+
+BUILDERS = {
+    "eager": build_eager,
+    "torchscript": build_torchscript,
+    "compile": build_compile,
+    "onnx": build_onnx,
+    "int8": build_int8,
+}
+
+def build_backend(name, model, example):
+    """Wrap an eager nn.Module for the named backend"""
+    if name not in BUILDERS:
+        raise ValueError(f"Unknown inference backend: {name} (expected one of {', '.join(BACKENDS)})")
+    return BUILDERS[name](model, example)
+
+def reference_batch(batch_size=2, size=128, seed=0):
+    """Deterministic low light test batch in the model's [-1, 1] input range"""
+    generator = torch.Generator().manual_seed(seed)
+    base = torch.rand(batch_size, 3, size // 8, size // 8, generator=generator) * 0.25
+    # Smooth structure plus a little noise, roughly like a dark photo
+    image = F.interpolate(base, size=(size, size), mode="bilinear", align_corners=False)
+    image = image + torch.randn(batch_size, 3, size, size, generator=generator) * 0.01
+    return image.clamp(0, 1) * 2 - 1
+
+def psnr(reference, candidate, data_range=2.0):
+    """Peak signal-to-noise ratio in dB between two batches (inf if identical)"""
+    mse = F.mse_loss(candidate.float(), reference.float()).item()
+    if mse == 0:
+        return float("inf")
+    return 10 * torch.log10(torch.tensor(data_range ** 2 / mse)).item()
+
+def ssim(reference, candidate, data_range=2.0, window_size=11, sigma=1.5):
+    """Mean structural similarity over a batch, with the usual 11x11 Gaussian window"""
+    reference = reference.float()
+    candidate = candidate.float()
+    channels = reference.shape[1]
+    coords = torch.arange(window_size, dtype=torch.float32) - window_size // 2
+    gauss = torch.exp(-(coords ** 2) / (2 * sigma ** 2))
+    gauss = gauss / gauss.sum()
+    window = (gauss[:, None] * gauss[None, :]).expand(channels, 1, window_size, window_size).contiguous()
+
+    def blur(x):
+        return F.conv2d(x, window, groups=channels)
+
+    c1 = (0.01 * data_range) ** 2
+    c2 = (0.03 * data_range) ** 2
+    mu_x, mu_y = blur(reference), blur(candidate)
+    sigma_x = blur(reference * reference) - mu_x ** 2
+    sigma_y = blur(candidate * candidate) - mu_y ** 2
+    sigma_xy = blur(reference * candidate) - mu_x * mu_y
+    ssim_map = ((2 * mu_x * mu_y + c1) * (2 * sigma_xy + c2)) / ((mu_x ** 2 + mu_y ** 2 + c1) * (sigma_x + sigma_y + c2))
+    return ssim_map.mean().item()
+
+def compare_outputs(eager_model, candidate, inputs):
+    """PSNR and SSIM of candidate's outputs against eager outputs on the same inputs"""
+    with torch.no_grad():
+        expected = eager_model(inputs).clamp(-1, 1)
+        actual = candidate(inputs).clamp(-1, 1)
+    return {"psnr": psnr(expected, actual), "ssim": ssim(expected, actual)}
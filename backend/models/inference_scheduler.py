@@ -0,0 +1,152 @@
+import torch
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import INFERENCE_BATCH_SECONDS
+
+class InferenceScheduler:
+    """
+    Dynamic micro-batching scheduler for the models ModelManager.use hands out.
+    Requests for the same model version and resolution bucket are queued,
+    grouped into a single batch and run as one forward pass on a worker thread
+    with the model object the requests pinned, so a hot swap never mixes
+    versions within a batch or an image.
+    """
+    def __init__(self, run_batch, max_batch_size=None, max_wait_ms=None, bucket_size=None, workers=None):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size or int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+        self.max_wait = max_wait_ms / 1000.0
+        self.bucket_size = bucket_size or int(os.getenv("INFERENCE_BUCKET_SIZE", "64"))
+        self.workers = workers or int(os.getenv("INFERENCE_WORKERS", "1"))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+
+        # (model_id, version, bucket_h, bucket_w) -> list of (tensor, future)
+        self.pending = {}
+        # Same keys -> the pinned model object their batch runs on
+        self.pinned = {}
+        self._slots = None
+
+        # Stats
+        self.batches_run = 0
+        self.items_run = 0
+        self.in_flight = 0
+        self.batch_size_counts = {}
+        self.last_batch_ms = 0.0
+
+    def _bucket_key(self, tensor, model_id, version):
+        """Round the spatial size up to the bucket grid"""
+        _, height, width = tensor.shape
+        step = self.bucket_size
+        return (model_id, version, -(-height // step) * step, -(-width // step) * step)
+
+    async def submit(self, tensor, model_id, model, version):
+        """
+        Queue a single CHW tensor for inference on model (version of
+        model_id) and wait for its result
+        """
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+
+        key = self._bucket_key(tensor, model_id, version)
+        future = loop.create_future()
+        self.pinned.setdefault(key, model)
+        queue = self.pending.setdefault(key, [])
+        queue.append((tensor, future))
+
+        if len(queue) >= self.max_batch_size:
+            self._schedule_dispatch(key)
+        elif len(queue) == 1:
+            loop.call_later(self.max_wait, self._schedule_dispatch, key)
+
+        return await future
+
+    def _schedule_dispatch(self, key):
+        if self.pending.get(key):
+            asyncio.ensure_future(self._dispatch(key))
+
+    async def _dispatch(self, key):
+        """Wait for a free worker, then run whatever is queued for this bucket"""
+        async with self._slots:
+            queue = self.pending.get(key)
+            if not queue:
+                return
+            batch = queue[:self.max_batch_size]
+            del queue[:self.max_batch_size]
+            model = self.pinned[key]
+            if queue:
+                self._schedule_dispatch(key)
+            else:
+                del self.pending[key]
+                del self.pinned[key]
+
+            batch = [(tensor, future) for tensor, future in batch if not future.cancelled()]
+            if not batch:
+                return
+
+            self.in_flight += 1
+            started = time.perf_counter()
+            try:
+                loop = asyncio.get_running_loop()
+                outputs = await loop.run_in_executor(
+                    self.executor, self._forward, key, model, [tensor for tensor, _ in batch]
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            finally:
+                self.in_flight -= 1
+                self.last_batch_ms = (time.perf_counter() - started) * 1000
+                INFERENCE_BATCH_SECONDS.observe(self.last_batch_ms / 1000, model=key[0])
+
+            self.batches_run += 1
+            self.items_run += len(batch)
+            self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+
+            for (_, future), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+    def _forward(self, key, model, tensors):
+        """Pad to the bucket size, run one forward pass and crop each result back"""
+        model_id, _, bucket_h, bucket_w = key
+
+        # Copy each tensor straight into one batch buffer and replicate its last
+        # row / column into the padding, rather than padding and stacking copies
+        batch = torch.empty(len(tensors), tensors[0].shape[0], bucket_h, bucket_w,
+                            dtype=tensors[0].dtype, device=tensors[0].device)
+        for i, tensor in enumerate(tensors):
+            _, height, width = tensor.shape
+            batch[i, :, :height, :width] = tensor
+            if width < bucket_w:
+                batch[i, :, :height, width:] = batch[i, :, :height, width - 1:width]
+            if height < bucket_h:
+                batch[i, :, height:, :] = batch[i, :, height - 1:height, :]
+
+        output = self.run_batch(batch, model, model_id)
+        return [output[i, :, :t.shape[1], :t.shape[2]] for i, t in enumerate(tensors)]
+
+    def get_stats(self):
+        """Get queue depth and batch size statistics"""
+        return {
+            "queue_depth": sum(len(queue) for queue in self.pending.values()),
+            "buckets_pending": len(self.pending),
+            "in_flight_batches": self.in_flight,
+            "batches_run": self.batches_run,
+            "items_run": self.items_run,
+            "avg_batch_size": self.items_run / self.batches_run if self.batches_run else 0.0,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+            "last_batch_ms": round(self.last_batch_ms, 2),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+    def shutdown(self):
+        """Stop the worker threads"""
+        self.executor.shutdown(wait=False)
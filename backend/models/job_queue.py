@@ -0,0 +1,152 @@
+import asyncio
+import itertools
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+class Job:
+    """A queued unit of work and its status"""
+    def __init__(self, run, owner, priority):
+        self.id = str(uuid.uuid4())
+        self.run = run
+        self.owner = owner
+        self.priority = priority
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Replaced on every status change; watchers wait on the one they saw
+        self.changed = asyncio.Event()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def to_dict(self):
+        timings = {}
+        if self.started_at is not None:
+            timings["queued_ms"] = round((self.started_at - self.created_at) * 1000, 1)
+        if self.finished_at is not None:
+            timings["run_ms"] = round((self.finished_at - self.started_at) * 1000, 1)
+            timings["total_ms"] = round((self.finished_at - self.created_at) * 1000, 1)
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timings": timings,
+            "result": self.result,
+            "error": self.error,
+        }
+
+class JobQueue:
+    """
+    Bounded priority queue of jobs served by a fixed pool of worker tasks.
+
+    Higher priority jobs run first, FIFO within a priority. Submitting to a
+    full queue raises JobQueueFull so callers can apply backpressure.
+    Finished jobs are kept (up to a limit) so their status can be polled.
+    """
+    def __init__(self, workers=None, max_queued=None, max_finished=None):
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "4"))
+        self.max_queued = max_queued or int(os.getenv("JOB_QUEUE_SIZE", "100"))
+        self.max_finished = max_finished or int(os.getenv("JOB_RETAIN_FINISHED", "10000"))
+        self.queue = asyncio.PriorityQueue(maxsize=self.max_queued)
+        self.jobs = {}
+        self.finished = OrderedDict()
+        self.sequence = itertools.count()
+        self.tasks = []
+
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, run, owner, priority=0):
+        """Queue run (an async callable returning the job result); raises JobQueueFull"""
+        job = Job(run, owner, priority)
+        try:
+            self.queue.put_nowait((-priority, next(self.sequence), job))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise JobQueueFull()
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def watch(self, job):
+        """Yield a status snapshot now and after every change until the job finishes"""
+        while True:
+            changed = job.changed
+            yield job.to_dict()
+            if job.finished:
+                return
+            await changed.wait()
+
+    def _notify(self, job):
+        changed = job.changed
+        job.changed = asyncio.Event()
+        changed.set()
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self.queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            self.running += 1
+            self._notify(job)
+            try:
+                job.result = await job.run()
+                job.status = "done"
+                self.completed += 1
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+                self.failed += 1
+            finally:
+                job.finished_at = time.time()
+                job.run = None
+                self.running -= 1
+                self.queue.task_done()
+                self._retire(job)
+                self._notify(job)
+
+    def _retire(self, job):
+        """Remember finished jobs, forgetting the oldest beyond max_finished"""
+        self.finished[job.id] = job
+        while len(self.finished) > self.max_finished:
+            old_id, _ = self.finished.popitem(last=False)
+            self.jobs.pop(old_id, None)
+
+    def start(self):
+        """Start the worker tasks on the running event loop"""
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def get_stats(self):
+        """Get queue depth and job counters"""
+        return {
+            "queued": self.queue.qsize(),
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+        }
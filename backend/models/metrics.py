@@ -0,0 +1,311 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import math
+import os
+import random
+import threading
+import time
+import uuid
+
+# Prometheus-style metrics (text exposition format 0.0.4) without a client
+# library dependency, plus sampled per-request stage traces.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75,
+                   1.0, 2.5, 5.0, 7.5, 10.0, 30.0)
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = [(k, str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}  # label values tuple -> value
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) for every series"""
+        with self.lock:
+            return [("", key, None, value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """
+    A value that goes up and down. With a function the gauge is read at
+    scrape time: it returns a number, or a dict of label values tuple -> number.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        try:
+            value = self.function()
+        except Exception:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [("", tuple(str(v) for v in key), None, v) for key, v in sorted(value.items())]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, series in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    samples.append(("_bucket", key, [("le", _format_value(bound))], cumulative))
+                samples.append(("_sum", key, None, series["sum"]))
+                samples.append(("_count", key, None, series["count"]))
+        return samples
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self._register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_seconds", "Time spent in each enhancement pipeline stage", ["stage"]
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "pipeline_stage_errors_total", "Enhancement pipeline stages that raised", ["stage"]
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route"]
+)
+REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by route and status code", ["method", "route", "status"]
+)
+AUTH_VERIFY_SECONDS = REGISTRY.histogram(
+    "auth_verify_seconds", "Token verification latency by outcome (cache_hit, db, invalid)", ["outcome"]
+)
+MODEL_LOAD_SECONDS = REGISTRY.histogram(
+    "model_load_seconds", "Model load time (weights, backend preparation)", ["model"]
+)
+MODEL_LOAD_ERRORS = REGISTRY.counter(
+    "model_load_errors_total", "Model loads that failed", ["model"]
+)
+INFERENCE_BATCH_SECONDS = REGISTRY.histogram(
+    "inference_batch_seconds", "Forward pass time per scheduler batch", ["model"]
+)
+PASSWORD_HASH_SECONDS = REGISTRY.histogram(
+    "password_hash_seconds", "bcrypt time per operation (hash, verify)", ["operation"]
+)
+PASSWORD_HASH_QUEUE_SECONDS = REGISTRY.histogram(
+    "password_hash_queue_seconds", "Time password hashes waited for a hashing worker"
+)
+PASSWORD_HASH_REJECTED = REGISTRY.counter(
+    "password_hash_rejected_total", "Logins and registrations turned away because the hashing queue was full"
+)
+FAIR_QUEUE_SECONDS = REGISTRY.histogram(
+    "fair_queue_seconds", "Time enhancement requests waited for their fair-share turn"
+)
+FAIR_REJECTED = REGISTRY.counter(
+    "fair_rejected_total", "Enhancement requests turned away (rate: user over their rate, queue_full)", ["reason"]
+)
+FAIR_DEGRADED = REGISTRY.counter(
+    "fair_degraded_total", "Enhancement requests run at reduced quality under load, by degradation level", ["level"]
+)
+
+class Trace:
+    """Stage timings of one request, in the order the stages finished"""
+    def __init__(self, trace_id=None):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.stages = []  # (stage, ms)
+
+    def add(self, name, seconds):
+        self.stages.append((name, seconds * 1000))
+
+    def totals(self):
+        """Milliseconds per stage, summed over repeats"""
+        totals = {}
+        for name, ms in self.stages:
+            totals[name] = totals.get(name, 0.0) + ms
+        return totals
+
+    def server_timing(self):
+        """Server-Timing header value, ending with the time so far"""
+        total_ms = (time.perf_counter() - self.started) * 1000
+        return ", ".join([f"{name};dur={ms:.1f}" for name, ms in self.totals().items()] + [f"total;dur={total_ms:.1f}"])
+
+    def summary(self):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        stages = " ".join(f"{name}={ms:.1f}ms" for name, ms in self.totals().items())
+        return f"trace {self.id} total={total_ms:.1f}ms {stages}"
+
+current_trace = ContextVar("current_trace", default=None)
+
+def trace_stage(name, seconds):
+    """Add a stage timing to the current request's trace, if it is being traced"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+@contextmanager
+def stage(name):
+    """
+    Time a pipeline stage: observed in pipeline_stage_seconds, counted in
+    pipeline_stage_errors_total if it raises and added to the request's
+    trace. The block may contain awaits; wall time is measured.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if not isinstance(e, (GeneratorExit, KeyboardInterrupt)):
+            STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        trace_stage(name, elapsed)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route request latency and status counts.
+
+    A sample of requests (TRACE_SAMPLE_RATE, and any request sending an
+    X-Trace header) is traced: their stage breakdown is returned in a
+    Server-Timing header (when the stages finish before the response
+    starts) and printed as one log line.
+    """
+    def __init__(self, app, sample_rate=None):
+        self.app = app
+        self.sample_rate = float(sample_rate if sample_rate is not None else os.getenv("TRACE_SAMPLE_RATE", "0"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        traced = b"x-trace" in headers or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        trace = Trace() if traced else None
+        token = current_trace.set(trace)
+        response_status = [500]
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                response_status[0] = message["status"]
+                if trace is not None:
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers") or []) + [
+                        (b"server-timing", trace.server_timing().encode()),
+                        (b"x-trace-id", trace.id.encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            route = getattr(route, "path", "unmatched")
+            elapsed = time.perf_counter() - started
+            REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route)
+            REQUESTS.inc(method=scope["method"], route=route, status=response_status[0])
+            if trace is not None:
+                print(f"{scope['method']} {route} {response_status[0]} {trace.summary()}")
+            current_trace.reset(token)
@@ -1,46 +1,381 @@
 import torch
 import torch.nn as nn
+from contextlib import asynccontextmanager
 from pathlib import Path
+import asyncio
+import json
 import os
+import time
+
+from .inference_backends import build_backend, compare_outputs, reference_batch
+from .metrics import MODEL_LOAD_ERRORS, MODEL_LOAD_SECONDS
+
+try:
+    from safetensors.torch import load_file as load_safetensors
+except ImportError:  # optional; .pt weights are memory-mapped with torch.load instead
+    load_safetensors = None
+
+WEIGHT_SUFFIXES = (".pt", ".pth", ".safetensors")
+
+# Display names for the bundled models; others can ship a model.json next to their weights
+MODEL_INFO = {
+    "lol_real": {"name": "LOL Real Dataset", "description": "Trained on real low light images"},
+}
+
+def model_footprint(model):
+    """Bytes held by a model's parameters and buffers (or a state dict's tensors)"""
+    if isinstance(model, nn.Module):
+        tensors = list(model.parameters()) + list(model.buffers())
+    elif isinstance(model, dict):
+        tensors = [value for value in model.values() if isinstance(value, torch.Tensor)]
+    else:
+        return 0
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
 
 class ModelManager:
-    def __init__(self):
+    """
+    Registry of the models under models_dir.
+
+    Every subdirectory holding a weights file is a model, registered under
+    its lowercased directory name (LOL_real -> lol_real). Models are loaded
+    on first use (or at startup for MODEL_PRELOAD) and the least recently
+    used ones are unloaded when the loaded total exceeds the memory budget;
+    models in use by a request are never unloaded. refresh() notices
+    replaced weights files and swaps the new version in: requests already
+    holding the old model finish with it.
+
+    Each model runs on an inference backend (eager, torchscript, compile,
+    onnx or int8), chosen per model by MODEL_BACKENDS or a "backend" key in
+    its model.json, else INFERENCE_BACKEND. A backend is only used if its
+    outputs on a reference batch stay within the PSNR/SSIM tolerance of
+    eager PyTorch; otherwise the model falls back to eager.
+    """
+    def __init__(self, models_dir=None):
+        self.models_dir = Path(models_dir or os.getenv(
+            "MODELS_DIR", "trained_models_SMG_Low_Light_Enhancement/trained_models"
+        ))
+        self.memory_budget = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "2048")) * 1024 * 1024
+        self.preload = [m.strip() for m in os.getenv("MODEL_PRELOAD", "lol_real").split(",") if m.strip()]
+        self.refresh_interval = float(os.getenv("MODEL_REFRESH_INTERVAL", "30"))
+        self.default_backend = os.getenv("INFERENCE_BACKEND", "eager")
+        self.model_backends = dict(
+            item.split("=", 1) for item in os.getenv("MODEL_BACKENDS", "").split(",") if "=" in item
+        )
+        self.min_psnr = float(os.getenv("INFERENCE_BACKEND_MIN_PSNR", "40"))
+        self.min_ssim = float(os.getenv("INFERENCE_BACKEND_MIN_SSIM", "0.99"))
+
+        self.registry = {}        # model id -> {"path", "name", "description", "version"}
         self.models = {}
-        self.model_paths = {
-            "lol_real": "trained_models_SMG_Low_Light_Enhancement/trained_models/LOL_real/model.pt"
-        }
+        self.model_versions = {}  # version of the loaded weights
+        self.model_paths = {}
+        self.load_times = {}
+        self.footprints = {}
+        self.backends = {}        # model id -> backend in use and its accuracy against eager
+        self.last_used = {}
+        self.in_use = {}
+        self.load_locks = {}
+        self.loads = 0
+        self.evictions = 0
+        self.swaps = 0
+        self.refresh_task = None
+
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         print(f"Using device: {self.device}")
 
+        # Memory-map weights so worker processes share one page-cache copy
+        self.mmap_weights = os.getenv("MODEL_MMAP", "1") != "0"
+
+        # Cap torch's intra-op threads, e.g. to leave cores for the pipeline workers
+        torch_threads = int(os.getenv("TORCH_NUM_THREADS", "0"))
+        if torch_threads:
+            torch.set_num_threads(torch_threads)
+
+        self.discover()
+
+    @staticmethod
+    def _file_version(path):
+        stat = os.stat(path)
+        return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+    def discover(self):
+        """Rescan models_dir for model directories; returns the registry"""
+        registry = {}
+        if self.models_dir.is_dir():
+            for directory in sorted(self.models_dir.iterdir()):
+                if not directory.is_dir():
+                    continue
+                weights = sorted(p for p in directory.iterdir() if p.suffix in WEIGHT_SUFFIXES)
+                if not weights:
+                    continue
+                # Prefer model.pt; a .safetensors twin is picked up by load_weights
+                path = next((p for p in weights if p.stem == "model" and p.suffix != ".safetensors"), weights[0])
+                model_id = directory.name.lower()
+                info = dict(MODEL_INFO.get(model_id, {}))
+                info_file = directory / "model.json"
+                if info_file.exists():
+                    try:
+                        with open(info_file, 'r') as f:
+                            info.update(json.load(f))
+                    except (OSError, json.JSONDecodeError) as e:
+                        print(f"Ignoring {info_file}: {e}")
+                registry[model_id] = {
+                    "path": str(path),
+                    "name": info.get("name", directory.name.replace("_", " ")),
+                    "description": info.get("description", ""),
+                    "backend": info.get("backend"),
+                    "version": self._file_version(path),
+                }
+        else:
+            print(f"Model directory not found: {self.models_dir}")
+
+        self.registry = registry
+        self.model_paths = {model_id: entry["path"] for model_id, entry in registry.items()}
+        return registry
+
     async def load_models(self):
-        """Load all available models"""
-        for model_id, model_path in self.model_paths.items():
+        """Load the preloaded models (MODEL_PRELOAD, "all" for every model); others load on first use"""
+        model_ids = list(self.registry) if self.preload == ["all"] else self.preload
+        for model_id in model_ids:
+            if model_id not in self.registry:
+                print(f"Model file not found: {model_id} under {self.models_dir}")
+                continue
             try:
-                if os.path.exists(model_path):
-                    # Load the model
-                    model = torch.load(model_path, map_location=self.device)
-                    if isinstance(model, dict):
-                        # If it's a state dict, we need to create the model architecture first
-                        # For now, we'll assume the model is already complete
-                        self.models[model_id] = model
-                    else:
-                        self.models[model_id] = model
-                    print(f"Loaded {model_id} model successfully")
-                else:
-                    print(f"Model file not found: {model_path}")
+                await self.ensure_loaded(model_id)
             except Exception as e:
                 print(f"Error loading {model_id} model: {e}")
 
+    async def ensure_loaded(self, model_id):
+        """Load model_id if it isn't loaded yet; concurrent callers share one load"""
+        if model_id in self.models:
+            return self.models[model_id]
+        if model_id not in self.registry:
+            raise ValueError(f"Unknown model: {model_id}")
+
+        lock = self.load_locks.setdefault(model_id, asyncio.Lock())
+        async with lock:
+            if model_id not in self.models:
+                await self._load(model_id, self.registry[model_id])
+        return self.models[model_id]
+
+    async def _load(self, model_id, entry):
+        """Load weights off the event loop, then install them (replacing any older version)"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            model = await loop.run_in_executor(None, self.load_weights, entry["path"])
+            if isinstance(model, nn.Module):
+                model.eval()
+            # If it's a state dict, the model architecture would be needed to run it;
+            # for now it is stored as loaded
+            footprint = model_footprint(model)
+            model, backend = await loop.run_in_executor(None, self.prepare_backend, model_id, model, entry)
+        except Exception:
+            MODEL_LOAD_ERRORS.inc(model=model_id)
+            raise
+
+        self.models[model_id] = model
+        self.model_versions[model_id] = entry["version"]
+        self.load_times[model_id] = (time.perf_counter() - started) * 1000
+        self.footprints[model_id] = footprint
+        self.backends[model_id] = backend
+        self.last_used[model_id] = time.time()
+        self.loads += 1
+        MODEL_LOAD_SECONDS.observe(self.load_times[model_id] / 1000, model=model_id)
+        print(f"Loaded {model_id} model successfully in {self.load_times[model_id]:.0f}ms")
+        self._evict_over_budget(keep=model_id)
+
+    def backend_for(self, model_id, entry=None):
+        """Backend requested for a model"""
+        return (self.model_backends.get(model_id)
+                or (entry or self.registry.get(model_id, {})).get("backend")
+                or self.default_backend)
+
+    def prepare_backend(self, model_id, model, entry):
+        """
+        Wrap an eager model for its configured backend, checked against eager
+        on a reference batch. Returns (runnable model, backend info). Blocking.
+        """
+        requested = self.backend_for(model_id, entry)
+        info = {"name": "eager", "requested": requested, "psnr": None, "ssim": None}
+        if requested == "eager" or not isinstance(model, nn.Module):
+            return model, info
+
+        try:
+            candidate = build_backend(requested, model, reference_batch(batch_size=1, size=64))
+            accuracy = compare_outputs(model, candidate, reference_batch())
+        except Exception as e:
+            print(f"Backend {requested} unavailable for {model_id} ({e}); using eager")
+            return model, info
+
+        # Identical outputs give infinite PSNR, which JSON can't carry; report it as 100dB
+        info.update(psnr=round(min(accuracy["psnr"], 100.0), 2), ssim=round(accuracy["ssim"], 5))
+        if accuracy["psnr"] < self.min_psnr or accuracy["ssim"] < self.min_ssim:
+            print(
+                f"Backend {requested} for {model_id} is outside tolerance "
+                f"(PSNR {accuracy['psnr']:.1f}dB, SSIM {accuracy['ssim']:.4f}); using eager"
+            )
+            return model, info
+        info["name"] = requested
+        return candidate, info
+
+    def _evict_over_budget(self, keep=None):
+        """Unload least recently used idle models while the loaded total is over the budget"""
+        if not self.memory_budget:
+            return
+        candidates = sorted(
+            (model_id for model_id in self.models if model_id != keep and not self.in_use.get(model_id)),
+            key=lambda model_id: self.last_used.get(model_id, 0)
+        )
+        for model_id in candidates:
+            if sum(self.footprints.get(m, 0) for m in self.models) <= self.memory_budget:
+                break
+            self.unload(model_id)
+            self.evictions += 1
+            print(f"Unloaded {model_id} model to stay within the memory budget")
+
+    def unload(self, model_id):
+        self.models.pop(model_id, None)
+        self.model_versions.pop(model_id, None)
+        self.footprints.pop(model_id, None)
+        self.backends.pop(model_id, None)
+
+    @asynccontextmanager
+    async def use(self, model_id):
+        """
+        Load model_id if needed and keep it loaded for the duration of the
+        block. Yields (model, version): the block should run everything on
+        that model object, which stays valid even if refresh() swaps in a
+        newer version meanwhile.
+        """
+        self.in_use[model_id] = self.in_use.get(model_id, 0) + 1
+        try:
+            await self.ensure_loaded(model_id)
+            self.last_used[model_id] = time.time()
+            yield self.models[model_id], self.get_model_version(model_id)
+        finally:
+            self.in_use[model_id] -= 1
+            if not self.in_use[model_id]:
+                del self.in_use[model_id]
+
+    async def refresh(self):
+        """
+        Rediscover models and hot-swap loaded ones whose weights file changed.
+        The new version loads alongside the old one and replaces it in a single
+        step, so requests keep being served throughout.
+        """
+        loop = asyncio.get_running_loop()
+        registry = await loop.run_in_executor(None, self.discover)
+        for model_id, entry in registry.items():
+            loaded_version = self.model_versions.get(model_id)
+            if model_id in self.models and loaded_version is not None and loaded_version != entry["version"]:
+                lock = self.load_locks.setdefault(model_id, asyncio.Lock())
+                async with lock:
+                    try:
+                        await self._load(model_id, entry)
+                        self.swaps += 1
+                        print(f"Hot-swapped {model_id} to version {entry['version']}")
+                    except Exception as e:
+                        print(f"Error reloading {model_id} model, keeping the loaded version: {e}")
+
+    async def run_refresh(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Model refresh failed: {e}")
+
+    def start_refresh(self):
+        """Poll for new model versions on the running event loop (MODEL_REFRESH_INTERVAL, 0 disables)"""
+        if self.refresh_task is None and self.refresh_interval:
+            self.refresh_task = asyncio.create_task(self.run_refresh())
+
+    async def stop_refresh(self):
+        if self.refresh_task is not None:
+            self.refresh_task.cancel()
+            try:
+                await self.refresh_task
+            except asyncio.CancelledError:
+                pass
+            self.refresh_task = None
+
+    def load_weights(self, model_path):
+        """
+        Load a weights file without reading it all into private memory.
+
+        A .safetensors file next to the .pt file is preferred. Otherwise the
+        .pt file is loaded with torch.load(mmap=True). Either way tensors on
+        the CPU are backed by a copy-on-write mapping of the file, so every
+        worker process that loads it shares the same physical pages until
+        something writes to them. Moving weights to a GPU or converting their
+        dtype makes a private copy.
+        """
+        safetensors_path = Path(model_path).with_suffix(".safetensors")
+        if self.mmap_weights and load_safetensors is not None and safetensors_path.exists():
+            return load_safetensors(str(safetensors_path), device=str(self.device))
+
+        if self.mmap_weights:
+            try:
+                return torch.load(model_path, map_location=self.device, mmap=True, weights_only=False)
+            except (RuntimeError, TypeError) as e:
+                # Legacy (non-zip) checkpoints can't be memory-mapped
+                print(f"Memory-mapped load of {model_path} failed ({e}); reading it instead")
+        return torch.load(model_path, map_location=self.device, weights_only=False)
+
     def get_model(self, model_id):
         """Get a specific model by ID"""
         if model_id not in self.models:
             raise ValueError(f"Model {model_id} not loaded")
+        self.last_used[model_id] = time.time()
         return self.models[model_id]
 
+    def get_model_version(self, model_id):
+        """Version tag of a model, derived from its weights file (the loaded one if loaded)"""
+        if model_id in self.model_versions:
+            return self.model_versions[model_id]
+        entry = self.registry.get(model_id)
+        return entry["version"] if entry else "none"
+
+    def has_model(self, model_id):
+        """Check if a model is registered (loaded or not)"""
+        return model_id in self.registry or model_id in self.models
+
     def is_model_loaded(self, model_id):
         """Check if a model is loaded"""
         return model_id in self.models
 
     def get_available_models(self):
-        """Get list of available models"""
+        """Get list of loaded models"""
         return list(self.models.keys())
+
+    def list_models(self):
+        """Every known model with its load state, footprint and load latency"""
+        models = []
+        for model_id in sorted(set(self.registry) | set(self.models)):
+            entry = self.registry.get(model_id, {})
+            loaded = model_id in self.models
+            models.append({
+                "id": model_id,
+                "name": entry.get("name", model_id),
+                "description": entry.get("description", ""),
+                "loaded": loaded,
+                "version": self.get_model_version(model_id),
+                "memory_bytes": self.footprints.get(model_id, 0) if loaded else 0,
+                "backend": self.backends.get(model_id) if loaded else {"requested": self.backend_for(model_id)},
+                "load_ms": round(self.load_times[model_id], 1) if model_id in self.load_times else None,
+                "last_used": self.last_used.get(model_id),
+                "in_use": self.in_use.get(model_id, 0),
+            })
+        return models
+
+    def get_stats(self):
+        """Get loaded memory against the budget and load/eviction counters"""
+        return {
+            "loaded": len(self.models),
+            "registered": len(self.registry),
+            "memory_bytes": sum(self.footprints.get(m, 0) for m in self.models),
+            "memory_budget_bytes": self.memory_budget,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "swaps": self.swaps,
+        }
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from .metrics import PASSWORD_HASH_QUEUE_SECONDS, PASSWORD_HASH_REJECTED, PASSWORD_HASH_SECONDS
+
+class PasswordHasherBusy(Exception):
+    """Raised when a hash is requested while the hashing queue is at capacity"""
+
+class PasswordHasher:
+    """
+    bcrypt password hashing on a small dedicated thread pool with its own
+    admission queue.
+
+    bcrypt costs 100ms+ of CPU per hash by design, so it never runs on the
+    event loop or on the pipeline executor. The pool is capped
+    (PASSWORD_HASH_WORKERS threads, a quarter of the cores by default) so a
+    login burst cannot take more than that share of the CPU from /enhance and
+    /download. Requests beyond the workers wait in a queue of at most
+    PASSWORD_HASH_QUEUE_SIZE; past that, PasswordHasherBusy is raised so the
+    caller can answer 429 instead of piling up work.
+
+    Hashes from older versions (unsalted SHA-256 hex digests) still verify,
+    and verify() returns a bcrypt replacement for them so they are migrated
+    on the next successful login. The same happens when BCRYPT_ROUNDS is
+    raised.
+    """
+    def __init__(self, workers=None, max_queued=None, rounds=None):
+        self.workers = workers or int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 1) // 4))))
+        self.max_queued = max_queued if max_queued is not None else int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "64"))
+        self.rounds = rounds or int(os.getenv("BCRYPT_ROUNDS", "12"))
+        self.context = CryptContext(
+            schemes=["bcrypt", "hex_sha256"],
+            deprecated=["hex_sha256"],
+            bcrypt__rounds=self.rounds,
+        )
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+
+        self.lock = threading.Lock()
+        self.pending = 0  # queued + running
+        self.running = 0
+        self.counts = {"hash": 0, "verify": 0, "rehash": 0, "rejected": 0}
+        self.hash_seconds = 0.0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+
+    def _admit(self):
+        with self.lock:
+            if self.pending >= self.workers + self.max_queued:
+                self.counts["rejected"] += 1
+                PASSWORD_HASH_REJECTED.inc()
+                raise PasswordHasherBusy("Too many logins in progress, try again shortly")
+            self.pending += 1
+
+    def _run(self, operation, submitted, fn, *args):
+        """Runs on a hashing thread; records queue wait and hash time"""
+        started = time.perf_counter()
+        waited = started - submitted
+        with self.lock:
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.running -= 1
+                self.counts[operation] += 1
+                self.hash_seconds += elapsed
+                self.queue_seconds += waited
+                self.max_queue_seconds = max(self.max_queue_seconds, waited)
+            PASSWORD_HASH_SECONDS.observe(elapsed, operation=operation)
+            PASSWORD_HASH_QUEUE_SECONDS.observe(waited)
+
+    def _release(self, _future=None):
+        with self.lock:
+            self.pending -= 1
+
+    async def _submit(self, operation, fn, *args):
+        """
+        Queue fn on the hashing pool. The slot is released when the job
+        ends, not when the caller stops waiting: a cancelled request's hash
+        keeps its worker busy until it finishes (or is dropped unstarted).
+        """
+        self._admit()
+        try:
+            future = self.executor.submit(self._run, operation, time.perf_counter(), fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password):
+        """bcrypt hash of password"""
+        return await self._submit("hash", self.context.hash, password)
+
+    async def verify(self, password, hashed):
+        """
+        (matches, replacement hash or None). A replacement is returned when
+        the password matched a legacy or weaker hash and should be stored.
+        """
+        return await self._submit("verify", self.context.verify_and_update, password, hashed)
+
+    async def dummy_verify(self):
+        """Spend the time of a verify, so unknown emails can't be told apart by response time"""
+        await self._submit("verify", self.context.dummy_verify)
+
+    def record_rehash(self):
+        with self.lock:
+            self.counts["rehash"] += 1
+
+    def get_stats(self):
+        """Get hashing pool occupancy, counts, hash time and queue wait"""
+        with self.lock:
+            done = self.counts["hash"] + self.counts["verify"]
+            return {
+                "workers": self.workers,
+                "max_queued": self.max_queued,
+                "bcrypt_rounds": self.rounds,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                "hashes": self.counts["hash"],
+                "verifies": self.counts["verify"],
+                "rehashed": self.counts["rehash"],
+                "rejected": self.counts["rejected"],
+                "avg_hash_ms": round(self.hash_seconds / done * 1000, 2) if done else 0.0,
+                "avg_queue_wait_ms": round(self.queue_seconds / done * 1000, 2) if done else 0.0,
+                "max_queue_wait_ms": round(self.max_queue_seconds * 1000, 2),
+            }
+
+    def shutdown(self):
+        """Stop the hashing threads"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+import torch
+
+# Fused conversions between uint8 HWC images and the model's normalized
+# [-1, 1] float CHW tensors. They replace ToTensor -> Normalize and
+# Normalize -> ToPILImage, which each make several full-size copies, with
+# one copy into a (possibly preallocated) buffer and in-place arithmetic.
+
+def to_model_input(array, out=None):
+    """uint8 HWC array -> float32 CHW tensor in [-1, 1], written into out if given"""
+    source = torch.from_numpy(array).permute(2, 0, 1)
+    if out is None:
+        out = torch.empty(source.shape, dtype=torch.float32)
+    out.copy_(source)
+    return out.mul_(2 / 255).sub_(1)
+
+def to_uint8(tensor, out=None):
+    """
+    Normalized CHW tensor -> uint8 HWC array, written into out if given.
+    The tensor is used as scratch space and overwritten.
+    """
+    tensor = tensor.add_(1).mul_(127.5).add_(0.5).clamp_(0, 255)
+    if out is None:
+        out = np.empty((tensor.shape[1], tensor.shape[2], 3), dtype=np.uint8)
+    torch.from_numpy(out).copy_(tensor.permute(1, 2, 0))
+    return out
+
+def simple_enhancement_(tensor):
+    """
+    Brightness x1.5 then contrast x1.2 around 0.5, clamped to [-1, 1], folded
+    into one multiply-add and applied in place
+    """
+    return tensor.mul_(1.8).sub_(0.1).clamp_(-1, 1)
+
+def simple_enhancement_lut():
+    """The simple enhancement as a 256-entry uint8 table (it is per pixel, so this is exact)"""
+    levels = to_model_input(np.arange(256, dtype=np.uint8).reshape(1, 256, 1).repeat(3, axis=2))
+    return to_uint8(simple_enhancement_(levels))[0, :, 0].copy()
+
+SIMPLE_ENHANCEMENT_LUT = simple_enhancement_lut()
+
+def apply_lut(image, lut=SIMPLE_ENHANCEMENT_LUT):
+    """Map every channel value of a uint8 image through lut in one pass"""
+    return cv2.LUT(image, lut)
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+def hash_file(fileobj, chunk_size=1024 * 1024):
+    """SHA-256 of a file object's contents; leaves the file positioned at the start"""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Content-addressed cache of enhancement results.
+
+    Entries are keyed by the owner, the hash of the uploaded bytes, the model
+    id, model version and output encoding, and point at an output in the
+    artifact store owned by that user, so a hit never hands out (or counts
+    against a quota) another user's file. The cache is an LRU bounded by the
+    total size of the files it owns; evicted outputs are deleted from the
+    store. Identical requests that arrive while the first one is still being
+    processed wait for it instead of running the pipeline again.
+    on_evict is called with each store record an eviction deletes.
+    discard_file_id may be called from other threads (e.g. retention's).
+    """
+    def __init__(self, store, max_bytes=None, on_evict=None):
+        self.store = store
+        self.on_evict = on_evict
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes or int(os.getenv("RESULT_CACHE_MAX_BYTES", str(2 * 1024**3)))
+        self.entries = OrderedDict()  # key -> {"file_id", "path", "size"}
+        self.keys_by_file_id = {}
+        self.total_bytes = 0
+        self.in_flight = {}  # key -> asyncio.Future
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(owner, digest, model_id, model_version, *variant):
+        return ":".join([owner, digest, model_id, model_version, *variant])
+
+    async def get(self, key):
+        """
+        Return the cached entry for key, or None. Entries no longer in the
+        store are dropped. The store is read (and touched) on a worker thread.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        loop = asyncio.get_running_loop()
+        record = await loop.run_in_executor(None, self._touch, entry["file_id"])
+        with self.lock:
+            if self.entries.get(key) is not entry:
+                return None  # evicted or replaced meanwhile
+            if record is None:
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def _touch(self, file_id):
+        """Store record of a cached output, marked as used; None if it is gone"""
+        record = self.store.get(file_id)
+        if record is not None:
+            self.store.touch(record)
+        return record
+
+    async def get_or_create(self, key, create):
+        """
+        Return (entry, cached). On a miss create() is awaited to produce the
+        entry; concurrent callers with the same key share that single call.
+        Entries marked "transient" (e.g. degraded under load) are handed to
+        those callers but not cached.
+        """
+        entry = await self.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry, True
+
+        if key in self.in_flight:
+            self.coalesced += 1
+            return await asyncio.shield(self.in_flight[key]), True
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            entry = await create()
+            if not entry.get("transient"):
+                await self.put(key, entry)
+            future.set_result(entry)
+            return entry, False
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self.in_flight[key]
+
+    async def put(self, key, entry):
+        """
+        Add an entry and evict least recently used outputs over the byte
+        budget; their files are deleted on a worker thread
+        """
+        evicted = []
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = entry
+            self.keys_by_file_id[entry["file_id"]] = key
+            self.total_bytes += entry["size"]
+
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                oldest = next(iter(self.entries))
+                evicted.append(self._remove(oldest)["file_id"])
+                self.evictions += 1
+        if evicted:
+            await asyncio.get_running_loop().run_in_executor(None, self._delete, evicted)
+
+    def _delete(self, file_ids):
+        """Delete evicted outputs from the store and report them to on_evict"""
+        for file_id in file_ids:
+            for record in self.store.remove(file_id):
+                if self.on_evict is not None:
+                    self.on_evict(record)
+
+    def discard_file_id(self, file_id):
+        """Forget the entry for file_id (e.g. after /cleanup deleted it)"""
+        with self.lock:
+            key = self.keys_by_file_id.get(file_id)
+            if key is not None:
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.keys_by_file_id.pop(entry["file_id"], None)
+        self.total_bytes -= entry["size"]
+        return entry
+
+    def get_stats(self):
+        """Get hit/miss counters and current size"""
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": ((self.hits + self.coalesced) / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "in_flight": len(self.in_flight),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import time
+
+class RetentionManager:
+    """
+    Background reclaimer that keeps the artifact store within its limits.
+
+    Each pass applies, in order:
+      - TTLs: uploads older than upload_ttl and outputs not downloaded for
+        output_ttl are deleted (the original upload is only needed briefly
+        once its enhancement has been produced);
+      - per-user quotas: users over user_quota lose their least recently
+        used files until they are back under it;
+      - the global byte budget: least recently used files of anyone are
+        deleted until total usage is under max_bytes.
+
+    Candidates come from the store's indexed LRU queries in batches and
+    usage figures are the store's incrementally maintained counters, so a
+    pass costs O(files reclaimed), not O(files stored). A limit set to 0 is
+    disabled. on_evict is called with each removed record on the
+    reclaimer's worker thread, so its cleanup stays off the event loop.
+    """
+    def __init__(self, store, on_evict=None, interval=None, upload_ttl=None, output_ttl=None,
+                 user_quota=None, max_bytes=None, batch_size=None):
+        self.store = store
+        self.on_evict = on_evict
+        self.interval = interval or float(os.getenv("RETENTION_INTERVAL", "300"))
+        self.upload_ttl = float(upload_ttl if upload_ttl is not None else os.getenv("RETENTION_UPLOAD_TTL", "3600"))
+        self.output_ttl = float(output_ttl if output_ttl is not None else os.getenv("RETENTION_OUTPUT_TTL", str(7 * 86400)))
+        self.user_quota = int(user_quota if user_quota is not None else os.getenv("RETENTION_USER_QUOTA_BYTES", str(1024 ** 3)))
+        self.max_bytes = int(max_bytes if max_bytes is not None else os.getenv("RETENTION_MAX_BYTES", str(20 * 1024 ** 3)))
+        self.batch_size = batch_size or int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+        self.task = None
+        self.wakeup = None
+
+        self.passes = 0
+        self.reclaimed_files = 0
+        self.reclaimed_bytes = 0
+        self.reclaimed_by_reason = {"ttl": 0, "quota": 0, "budget": 0}
+        self.last_pass_ms = 0.0
+        self.last_pass_at = None
+
+    def reclaim_once(self, now=None):
+        """Run one retention pass; returns the removed records"""
+        started = time.perf_counter()
+        now = now or time.time()
+        removed = []
+
+        if self.upload_ttl:
+            removed += self._reclaim("ttl", lambda: float("inf"), kind="upload", accessed_before=now - self.upload_ttl)
+        if self.output_ttl:
+            removed += self._reclaim("ttl", lambda: float("inf"), kind="output", accessed_before=now - self.output_ttl)
+        if self.user_quota:
+            for owner in self.store.owners_over(self.user_quota):
+                removed += self._reclaim(
+                    "quota", lambda: self.store.usage(owner)["bytes"] - self.user_quota, owner=owner
+                )
+        if self.max_bytes:
+            removed += self._reclaim("budget", lambda: self.store.total_bytes - self.max_bytes)
+
+        self.passes += 1
+        self.last_pass_ms = (time.perf_counter() - started) * 1000
+        self.last_pass_at = now
+        return removed
+
+    def _reclaim_and_report(self):
+        """Run a pass and hand its removed records to on_evict (on a worker thread)"""
+        removed = self.reclaim_once()
+        if self.on_evict is not None:
+            for record in removed:
+                self.on_evict(record)
+        return removed
+
+    def _reclaim(self, reason, excess, **filters):
+        """Delete LRU records matching filters, one batch per transaction, while excess() bytes are over the limit"""
+        removed = []
+        while excess() > 0:
+            candidates = self.store.least_recently_used(self.batch_size, **filters)
+            if not candidates:
+                break
+            # Take only as many as needed to get back under the limit
+            needed = excess()
+            batch = []
+            freed = 0
+            for record in candidates:
+                batch.append(record)
+                freed += record["size"] + record["attached_size"]
+                if freed >= needed:
+                    break
+            self.store.remove_records(batch)
+            removed += batch
+            self.reclaimed_by_reason[reason] += len(batch)
+            self.reclaimed_files += len(batch)
+            self.reclaimed_bytes += freed
+        return removed
+
+    def check(self, owner):
+        """Wake the reclaimer early if owner or the store as a whole just went over its limit"""
+        if self.wakeup is None:
+            return
+        if (self.user_quota and self.store.usage(owner)["bytes"] > self.user_quota) or \
+                (self.max_bytes and self.store.total_bytes > self.max_bytes):
+            self.wakeup.set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                removed = await loop.run_in_executor(None, self._reclaim_and_report)
+                if removed:
+                    print(f"Retention reclaimed {len(removed)} files in {self.last_pass_ms:.1f}ms")
+            except Exception as e:
+                print(f"Retention pass failed: {e}")
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    def start(self):
+        """Start the reclaimer on the running event loop"""
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+            self.wakeup = None
+
+    def get_stats(self):
+        """Get usage against the limits and reclaim counters"""
+        return {
+            "total_bytes": self.store.total_bytes,
+            "total_files": self.store.total_files,
+            "max_bytes": self.max_bytes,
+            "user_quota_bytes": self.user_quota,
+            "upload_ttl": self.upload_ttl,
+            "output_ttl": self.output_ttl,
+            "passes": self.passes,
+            "reclaimed_files": self.reclaimed_files,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "reclaimed_by_reason": dict(self.reclaimed_by_reason),
+            "last_pass_ms": round(self.last_pass_ms, 2),
+            "last_pass_at": self.last_pass_at,
+            "interval": self.interval,
+        }
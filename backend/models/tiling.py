@@ -0,0 +1,140 @@
+import numpy as np
+import torch
+
+from .pixel_ops import to_model_input, to_uint8
+
+def tile_starts(length, tile_size, overlap):
+    """Start offsets of overlapping tiles covering [0, length)"""
+    if length <= tile_size:
+        return [0]
+    step = tile_size - overlap
+    starts = list(range(0, length - tile_size + 1, step))
+    if starts[-1] != length - tile_size:
+        starts.append(length - tile_size)
+    return starts
+
+def blend_ramp(length, overlap):
+    """1D feathering weights: linear ramp over the overlap at both ends, 1 in the middle"""
+    ramp = np.ones(length, dtype=np.float32)
+    fade = min(overlap, length // 2)
+    if fade > 0:
+        edge = np.arange(1, fade + 1, dtype=np.float32) / (fade + 1)
+        ramp[:fade] = edge
+        ramp[length - fade:] = edge[::-1]
+    return ramp
+
+class TileBlender:
+    """
+    Splits a uint8 HWC image into overlapping tiles and blends the enhanced
+    tiles back together one strip of rows at a time.
+
+    Only the current strip is held as float; rows are written to the uint8
+    output as soon as no later tile can touch them, so the float working set
+    is bounded by tile_size * image width rather than the whole image.
+
+    Tile inputs, blend windows and the blending scratch space are allocated
+    once per image and reused for every tile. An image that fits in one tile
+    skips blending and is converted straight into the uint8 output.
+    """
+    def __init__(self, image, tile_size, overlap):
+        self.image = image
+        self.height, self.width = image.shape[:2]
+        self.tile_size = tile_size
+        self.overlap = min(overlap, tile_size // 2)
+
+        self.row_starts = tile_starts(self.height, tile_size, self.overlap)
+        self.col_starts = tile_starts(self.width, tile_size, self.overlap)
+        self.output = np.empty_like(image)
+        self.single_tile = len(self.row_starts) == 1 and len(self.col_starts) == 1
+
+        self.tile_inputs = []     # reusable float CHW input buffers, one per tile in flight
+        self.windows = {}         # (h, w) -> (blend window, window * 127.5)
+        self.acc_top = 0
+        if self.single_tile:
+            return
+
+        # Strip accumulator; row i holds image row self.acc_top + i. It is allocated
+        # once at tile height and rows are shifted up as they are flushed.
+        strip_height = min(tile_size, self.height)
+        self.acc = np.zeros((strip_height, self.width, 3), dtype=np.float32)
+        self.weights = np.zeros((strip_height, self.width, 1), dtype=np.float32)
+        self.scratch = np.empty((strip_height, min(tile_size, self.width), 3), dtype=np.float32)
+        self.flush_chunk = np.empty((64, self.width, 3), dtype=np.float32)
+        self.flush_weights = np.empty((64, self.width, 1), dtype=np.float32)
+
+    @property
+    def rows(self):
+        return len(self.row_starts)
+
+    @property
+    def tiles_per_row(self):
+        return len(self.col_starts)
+
+    def _tile_box(self, row, col):
+        y0 = self.row_starts[row]
+        x0 = self.col_starts[col]
+        return y0, x0, min(self.tile_size, self.height - y0), min(self.tile_size, self.width - x0)
+
+    def _window(self, h, w):
+        if (h, w) not in self.windows:
+            window = (blend_ramp(h, self.overlap)[:, None] * blend_ramp(w, self.overlap)[None, :])[..., None]
+            self.windows[(h, w)] = (window, window * 127.5)
+        return self.windows[(h, w)]
+
+    def tile_tensors(self, row, cols):
+        """
+        Normalized CHW tensors for the given tiles of a strip. They are views
+        of reused buffers, valid until the next call.
+        """
+        tensors = []
+        for i, col in enumerate(cols):
+            y0, x0, h, w = self._tile_box(row, col)
+            if i == len(self.tile_inputs):
+                self.tile_inputs.append(torch.empty(3, min(self.tile_size, self.height), min(self.tile_size, self.width)))
+            tensors.append(to_model_input(self.image[y0:y0 + h, x0:x0 + w], out=self.tile_inputs[i][:, :h, :w]))
+        return tensors
+
+    def accumulate(self, row, cols, outputs):
+        """
+        Blend enhanced tiles (normalized CHW tensors in [-1, 1]) into the
+        strip. The output tensors are used as scratch space.
+        """
+        if self.single_tile:
+            to_uint8(outputs[0], out=self.output)
+            return
+
+        y0 = self.row_starts[row]
+        for col, output in zip(cols, outputs):
+            _, x0, h, w = self._tile_box(row, col)
+            tile = output.permute(1, 2, 0).numpy()
+            window, scaled = self._window(h, w)
+            # (tile + 1) * 127.5 * window without full-size temporaries
+            blended = np.multiply(tile, scaled, out=self.scratch[:h, :w])
+            blended += scaled
+            top = y0 - self.acc_top
+            self.acc[top:top + h, x0:x0 + w] += blended
+            self.weights[top:top + h, x0:x0 + w] += window
+
+    def flush(self, row):
+        """Write out every row that later strips can no longer touch"""
+        final = self.row_starts[row + 1] if row + 1 < self.rows else self.height
+        count = final - self.acc_top
+        if count <= 0 or self.single_tile:
+            return
+
+        # Normalize in small row chunks through preallocated buffers
+        for start in range(0, count, 64):
+            stop = min(start + 64, count)
+            weights = np.maximum(self.weights[start:stop], 1e-6, out=self.flush_weights[:stop - start])
+            blended = np.divide(self.acc[start:stop], weights, out=self.flush_chunk[:stop - start])
+            blended += 0.5
+            np.clip(blended, 0, 255, out=blended)
+            self.output[self.acc_top + start:self.acc_top + stop] = blended
+
+        # Shift the rows still shared with the next strip to the top of the buffer
+        remaining = len(self.acc) - count
+        self.acc[:remaining] = self.acc[count:]
+        self.weights[:remaining] = self.weights[count:]
+        self.acc[remaining:] = 0
+        self.weights[remaining:] = 0
+        self.acc_top = final
@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class TokenCache:
+    """
+    Bounded LRU of verified tokens mapped to their (password-free) user record.
+
+    Each entry lives until the earlier of the token's own expiry and a maximum
+    TTL, so an expired token can never be served from the cache. Entries are
+    dropped on logout and whenever the owning user's record changes.
+    """
+    def __init__(self, max_entries=None, max_ttl=None):
+        self.max_entries = max_entries or int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+        self.max_ttl = max_ttl or float(os.getenv("TOKEN_CACHE_TTL", "300"))
+        self.entries = OrderedDict()  # token -> (user, valid_until)
+        self.tokens_by_user = {}      # user id -> set of cached tokens
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, token):
+        """Return the cached user for token, or None on a miss"""
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, valid_until = entry
+            if time.time() >= valid_until:
+                self._remove(token)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(token)
+            self.hits += 1
+            return user
+
+    def put(self, token, user, expires_ts):
+        """Cache a verified token until min(expires_ts, now + max_ttl)"""
+        valid_until = min(expires_ts, time.time() + self.max_ttl)
+        with self.lock:
+            if token in self.entries:
+                self._remove(token)
+            self.entries[token] = (user, valid_until)
+            self.tokens_by_user.setdefault(user["id"], set()).add(token)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate_token(self, token):
+        with self.lock:
+            if token in self.entries:
+                self._remove(token)
+                self.invalidations += 1
+
+    def invalidate_user(self, user_id):
+        """Drop every cached token of a user (e.g. after their record changed)"""
+        with self.lock:
+            for token in list(self.tokens_by_user.get(user_id, ())):
+                self._remove(token)
+                self.invalidations += 1
+
+    def _remove(self, token):
+        user, _ = self.entries.pop(token)
+        tokens = self.tokens_by_user.get(user["id"])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self.tokens_by_user[user["id"]]
+
+    def get_stats(self):
+        """Get hit rate and size"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "max_ttl": self.max_ttl,
+        }
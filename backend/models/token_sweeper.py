@@ -0,0 +1,81 @@
+import asyncio
+import os
+import time
+
+class TokenSweeper:
+    """
+    Background maintenance task that reclaims expired tokens.
+
+    Each sweep pops expired entries off the store's expiry heap in batches,
+    so its cost is proportional to the number of expired tokens rather than
+    the total number of tokens. The store lock is released between batches.
+    """
+    def __init__(self, auth_manager, interval=None, batch_size=None):
+        self.auth_manager = auth_manager
+        self.interval = interval or float(os.getenv("TOKEN_SWEEP_INTERVAL", "300"))
+        self.batch_size = batch_size or int(os.getenv("TOKEN_SWEEP_BATCH_SIZE", "1000"))
+        self.task = None
+
+        self.sweeps = 0
+        self.total_reclaimed = 0
+        self.last_reclaimed = 0
+        self.last_sweep_ms = 0.0
+        self.last_sweep_at = None
+
+    def sweep_once(self):
+        """Remove every token that has expired by now; returns how many were reclaimed"""
+        started = time.perf_counter()
+        now = time.time()
+        reclaimed = 0
+        while True:
+            expired = self.auth_manager.store.remove_expired_tokens(now, limit=self.batch_size)
+            for token in expired:
+                self.auth_manager.token_cache.invalidate_token(token)
+            reclaimed += len(expired)
+            if len(expired) < self.batch_size:
+                break
+
+        self.sweeps += 1
+        self.total_reclaimed += reclaimed
+        self.last_reclaimed = reclaimed
+        self.last_sweep_ms = (time.perf_counter() - started) * 1000
+        self.last_sweep_at = now
+        return reclaimed
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                reclaimed = await loop.run_in_executor(None, self.sweep_once)
+                if reclaimed:
+                    print(f"Token sweep reclaimed {reclaimed} expired tokens in {self.last_sweep_ms:.1f}ms")
+            except Exception as e:
+                print(f"Token sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the sweeper on the running event loop"""
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def get_stats(self):
+        """Get reclaim counters"""
+        return {
+            "sweeps": self.sweeps,
+            "total_reclaimed": self.total_reclaimed,
+            "last_reclaimed": self.last_reclaimed,
+            "last_sweep_ms": round(self.last_sweep_ms, 2),
+            "last_sweep_at": self.last_sweep_at,
+            "live_tokens": self.auth_manager.store.token_count(),
+            "expiry_heap_size": len(self.auth_manager.store.expiry_heap),
+            "interval": self.interval,
+        }
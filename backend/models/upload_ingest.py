@@ -0,0 +1,447 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from collections import deque
+from PIL import Image
+
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ModuleNotFoundError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+
+# (magic bytes, offset, PIL format, MIME type, file extension)
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", 0, "JPEG", "image/jpeg", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", 0, "PNG", "image/png", ".png"),
+    (b"WEBP", 8, "WEBP", "image/webp", ".webp"),
+    (b"BM", 0, "BMP", "image/bmp", ".bmp"),
+    (b"GIF87a", 0, "GIF", "image/gif", ".gif"),
+    (b"GIF89a", 0, "GIF", "image/gif", ".gif"),
+    (b"II*\x00", 0, "TIFF", "image/tiff", ".tiff"),
+    (b"MM\x00*", 0, "TIFF", "image/tiff", ".tiff"),
+]
+
+# (magic bytes, offset, container, MIME type, file extension)
+VIDEO_SIGNATURES = [
+    (b"ftypqt", 4, "MOV", "video/quicktime", ".mov"),
+    (b"ftyp", 4, "MP4", "video/mp4", ".mp4"),
+    (b"AVI ", 8, "AVI", "video/x-msvideo", ".avi"),
+    (b"\x1a\x45\xdf\xa3", 0, "MKV", "video/x-matroska", ".mkv"),
+]
+
+SNIFF_BYTES = 12
+
+ZIP_MAGIC = b"PK\x03\x04"
+
+def sniff_image_type(head):
+    """Identify an image format from its first bytes; returns (format, mime, extension) or None"""
+    for magic, offset, image_format, mime, extension in IMAGE_SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            if image_format == "WEBP" and head[:4] != b"RIFF":
+                continue
+            return image_format, mime, extension
+    return None
+
+def sniff_video_type(head):
+    """Identify a video container from its first bytes; returns (container, mime, extension) or None"""
+    for magic, offset, container, mime, extension in VIDEO_SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            if container == "AVI" and head[:4] != b"RIFF":
+                continue
+            return container, mime, extension
+    return None
+
+def read_header_size(head):
+    """Image (width, height) from a possibly truncated prefix of the file, or None if not available yet"""
+    try:
+        with Image.open(io.BytesIO(head)) as image:
+            return image.size
+    except Exception:
+        return None
+
+class UploadRejected(Exception):
+    """Raised while streaming an upload that must be refused"""
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class IngestedUpload:
+    """An image (or video) upload validated while it streamed in"""
+    def __init__(self):
+        self.fields = {}
+        self.filename = None
+        self.buffer = None
+        self.size = 0
+        self.image_format = None
+        self.content_type = None
+        self.extension = None
+        self.width = None
+        self.height = None
+        self.digest = None
+        # Batch ingest only: set on parts that failed validation, or for zip archives
+        self.rejection = None
+        self.is_archive = False
+
+    def save(self, path):
+        """Write the uploaded bytes to path"""
+        self.buffer.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(self.buffer, f)
+        self.buffer.seek(0)
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.close()
+
+class UploadIngestor:
+    """
+    Streaming multipart ingest for image uploads.
+
+    The request body is parsed as it arrives. The image part is checked
+    against known magic bytes and its dimensions are read from the header as
+    soon as enough bytes are in, so unsupported, oversize or too-large-to-decode
+    uploads are rejected before the rest of the body is buffered. Accepted
+    bytes go into a spooled buffer (memory, spilling to disk only past
+    spool_bytes) and are hashed on the way in.
+
+    Batch uploads (iter_uploads with batch=True) may carry many file parts
+    and zip archives; each part is handed over as soon as it is complete.
+    Video uploads (video=True) are checked against container magic bytes and
+    written straight to a named temporary file, since OpenCV reads videos
+    from a path; their dimensions are checked when the video is opened.
+    """
+    def __init__(self, max_bytes=None, max_pixels=None, spool_bytes=None, header_bytes=None, file_field="file",
+                 max_batch_bytes=None, max_batch_files=None, batch_spool_bytes=None, max_video_bytes=None):
+        self.max_bytes = max_bytes or int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+        self.max_pixels = max_pixels or int(os.getenv("UPLOAD_MAX_PIXELS", str(100_000_000)))
+        self.spool_bytes = spool_bytes or int(os.getenv("UPLOAD_SPOOL_BYTES", str(16 * 1024 * 1024)))
+        # Give up looking for dimensions in the header after this many bytes (large EXIF blocks)
+        self.header_bytes = header_bytes or 1024 * 1024
+        self.max_field_bytes = 64 * 1024
+        self.file_field = file_field
+
+        self.max_batch_bytes = max_batch_bytes or int(os.getenv("BATCH_MAX_BYTES", str(4 * 1024 ** 3)))
+        self.max_batch_files = max_batch_files or int(os.getenv("BATCH_MAX_FILES", "10000"))
+        # Batch items wait in the pipeline window; keep each one's memory small
+        self.batch_spool_bytes = batch_spool_bytes or int(os.getenv("BATCH_SPOOL_BYTES", str(1024 * 1024)))
+        self.max_video_bytes = max_video_bytes or int(os.getenv("VIDEO_MAX_BYTES", str(2 * 1024 ** 3)))
+
+    async def ingest(self, request, video=False):
+        """Parse a single-image (or video) multipart/form-data request; raises UploadRejected on invalid input"""
+        upload = None
+        try:
+            async for upload in self.iter_uploads(request, video=video):
+                pass
+        except Exception:
+            if upload is not None:
+                upload.close()
+            raise
+
+        if upload is None:
+            raise UploadRejected(400, f"Missing '{self.file_field}' file field")
+        return upload
+
+    async def iter_uploads(self, request, batch=False, video=False):
+        """
+        Parse a multipart/form-data request and yield each file part as soon
+        as it has been received and validated, rewound and ready to read.
+
+        With batch=False exactly one image is allowed and any problem raises
+        UploadRejected. With batch=True up to max_batch_files parts are
+        accepted, zip archives are passed through with is_archive set, and a
+        part that fails validation is yielded with its rejection set rather
+        than failing the whole request. The caller closes yielded uploads.
+        """
+        content_type, options = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in options:
+            raise UploadRejected(400, "Expected a multipart/form-data upload")
+
+        limit = self.max_batch_bytes if batch else self.max_video_bytes if video else self.max_bytes
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit + 64 * 1024:
+            raise UploadRejected(413, f"Upload exceeds {limit} bytes")
+
+        state = _PartState(self, batch, video)
+        parser = multipart.MultipartParser(options[b"boundary"], state.callbacks())
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                state.check()
+                while state.completed:
+                    yield state.completed.popleft()
+            parser.finalize()
+            state.check()
+            while state.completed:
+                yield state.completed.popleft()
+        finally:
+            state.close()
+
+    def open_archive(self, upload):
+        """
+        Open an uploaded zip archive and list its file members.
+        Blocking; run it off the event loop.
+        """
+        upload.buffer.seek(0)
+        try:
+            archive = zipfile.ZipFile(upload.buffer)
+        except zipfile.BadZipFile:
+            raise UploadRejected(415, f"Unreadable zip archive: {upload.filename}")
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if len(members) > self.max_batch_files:
+            raise UploadRejected(413, f"At most {self.max_batch_files} files are allowed per batch")
+        return archive, members
+
+    def read_archive_member(self, archive, info):
+        """
+        Extract one archive member into an upload, validated like a streamed
+        part (rejection set on failure). Blocking; run it off the event loop.
+        """
+        upload = IngestedUpload()
+        upload.filename = info.filename
+        if info.file_size > self.max_bytes:
+            upload.rejection = UploadRejected(413, f"Upload exceeds {self.max_bytes} bytes")
+            return upload
+
+        upload.buffer = tempfile.SpooledTemporaryFile(max_size=self.batch_spool_bytes)
+        hasher = hashlib.sha256()
+        try:
+            with archive.open(info) as member:
+                # Don't trust the declared size; stop reading past the limit
+                while True:
+                    chunk = member.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    upload.size += len(chunk)
+                    if upload.size > self.max_bytes:
+                        raise UploadRejected(413, f"Upload exceeds {self.max_bytes} bytes")
+                    upload.buffer.write(chunk)
+                    hasher.update(chunk)
+
+            upload.buffer.seek(0)
+            detected = sniff_image_type(upload.buffer.read(SNIFF_BYTES))
+            if detected is None:
+                raise UploadRejected(415, "Unsupported image format")
+            upload.image_format, upload.content_type, upload.extension = detected
+            self._read_size(upload)
+        except (UploadRejected, zipfile.BadZipFile, OSError) as e:
+            upload.close()
+            upload.buffer = None
+            upload.rejection = e if isinstance(e, UploadRejected) else UploadRejected(415, f"Unreadable archive member: {e}")
+            return upload
+
+        upload.digest = hasher.hexdigest()
+        upload.buffer.seek(0)
+        return upload
+
+    def _read_size(self, upload):
+        """Read dimensions from the whole buffered file (they were not in the first header_bytes)"""
+        upload.buffer.seek(0)
+        try:
+            with Image.open(upload.buffer) as image:
+                upload.width, upload.height = image.size
+        except Exception:
+            raise UploadRejected(415, "Unreadable image")
+        self._check_pixels(upload)
+
+    def _check_pixels(self, upload):
+        if upload.width * upload.height > self.max_pixels:
+            raise UploadRejected(
+                413, f"Image is {upload.width}x{upload.height}; at most {self.max_pixels} pixels are allowed"
+            )
+
+class _PartState:
+    """multipart parser callbacks for one request"""
+    def __init__(self, ingestor, batch, video=False):
+        self.ingestor = ingestor
+        self.batch = batch
+        self.video = video
+        self.fields = {}
+        self.upload = None
+        self.completed = deque()
+        self.files = 0
+        self.total_bytes = 0
+        self.header_field = b""
+        self.header_value = b""
+        self.headers = {}
+        self.name = None
+        self.is_file = False
+        self.field_value = bytearray()
+        self.head = bytearray()
+        self.hasher = None
+        self.error = None
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def check(self):
+        """Surface errors raised inside parser callbacks"""
+        if self.error is not None:
+            raise self.error
+
+    def fail(self, status_code, detail):
+        if self.error is None:
+            self.error = UploadRejected(status_code, detail)
+
+    def reject(self, upload, error):
+        """Refuse a file part: fatal for single uploads, recorded on the part in batches"""
+        if not self.batch:
+            if self.error is None:
+                self.error = error
+            return
+        upload.rejection = error
+        upload.close()
+        upload.buffer = None
+
+    def close(self):
+        """Release buffers of parts that were never handed to the caller"""
+        if self.upload is not None:
+            self.upload.close()
+        while self.completed:
+            self.completed.popleft().close()
+
+    def on_part_begin(self):
+        self.headers = {}
+        self.name = None
+        self.is_file = False
+        self.field_value = bytearray()
+
+    def on_header_field(self, data, start, end):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data, start, end):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = b""
+        self.header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        self.name = options.get(b"name", b"").decode("latin-1")
+        self.is_file = b"filename" in options and self.name == self.ingestor.file_field
+        if self.is_file:
+            self.files += 1
+            if not self.batch and self.files > 1:
+                self.fail(400, "Only one file may be uploaded")
+                return
+            if self.files > self.ingestor.max_batch_files:
+                self.fail(413, f"At most {self.ingestor.max_batch_files} files are allowed per batch")
+                return
+            upload = IngestedUpload()
+            upload.fields = self.fields
+            upload.filename = options[b"filename"].decode("utf-8", "replace")
+            if self.video:
+                upload.buffer = tempfile.NamedTemporaryFile(prefix="video_upload_")
+            else:
+                spool_bytes = self.ingestor.batch_spool_bytes if self.batch else self.ingestor.spool_bytes
+                upload.buffer = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+            self.upload = upload
+            self.hasher = hashlib.sha256()
+            self.head = bytearray()
+
+    def on_part_data(self, data, start, end):
+        if self.error is not None:
+            return
+        chunk = data[start:end]
+        if not self.is_file:
+            self.field_value += chunk
+            if len(self.field_value) > self.ingestor.max_field_bytes:
+                self.fail(413, f"Form field '{self.name}' is too large")
+            return
+
+        self.total_bytes += len(chunk)
+        if self.batch and self.total_bytes > self.ingestor.max_batch_bytes:
+            self.fail(413, f"Upload exceeds {self.ingestor.max_batch_bytes} bytes")
+            return
+
+        upload = self.upload
+        if upload.rejection is not None:
+            return
+        upload.size += len(chunk)
+        if upload.is_archive:
+            max_bytes = self.ingestor.max_batch_bytes
+        else:
+            max_bytes = self.ingestor.max_video_bytes if self.video else self.ingestor.max_bytes
+        if upload.size > max_bytes:
+            self.reject(upload, UploadRejected(413, f"Upload exceeds {max_bytes} bytes"))
+            return
+
+        # Validate from the header while the rest of the body is still arriving
+        if self.video:
+            if upload.image_format is None:
+                self.head += chunk
+                if len(self.head) >= SNIFF_BYTES and not self._detect(upload, bytes(self.head[:SNIFF_BYTES])):
+                    return
+        elif upload.width is None and not upload.is_archive and len(self.head) < self.ingestor.header_bytes:
+            self.head += chunk
+            if upload.image_format is None and len(self.head) >= SNIFF_BYTES:
+                if not self._detect(upload, bytes(self.head[:SNIFF_BYTES])):
+                    return
+            if upload.image_format is not None and not upload.is_archive:
+                size = read_header_size(bytes(self.head))
+                if size is not None:
+                    upload.width, upload.height = size
+                    try:
+                        self.ingestor._check_pixels(upload)
+                    except UploadRejected as e:
+                        self.reject(upload, e)
+                        return
+                    self.head = bytearray()
+
+        upload.buffer.write(chunk)
+        self.hasher.update(chunk)
+
+    def _detect(self, upload, head):
+        """Set the part's format from its first bytes; returns False if it was rejected"""
+        if self.batch and head.startswith(ZIP_MAGIC):
+            upload.is_archive = True
+            upload.image_format, upload.content_type, upload.extension = "ZIP", "application/zip", ".zip"
+            return True
+        detected = sniff_video_type(head) if self.video else sniff_image_type(head)
+        if detected is None:
+            self.reject(upload, UploadRejected(415, f"Unsupported {'video' if self.video else 'image'} format"))
+            return False
+        upload.image_format, upload.content_type, upload.extension = detected
+        return True
+
+    def on_part_end(self):
+        if self.error is not None:
+            return
+        if not self.is_file:
+            if self.name:
+                self.fields[self.name] = self.field_value.decode("utf-8", "replace")
+            return
+
+        upload, self.upload = self.upload, None
+        head, self.head = bytes(self.head[:SNIFF_BYTES]), bytearray()
+        if upload.rejection is None and upload.image_format is None:
+            self._detect(upload, head)
+        if (upload.rejection is None and upload.width is None and not upload.is_archive and not self.video
+                and self.error is None):
+            # Dimensions were not in the first header_bytes; read them from the full file
+            try:
+                self.ingestor._read_size(upload)
+            except UploadRejected as e:
+                self.reject(upload, e)
+        if self.error is not None:
+            upload.close()
+            return
+        if upload.rejection is None:
+            upload.digest = self.hasher.hexdigest()
+            upload.buffer.seek(0)
+        self.completed.append(upload)
@@ -0,0 +1,226 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .metrics import stage
+
+def probe_video(path):
+    """Width, height, frame rate and (container-reported, possibly 0) frame count of a video"""
+    capture = cv2.VideoCapture(str(path))
+    try:
+        if not capture.isOpened():
+            raise ValueError("Unreadable video")
+        return {
+            "width": int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": capture.get(cv2.CAP_PROP_FPS) or 0.0,
+            "frames": max(0, int(capture.get(cv2.CAP_PROP_FRAME_COUNT))),
+        }
+    finally:
+        capture.release()
+
+def read_frames(path):
+    """Decode a video as a generator of RGB uint8 frames; only the current frame is held"""
+    capture = cv2.VideoCapture(str(path))
+    try:
+        if not capture.isOpened():
+            raise ValueError("Unreadable video")
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                return
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        capture.release()
+
+def frame_signature(frame, size=(64, 36)):
+    """Small grayscale thumbnail (block averages) used to spot near-identical frames"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+def signature_distance(a, b):
+    """
+    Largest block difference of two signatures, in 0-255 levels. The maximum
+    rather than the mean, so a small object moving through a static scene
+    still counts as a change.
+    """
+    return int(np.abs(a - b).max())
+
+def write_frame(writer, frame):
+    writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+
+class VideoProcessor:
+    """
+    Enhances a video frame by frame through the image pipeline.
+
+    Decode, enhancement and encode run as three stages connected by bounded
+    queues, so they overlap and memory stays constant however long the clip
+    is: at most VIDEO_QUEUE_FRAMES decoded and enhanced frames wait between
+    stages. VIDEO_BATCH_FRAMES frames are enhanced at a time, so their tiles
+    share forward passes in the inference scheduler. Frames are written with
+    cv2.VideoWriter as they come out, in order (VIDEO_FOURCC codec; audio is
+    not carried over).
+
+    A frame whose 64x36 block thumbnail differs from that of the last
+    enhanced frame by less than VIDEO_REUSE_THRESHOLD grey levels in every
+    block reuses that frame's result instead of being enhanced again (0
+    disables). Static camera footage has long runs of such frames.
+    """
+    def __init__(self, image_processor, batch_frames=None, queue_frames=None, reuse_threshold=None, fourcc=None):
+        self.image_processor = image_processor
+        self.executor = image_processor.executor
+        self.batch_frames = batch_frames or int(os.getenv("VIDEO_BATCH_FRAMES", "4"))
+        self.queue_frames = queue_frames or int(os.getenv("VIDEO_QUEUE_FRAMES", "8"))
+        self.reuse_threshold = float(
+            reuse_threshold if reuse_threshold is not None else os.getenv("VIDEO_REUSE_THRESHOLD", "8")
+        )
+        self.fourcc = fourcc or os.getenv("VIDEO_FOURCC", "mp4v")
+
+        self.lock = threading.Lock()
+        self.videos = 0
+        self.frames = 0
+        self.reused_frames = 0
+        self.seconds = 0.0
+        self.last_fps = 0.0
+
+    async def enhance_video(self, input_path, output_path, model_id="lol_real"):
+        """
+        Enhance the video at input_path into output_path (an .mp4 with the
+        default codec). Returns frame counts and throughput.
+        """
+        try:
+            started = time.perf_counter()
+            info = await self.executor.run_local(probe_video, input_path)
+            fps = info["fps"] if info["fps"] > 0 else 25.0
+            Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+
+            writer = cv2.VideoWriter(
+                str(output_path), cv2.VideoWriter_fourcc(*self.fourcc), fps, (info["width"], info["height"])
+            )
+            if not writer.isOpened():
+                raise ValueError(f"OpenCV could not open a {self.fourcc} video writer")
+            frames = read_frames(input_path)
+            # A read or write still running on a worker after a failure must finish before close
+            frames_lock = threading.Lock()
+            writer_lock = threading.Lock()
+
+            def next_frame():
+                """Next frame and its signature, or None at the end (both worked out off the event loop)"""
+                with frames_lock:
+                    frame = next(frames, None)
+                return None if frame is None else (frame, frame_signature(frame))
+
+            def write(frame):
+                with writer_lock:
+                    write_frame(writer, frame)
+
+            def close():
+                with frames_lock:
+                    frames.close()
+                with writer_lock:
+                    writer.release()
+
+            decoded = asyncio.Queue(maxsize=self.queue_frames)
+            enhanced = asyncio.Queue(maxsize=self.queue_frames)
+            counts = {"frames": 0, "reused": 0}
+
+            async def decode():
+                while True:
+                    with stage("video_decode"):
+                        item = await self.executor.run_local(next_frame)
+                    await decoded.put(item)
+                    if item is None:
+                        return
+
+            async def enhance():
+                in_flight = deque()  # tasks in frame order
+                anchor = None  # (signature, task) of the last frame actually enhanced
+                try:
+                    while True:
+                        item = await decoded.get()
+                        if item is None:
+                            break
+                        frame, signature = item
+                        if (anchor is not None and self.reuse_threshold > 0
+                                and signature_distance(signature, anchor[0]) < self.reuse_threshold):
+                            task = anchor[1]
+                            counts["reused"] += 1
+                        else:
+                            task = asyncio.create_task(self.image_processor.process_tiled(frame, model_id, pinned))
+                            anchor = (signature, task)
+                        del frame, item
+                        in_flight.append(task)
+                        if len(in_flight) >= self.batch_frames:
+                            await enhanced.put(await in_flight.popleft())
+                    while in_flight:
+                        await enhanced.put(await in_flight.popleft())
+                    await enhanced.put(None)
+                finally:
+                    for task in in_flight:
+                        task.cancel()
+
+            async def encode():
+                while True:
+                    frame = await enhanced.get()
+                    if frame is None:
+                        return
+                    with stage("video_encode"):
+                        await self.executor.run_local(write, frame)
+                    counts["frames"] += 1
+
+            # Keep the model loaded while the video is in flight, every frame on the same version
+            async with self.image_processor.using(model_id) as pinned:
+                stages = [asyncio.create_task(coroutine) for coroutine in (decode(), enhance(), encode())]
+                try:
+                    await asyncio.gather(*stages)
+                finally:
+                    for task in stages:
+                        task.cancel()
+                    await asyncio.gather(*stages, return_exceptions=True)
+                    await self.executor.run_local(close)
+
+            if counts["frames"] == 0:
+                raise ValueError("The video has no readable frames")
+
+            elapsed = time.perf_counter() - started
+            throughput = counts["frames"] / elapsed if elapsed > 0 else 0.0
+            with self.lock:
+                self.videos += 1
+                self.frames += counts["frames"]
+                self.reused_frames += counts["reused"]
+                self.seconds += elapsed
+                self.last_fps = throughput
+            return {
+                "frames": counts["frames"],
+                "reused_frames": counts["reused"],
+                "width": info["width"],
+                "height": info["height"],
+                "source_fps": round(fps, 3),
+                "elapsed_s": round(elapsed, 2),
+                "fps": round(throughput, 2),
+            }
+
+        except Exception as e:
+            raise Exception(f"Video processing failed: {str(e)}")
+
+    def get_stats(self):
+        """Get processed video counts, frame reuse and fps throughput"""
+        with self.lock:
+            return {
+                "videos": self.videos,
+                "frames": self.frames,
+                "reused_frames": self.reused_frames,
+                "reuse_rate": round(self.reused_frames / self.frames, 3) if self.frames else 0.0,
+                "avg_fps": round(self.frames / self.seconds, 2) if self.seconds else 0.0,
+                "last_fps": round(self.last_fps, 2),
+                "batch_frames": self.batch_frames,
+                "queue_frames": self.queue_frames,
+                "reuse_threshold": self.reuse_threshold,
+                "fourcc": self.fourcc,
+            }
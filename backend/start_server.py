@@ -3,23 +3,44 @@
 Startup script for the ChandraGrahan Low Light Enhancement API
 """
 
+import argparse
 import uvicorn
 import os
 from pathlib import Path
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the ChandraGrahan API")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")),
+                        help="server worker processes (default: WEB_CONCURRENCY or 1; only 1 is supported)")
+    parser.add_argument("--reload", action="store_true", default=os.getenv("UVICORN_RELOAD", "0") == "1",
+                        help="restart on code changes (development only; implies one worker)")
+    args = parser.parse_args()
+    
+    # The job queue, result cache (and its request coalescing), fair-share scheduler, auth
+    # token cache and logouts all live in the server process, so with several workers a
+    # job is 404 on the others, identical uploads are enhanced once per worker, each user
+    # gets a fair share per worker and a logged out token stays valid where it was cached.
+    # Scale out with one worker per container behind a load balancer until that state is shared.
+    if args.workers > 1:
+        parser.error("--workers > 1 is not supported: jobs, the result cache, fair-share "
+                     "scheduling and token caches are per process")
+    
     # Change to backend directory
     backend_dir = Path(__file__).parent
     os.chdir(backend_dir)
     
     print("Starting ChandraGrahan Low Light Enhancement API...")
-    print("Backend will be available at: http://localhost:8000")
-    print("API documentation at: http://localhost:8000/docs")
+    print(f"Backend will be available at: http://localhost:{args.port}")
+    print(f"API documentation at: http://localhost:{args.port}/docs")
+    print(f"Readiness at: http://localhost:{args.port}/health/ready")
     
     uvicorn.run(
         "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        reload=args.reload,
         log_level="info"
     )
@@ -6,13 +6,16 @@ import { gsap } from 'gsap';
 
 const ImageUploader = () => {
   const { user } = useAuth();
-  const { processImage, processing } = useImages();
+  const { images, processImage, processing } = useImages();
   const [dragActive, setDragActive] = useState(false);
   const [selectedFile, setSelectedFile] = useState(null);
   const [result, setResult] = useState(null);
   const fileInputRef = useRef();
   const uploaderRef = useRef();
 
+  // The context swaps in the full resolution result when it is ready
+  const shownResult = result && (images.find(img => img.uploadId === result.uploadId) || result);
+
   useEffect(() => {
     if (uploaderRef.current) {
       gsap.fromTo(uploaderRef.current,
@@ -194,7 +197,9 @@ const ImageUploader = () => {
       {result && (
         <div className="card">
           <div className="result-header">
-            <h3 className="result-title">Enhancement Complete!</h3>
+            <h3 className="result-title">
+              {shownResult.fullResolution ? 'Enhancement Complete!' : 'Preview Ready'}
+            </h3>
             <button
               onClick={resetUploader}
               className="result-close"
@@ -206,7 +211,7 @@ const ImageUploader = () => {
           <div className="result-grid">
             <div className="result-image-container">
               <img
-                src={result.originalUrl}
+                src={shownResult.originalUrl}
                 alt="Original"
                 className="result-image"
               />
@@ -215,21 +220,27 @@ const ImageUploader = () => {
             
             <div className="result-image-container">
               <img
-                src={result.enhancedUrl}
+                src={shownResult.enhancedUrl}
                 alt="Enhanced"
                 className="result-image"
               />
-              <p className="result-image-label">Enhanced Image</p>
+              <p className="result-image-label">
+                {shownResult.fullResolution ? 'Enhanced Image' : 'Enhanced Preview (full resolution on the way...)'}
+              </p>
+              {shownResult.fullResolutionError && (
+                <p className="result-image-label">Full resolution failed: {shownResult.fullResolutionError}</p>
+              )}
             </div>
           </div>
           
           <div className="result-download">
             <button
-              onClick={() => downloadImage(result.enhancedUrl, result.originalName)}
+              onClick={() => downloadImage(shownResult.enhancedUrl, shownResult.originalName)}
               className="btn-primary result-download-button"
+              disabled={!shownResult.fullResolution}
             >
-              <Download className="btn-icon" />
-              <span>Download Enhanced Image</span>
+              {shownResult.fullResolution ? <Download className="btn-icon" /> : <Loader className="btn-icon" />}
+              <span>{shownResult.fullResolution ? 'Download Enhanced Image' : 'Preparing Full Resolution...'}</span>
             </button>
           </div>
         </div>
@@ -1,9 +1,12 @@
-import { createContext, useContext, useState, useEffect } from 'react';
+import { createContext, useContext, useState, useEffect, useRef } from 'react';
 import { useAuth } from './AuthContext';
-import apiService from '../services/api';
+import apiService, { API_BASE_URL } from '../services/api';
 
 const ImageContext = createContext();
 
+// Images per gallery page
+const GALLERY_PAGE_SIZE = 24;
+
 export const useImages = () => {
   const context = useContext(ImageContext);
   if (!context) {
@@ -14,110 +17,173 @@ export const useImages = () => {
 
 export const ImageProvider = ({ children }) => {
   const { user } = useAuth();
+  // Results of this session's uploads (with their local originals), for the uploader
   const [images, setImages] = useState([]);
   const [processing, setProcessing] = useState(false);
+  // The user's history from the server, a page at a time, for the gallery
+  const [gallery, setGallery] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingGallery, setLoadingGallery] = useState(false);
+  const [usage, setUsage] = useState(null);
+  // Jobs still being waited on; they are given up on logout or unmount
+  const jobWaits = useRef(new Set());
 
   useEffect(() => {
+    // History used to be kept in the browser; the server has it now
+    localStorage.removeItem('userImages');
     if (user) {
-      loadUserImages();
-      // Set up auto-deletion timer
-      const interval = setInterval(checkExpiredImages, 60000); // Check every minute
-      return () => clearInterval(interval);
+      loadGallery();
+    } else {
+      setImages([]);
+      setGallery([]);
+      setNextCursor(null);
+      setUsage(null);
     }
+    return () => {
+      jobWaits.current.forEach(controller => controller.abort());
+      jobWaits.current.clear();
+    };
   }, [user]);
 
-  const loadUserImages = () => {
-    const savedImages = localStorage.getItem('userImages');
-    if (savedImages) {
-      const parsedImages = JSON.parse(savedImages);
-      // Filter out expired images
-      const validImages = parsedImages.filter(img => {
-        const uploadTime = new Date(img.uploadedAt);
-        const now = new Date();
-        const hoursDiff = (now - uploadTime) / (1000 * 60 * 60);
-        return hoursDiff < 24;
-      });
-      setImages(validImages);
-      if (validImages.length !== parsedImages.length) {
-        localStorage.setItem('userImages', JSON.stringify(validImages));
-      }
+  // Reload the first page (and usage), e.g. after an upload or delete
+  const loadGallery = async () => {
+    setLoadingGallery(true);
+    try {
+      const [page, usageInfo] = await Promise.all([
+        apiService.listImages({ limit: GALLERY_PAGE_SIZE }),
+        apiService.getUsage()
+      ]);
+      setGallery(page.images);
+      setNextCursor(page.nextCursor);
+      setUsage(usageInfo);
+    } catch (error) {
+      console.error('Gallery error:', error);
+    } finally {
+      setLoadingGallery(false);
+    }
+  };
+
+  const loadMoreImages = async () => {
+    if (!nextCursor || loadingGallery) return;
+    setLoadingGallery(true);
+    try {
+      const page = await apiService.listImages({ cursor: nextCursor, limit: GALLERY_PAGE_SIZE });
+      setGallery(prevGallery => [...prevGallery, ...page.images]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error('Gallery error:', error);
+    } finally {
+      setLoadingGallery(false);
     }
   };
 
-  const checkExpiredImages = () => {
-    setImages(prevImages => {
-      const validImages = prevImages.filter(img => {
-        const uploadTime = new Date(img.uploadedAt);
-        const now = new Date();
-        const hoursDiff = (now - uploadTime) / (1000 * 60 * 60);
-        return hoursDiff < 24;
-      });
-      
-      if (validImages.length !== prevImages.length) {
-        localStorage.setItem('userImages', JSON.stringify(validImages));
+  // Session images are matched on uploadId, which stays put when id moves to the full resolution file
+  const updateImage = (uploadId, changes) => {
+    setImages(prevImages => prevImages.map(img => img.uploadId === uploadId ? { ...img, ...changes } : img));
+  };
+
+  // Swap the preview for the full resolution result once its job finishes
+  const loadFullResolution = async (uploadId, jobId) => {
+    const controller = new AbortController();
+    jobWaits.current.add(controller);
+    try {
+      const job = await apiService.waitForJob(jobId, { signal: controller.signal });
+      if (job.status === 'done') {
+        // The full resolution result is a file of its own; refer to it from now on, not the preview
+        updateImage(uploadId, {
+          id: job.result.file_id,
+          enhancedUrl: `${API_BASE_URL}${job.result.download_url}`,
+          fullResolution: true
+        });
+        // The full resolution result is what goes into the history
+        loadGallery();
+      } else {
+        updateImage(uploadId, { fullResolution: true, fullResolutionError: job.error });
+      }
+    } catch (error) {
+      if (!controller.signal.aborted) {
+        updateImage(uploadId, { fullResolution: true, fullResolutionError: error.message });
       }
-      
-      return validImages;
-    });
+    } finally {
+      jobWaits.current.delete(controller);
+    }
   };
 
   const processImage = async (file) => {
     if (!user) return { success: false, error: 'Please login first' };
-    
+
     setProcessing(true);
-    
+
     try {
-      // Call backend API for image enhancement
-      const result = await apiService.enhanceImage(file);
-      
+      // Ask for a quick low resolution preview; the full resolution result follows from a job
+      const result = await apiService.enhanceImage(file, { preview: true });
+
       if (result.success) {
         const originalUrl = URL.createObjectURL(file);
-        
+
         const newImage = {
-          id: result.fileId,
-          originalName: result.originalFilename,
+          uploadId: result.jobId || result.fileId,
+          id: result.fileId || result.jobId,
+          originalName: result.originalFilename || file.name,
           originalUrl,
           enhancedUrl: result.downloadUrl,
+          fullResolution: !result.jobId,
           uploadedAt: new Date().toISOString(),
           size: file.size,
           type: file.type,
           modelUsed: "lol_real"
         };
-        
-        const updatedImages = [...images, newImage];
-        setImages(updatedImages);
-        localStorage.setItem('userImages', JSON.stringify(updatedImages));
-        
+
+        setImages(prevImages => [...prevImages, newImage]);
+
+        if (result.jobId) {
+          if (result.downloadUrl) {
+            loadFullResolution(newImage.uploadId, result.jobId);
+          } else {
+            // No preview came back; wait for the full result instead
+            await loadFullResolution(newImage.uploadId, result.jobId);
+          }
+        } else {
+          loadGallery();
+        }
+
         setProcessing(false);
         return { success: true, image: newImage };
       } else {
         setProcessing(false);
         return { success: false, error: result.error };
       }
-      
+
     } catch (error) {
       setProcessing(false);
       return { success: false, error: error.message };
     }
   };
 
-  const deleteImage = (imageId) => {
-    const updatedImages = images.filter(img => img.id !== imageId);
-    setImages(updatedImages);
-    localStorage.setItem('userImages', JSON.stringify(updatedImages));
+  const deleteImage = async (imageId) => {
+    try {
+      await apiService.cleanupFiles(imageId);
+    } catch (error) {
+      return { success: false, error: error.message };
+    }
+    setGallery(prevGallery => prevGallery.filter(img => img.id !== imageId));
+    setImages(prevImages => prevImages.filter(img => img.id !== imageId));
+    apiService.getUsage().then(setUsage).catch(() => {});
+    return { success: true };
   };
 
-  const getTimeRemaining = (uploadedAt) => {
-    const uploadTime = new Date(uploadedAt);
-    const now = new Date();
-    const hoursPassed = (now - uploadTime) / (1000 * 60 * 60);
-    const hoursRemaining = Math.max(0, 24 - hoursPassed);
-    
+  // Time until the server reclaims an image (it is extended whenever the image is downloaded)
+  const getTimeRemaining = (expiresAt) => {
+    if (!expiresAt) return 'Kept';
+    const hoursRemaining = Math.max(0, (new Date(expiresAt) - new Date()) / (1000 * 60 * 60));
+
+    if (hoursRemaining >= 48) {
+      return `${Math.floor(hoursRemaining / 24)}d`;
+    }
     if (hoursRemaining < 1) {
-      const minutesRemaining = Math.max(0, (24 * 60) - ((now - uploadTime) / (1000 * 60)));
-      return `${Math.floor(minutesRemaining)}m`;
+      return `${Math.floor(hoursRemaining * 60)}m`;
     }
-    
+
     return `${Math.floor(hoursRemaining)}h ${Math.floor((hoursRemaining % 1) * 60)}m`;
   };
 
@@ -125,6 +191,11 @@ export const ImageProvider = ({ children }) => {
     images,
     processing,
     processImage,
+    gallery,
+    hasMoreImages: nextCursor !== null,
+    loadingGallery,
+    loadMoreImages,
+    usage,
     deleteImage,
     getTimeRemaining
   };
@@ -134,4 +205,4 @@ export const ImageProvider = ({ children }) => {
       {children}
     </ImageContext.Provider>
   );
-};
\ No newline at end of file
+};
@@ -7,7 +7,7 @@ import { gsap } from 'gsap';
 
 const Profile = () => {
   const { user } = useAuth();
-  const { images, deleteImage, getTimeRemaining } = useImages();
+  const { gallery, hasMoreImages, loadingGallery, loadMoreImages, usage, deleteImage, getTimeRemaining } = useImages();
   const profileRef = useRef();
 
   useEffect(() => {
@@ -32,9 +32,12 @@ const Profile = () => {
     document.body.removeChild(link);
   };
 
-  const handleDelete = (imageId) => {
+  const handleDelete = async (imageId) => {
     if (window.confirm('Are you sure you want to delete this image?')) {
-      deleteImage(imageId);
+      const result = await deleteImage(imageId);
+      if (!result.success) {
+        alert(result.error);
+      }
     }
   };
 
@@ -46,6 +49,12 @@ const Profile = () => {
     return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
   };
 
+  const formatDuration = (seconds) => {
+    if (!seconds) return 'Never';
+    const hours = seconds / 3600;
+    return hours >= 48 ? `${Math.round(hours / 24)}d` : `${Math.round(hours)}h`;
+  };
+
   return (
     <div ref={profileRef} className="profile-page">
       <div className="profile-container">
@@ -68,17 +77,17 @@ const Profile = () => {
         {/* Stats */}
         <div className="profile-content profile-stats">
           <div className="card stat-card">
-            <div className="stat-number stat-number-primary">{images.length}</div>
+            <div className="stat-number stat-number-primary">{gallery.length}{hasMoreImages ? '+' : ''}</div>
             <div className="stat-label">Total Images</div>
           </div>
           <div className="card stat-card">
             <div className="stat-number stat-number-success">
-              {images.reduce((acc, img) => acc + img.size, 0) > 0 ? formatFileSize(images.reduce((acc, img) => acc + img.size, 0)) : '0 MB'}
+              {usage && usage.bytes > 0 ? formatFileSize(usage.bytes) : '0 MB'}
             </div>
             <div className="stat-label">Storage Used</div>
           </div>
           <div className="card stat-card">
-            <div className="stat-number stat-number-purple">24h</div>
+            <div className="stat-number stat-number-purple">{formatDuration(usage && usage.output_ttl)}</div>
             <div className="stat-label">Auto-Delete Timer</div>
           </div>
         </div>
@@ -88,11 +97,13 @@ const Profile = () => {
           <div className="profile-images-header">
             <h2 className="profile-images-title">Your Enhanced Images</h2>
             <div className="profile-images-note">
-              Images are automatically deleted after 24 hours
+              {usage && usage.output_ttl
+                ? `Images not downloaded for ${formatDuration(usage.output_ttl)} are deleted automatically`
+                : 'Images are kept until you delete them'}
             </div>
           </div>
 
-          {images.length === 0 ? (
+          {gallery.length === 0 && !loadingGallery ? (
             <div className="card profile-empty">
               <ImageIcon className="profile-empty-icon" />
               <h3 className="profile-empty-title">No Images Yet</h3>
@@ -105,17 +116,23 @@ const Profile = () => {
             </div>
           ) : (
             <div className="profile-images-grid">
-              {images.map((image) => (
+              {gallery.map((image) => (
                 <div key={image.id} className="card profile-image-card">
                   <div className="profile-image-container">
+                    {/* Thumbnails are a few KB and cached by the browser; the full image is only fetched on download */}
                     <img
-                      src={image.enhancedUrl}
+                      src={image.thumbnailUrl || image.enhancedUrl}
+                      srcSet={image.thumbnailSmallUrl && image.thumbnailUrl
+                        ? `${image.thumbnailSmallUrl} 160w, ${image.thumbnailUrl} 480w`
+                        : undefined}
+                      sizes="(max-width: 640px) 100vw, 480px"
+                      loading="lazy"
                       alt={image.originalName}
                       className="profile-image"
                     />
                     <div className="profile-image-timer">
                       <Clock className="profile-image-timer-icon" />
-                      <span>{getTimeRemaining(image.uploadedAt)}</span>
+                      <span>{getTimeRemaining(image.expiresAt)}</span>
                     </div>
                   </div>
                   
@@ -147,6 +164,14 @@ const Profile = () => {
               ))}
             </div>
           )}
+
+          {hasMoreImages && (
+            <div className="profile-images-more">
+              <button onClick={loadMoreImages} disabled={loadingGallery} className="btn-secondary">
+                {loadingGallery ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
         </div>
       </div>
     </div>
@@ -1,4 +1,4 @@
-const API_BASE_URL = 'http://localhost:8000';
+export const API_BASE_URL = 'http://localhost:8000';
 
 class ApiService {
   constructor() {
@@ -131,7 +131,7 @@ class ApiService {
       };
     }
   }
-  async enhanceImage(file) {
+  async enhanceImage(file, { preview = false } = {}) {
     const formData = new FormData();
     formData.append('file', file);
 
@@ -141,7 +141,9 @@ class ApiService {
         headers['Authorization'] = `Bearer ${this.token}`;
       }
 
-      const response = await fetch(`${API_BASE_URL}/enhance`, {
+      // With preview the response carries a low resolution result and a job for the full one
+      const url = preview ? `${API_BASE_URL}/enhance?preview=true` : `${API_BASE_URL}/enhance`;
+      const response = await fetch(url, {
         method: 'POST',
         headers,
         body: formData,
@@ -161,8 +163,9 @@ class ApiService {
         success: true,
         fileId: result.file_id,
         originalFilename: result.original_filename,
-        downloadUrl: `${API_BASE_URL}${result.download_url}`,
-        modelUsed: "lol_real"
+        downloadUrl: result.download_url ? `${API_BASE_URL}${result.download_url}` : null,
+        modelUsed: "lol_real",
+        jobId: result.job_id || null
       };
     } catch (error) {
       console.error('API Error:', error);
@@ -173,6 +176,98 @@ class ApiService {
     }
   }
 
+  async getJob(jobId, { signal } = {}) {
+    try {
+      const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`, {
+        headers: this.getAuthHeaders(),
+        signal,
+      });
+      if (!response.ok) {
+        throw new Error('Failed to get job status');
+      }
+      return await response.json();
+    } catch (error) {
+      console.error('Job status error:', error);
+      throw error;
+    }
+  }
+
+  // Poll a job until it finishes; resolves with the job (status 'done' or 'failed').
+  // Polls back off from intervalMs up to maxIntervalMs; rejects after timeoutMs, or
+  // with an AbortError as soon as signal is aborted.
+  async waitForJob(jobId, { signal, timeoutMs = 10 * 60 * 1000, intervalMs = 500, maxIntervalMs = 5000 } = {}) {
+    const deadline = Date.now() + timeoutMs;
+    let delay = intervalMs;
+    for (;;) {
+      signal?.throwIfAborted();
+      const job = await this.getJob(jobId, { signal });
+      if (job.status === 'done' || job.status === 'failed') {
+        return job;
+      }
+      const remaining = deadline - Date.now();
+      if (remaining <= 0) {
+        throw new Error('Timed out waiting for the full resolution result');
+      }
+      await new Promise((resolve, reject) => {
+        const timer = setTimeout(() => {
+          signal?.removeEventListener('abort', onAbort);
+          resolve();
+        }, Math.min(delay, remaining));
+        const onAbort = () => {
+          clearTimeout(timer);
+          reject(signal.reason);
+        };
+        signal?.addEventListener('abort', onAbort, { once: true });
+      });
+      delay = Math.min(delay * 2, maxIntervalMs);
+    }
+  }
+
+  // One page of the user's enhanced images, newest first; pass nextCursor back for the next page
+  async listImages({ cursor = null, limit = 24 } = {}) {
+    const params = new URLSearchParams({ limit: String(limit) });
+    if (cursor) {
+      params.set('cursor', cursor);
+    }
+    const response = await fetch(`${API_BASE_URL}/images?${params}`, {
+      headers: this.getAuthHeaders(),
+    });
+    if (!response.ok) {
+      if (response.status === 401) {
+        this.setToken(null);
+      }
+      throw new Error('Failed to load images');
+    }
+    const result = await response.json();
+    return {
+      images: result.images.map(image => ({
+        id: image.file_id,
+        originalName: image.original_filename,
+        enhancedUrl: `${API_BASE_URL}${image.download_url}`,
+        thumbnailUrl: image.thumbnails.medium ? `${API_BASE_URL}${image.thumbnails.medium}` : null,
+        thumbnailSmallUrl: image.thumbnails.small ? `${API_BASE_URL}${image.thumbnails.small}` : null,
+        uploadedAt: image.created_at,
+        expiresAt: image.expires_at,
+        size: image.size,
+        width: image.width,
+        height: image.height,
+        type: image.content_type,
+        modelUsed: image.model_used
+      })),
+      nextCursor: result.next_cursor
+    };
+  }
+
+  async getUsage() {
+    const response = await fetch(`${API_BASE_URL}/usage`, {
+      headers: this.getAuthHeaders(),
+    });
+    if (!response.ok) {
+      throw new Error('Failed to load usage');
+    }
+    return await response.json();
+  }
+
   async getAvailableModels() {
     try {
       const response = await fetch(`${API_BASE_URL}/models`);
@@ -202,7 +297,8 @@ class ApiService {
   async cleanupFiles(fileId) {
     try {
       const response = await fetch(`${API_BASE_URL}/cleanup/${fileId}`, {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: this.getAuthHeaders(),
       });
       if (!response.ok) {
         throw new Error('Cleanup failed');